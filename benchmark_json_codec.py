@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+JSON编解码微基准测试
+
+在多个响应体大小下比较转发路由生成响应体的CPU耗时：
+    stdlib       标准库解析再序列化（原先的实现）
+    codec        mcp_json解析再序列化（安装了orjson时使用orjson）
+    passthrough  原样复用上游JSON字节，不解析
+
+用法示例：
+    python benchmark_json_codec.py --sizes 1024,16384,262144,1048576 --iterations 200
+"""
+import argparse
+import json
+import time
+
+import mcp_json
+from benchmark_mcp_server import make_payload
+
+
+def _stdlib(raw):
+    return json.dumps(json.loads(raw)).encode()
+
+
+def _codec(raw):
+    return mcp_json.dumps(mcp_json.loads(raw))
+
+
+def _passthrough(raw):
+    return raw
+
+
+PATHS = {
+    'stdlib': _stdlib,
+    'codec': _codec,
+    'passthrough': _passthrough
+}
+
+
+def measure(func, raw, iterations):
+    """返回每次调用的平均CPU时间（微秒）"""
+    func(raw)
+    started = time.process_time()
+    for _ in range(iterations):
+        func(raw)
+    return (time.process_time() - started) / iterations * 1e6
+
+
+def run_codec_benchmark(sizes, iterations):
+    """对每个响应体大小测量各编解码路径的耗时"""
+    results = []
+    for size in sizes:
+        raw = make_payload(size)
+        timings = {name: round(measure(func, raw, iterations), 3) for name, func in PATHS.items()}
+        results.append({'payload_bytes': len(raw), 'cpu_us_per_request': timings})
+        print(
+            f"{len(raw):>9d} B  " + '  '.join(f"{name}={value:>10.1f}us" for name, value in timings.items())
+            + f"  节省(codec)={timings['stdlib'] - timings['codec']:.1f}us"
+        )
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='JSON编解码微基准测试')
+    parser.add_argument('--sizes', default='1024,16384,262144,1048576', help='逗号分隔的响应体大小（字节）')
+    parser.add_argument('--iterations', type=int, default=200, help='每个大小的迭代次数')
+    parser.add_argument('--backend', default='auto', help='编解码实现：auto、orjson或json')
+    parser.add_argument('--output', help='结果输出文件')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    mcp_json.set_backend(args.backend)
+    sizes = [int(value) for value in args.sizes.split(',') if value]
+    print(f"JSON编解码实现: {mcp_json.backend()}")
+    report = {
+        'backend': mcp_json.backend(),
+        'iterations': args.iterations,
+        'results': run_codec_benchmark(sizes, args.iterations)
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=4)
+        print(f"\n结果已保存到: {args.output}")
+    return report
+
+
+if __name__ == '__main__':
+    main()
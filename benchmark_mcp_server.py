@@ -0,0 +1,359 @@
+# -*- coding: utf-8 -*-
+"""
+MCP Server 压测工具
+
+启动一个可配置延迟、响应大小和错误率的本地上游桩服务，以及一个MCP Server实例，
+然后在固定的并发级别下压测 /api/forward 和 /api/ip-info，
+输出吞吐量、p50/p95/p99延迟和服务器进程RSS，并将结果写入JSON文件以便在多次运行之间对比。
+
+用法示例：
+    python benchmark_mcp_server.py --concurrency 1,8,32 --requests 2000 --latency-ms 20
+    python benchmark_mcp_server.py --compare bench_results_old.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+
+class FakeUpstreamHandler(BaseHTTPRequestHandler):
+    """本地上游桩服务的请求处理器，行为由所属服务器的属性控制"""
+    protocol_version = 'HTTP/1.1'
+    # 响应头和响应体分两次写出，关闭Nagle算法避免与延迟ACK叠加产生约40ms的等待
+    disable_nagle_algorithm = True
+
+    def _handle(self):
+        length = int(self.headers.get('Content-Length', 0))
+        if length:
+            self.rfile.read(length)
+
+        server = self.server
+        if server.latency:
+            time.sleep(server.latency)
+
+        if server.error_rate and random.random() < server.error_rate:
+            body = b'{"error": "injected failure"}'
+            self.send_response(500)
+        else:
+            body = server.payload
+            self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = _handle
+    do_POST = _handle
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeUpstream:
+    """可配置延迟、响应大小和错误率的本地上游服务"""
+
+    def __init__(self, latency=0.0, payload_size=1024, error_rate=0.0):
+        """初始化上游服务
+
+        Args:
+            latency: 每个响应的延迟（秒）
+            payload_size: 响应体的大致字节数
+            error_rate: 返回500的概率（0-1）
+        """
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), FakeUpstreamHandler)
+        self.server.daemon_threads = True
+        self.server.latency = latency
+        self.server.error_rate = error_rate
+        self.server.payload = make_payload(payload_size)
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}'
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def make_payload(size):
+    """生成大约size字节的JSON响应体"""
+    items = []
+    total = 2
+    index = 0
+    while total < size:
+        item = {'id': index, 'name': f'item-{index}', 'value': index * 1.5}
+        items.append(item)
+        total += len(json.dumps(item)) + 2
+        index += 1
+    return json.dumps({'items': items}).encode()
+
+
+def free_port():
+    """获取一个空闲端口"""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _process_tree(pid):
+    """返回进程及其所有子进程的pid（仅Linux）"""
+    pids = [pid]
+    for current in pids:
+        try:
+            for task in os.listdir(f'/proc/{current}/task'):
+                with open(f'/proc/{current}/task/{task}/children') as f:
+                    pids.extend(int(child) for child in f.read().split())
+        except OSError:
+            continue
+    return pids
+
+
+def rss_bytes(pid):
+    """返回进程树的常驻内存总量（字节），无法获取时返回None"""
+    total = 0
+    found = False
+    for current in _process_tree(pid):
+        try:
+            with open(f'/proc/{current}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        total += int(line.split()[1]) * 1024
+                        found = True
+                        break
+        except OSError:
+            continue
+    return total if found else None
+
+
+class MCPServerProcess:
+    """以子进程方式通过启动器运行MCP Server"""
+
+    def __init__(self, port, workers=1, threads=8, extra_env=None):
+        self.port = port
+        self.url = f'http://127.0.0.1:{port}'
+        env = dict(os.environ)
+        env.update({
+            'MCP_SERVER_PORT': str(port),
+            'MCP_WORKERS': str(workers),
+            'MCP_THREADS': str(threads),
+            'MCP_DEBUG_MODE': 'false',
+            'MCP_LOG_LEVEL': 'WARNING'
+        })
+        env.update(extra_env or {})
+        self.process = subprocess.Popen(
+            [sys.executable, 'mcp_launcher.py'],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+
+    def wait_ready(self, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError('MCP Server 进程启动失败')
+            try:
+                requests.get(self.url + '/', timeout=1)
+                return self
+            except requests.exceptions.RequestException:
+                time.sleep(0.2)
+        raise RuntimeError('等待 MCP Server 启动超时')
+
+    @property
+    def pid(self):
+        return self.process.pid
+
+    def stop(self):
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+
+def percentile(sorted_values, q):
+    """返回已排序列表的分位数（最近秩法）"""
+    if not sorted_values:
+        return None
+    index = min(int(q * len(sorted_values)), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def run_load(url, params, concurrency, total_requests):
+    """以固定并发数发送total_requests个请求，返回统计结果"""
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+    counter = iter(range(total_requests))
+
+    def worker():
+        nonlocal errors
+        session = requests.Session()
+        local_latencies = []
+        local_errors = 0
+        while True:
+            with lock:
+                if next(counter, None) is None:
+                    break
+            started = time.perf_counter()
+            try:
+                response = session.get(url, params=params, timeout=60)
+                response.content
+                if response.status_code >= 400:
+                    local_errors += 1
+            except requests.exceptions.RequestException:
+                local_errors += 1
+            local_latencies.append(time.perf_counter() - started)
+        session.close()
+        with lock:
+            latencies.extend(local_latencies)
+            errors += local_errors
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for _ in range(concurrency):
+            executor.submit(worker)
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'concurrency': concurrency,
+        'requests': len(latencies),
+        'errors': errors,
+        'elapsed_seconds': round(elapsed, 4),
+        'throughput_rps': round(len(latencies) / elapsed, 2) if elapsed else None,
+        'latency_ms': {
+            'p50': _ms(percentile(latencies, 0.50)),
+            'p95': _ms(percentile(latencies, 0.95)),
+            'p99': _ms(percentile(latencies, 0.99)),
+            'max': _ms(latencies[-1] if latencies else None)
+        }
+    }
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 3) if seconds is not None else None
+
+
+def run_benchmark(server_url, upstream_url, concurrency_levels, total_requests, endpoints, server_pid=None):
+    """对每个端点和并发级别运行压测"""
+    scenarios = {
+        'forward': ('/api/forward', {'url': upstream_url + '/bench'}),
+        'ip-info': ('/api/ip-info', None)
+    }
+    results = []
+    for endpoint in endpoints:
+        path, params = scenarios[endpoint]
+        # 预热，建立连接并填充缓存
+        run_load(server_url + path, params, 1, min(total_requests, 10))
+        for concurrency in concurrency_levels:
+            result = run_load(server_url + path, params, concurrency, total_requests)
+            result['endpoint'] = endpoint
+            if server_pid is not None:
+                result['server_rss_bytes'] = rss_bytes(server_pid)
+            results.append(result)
+            print(
+                f"{endpoint:8s} c={concurrency:<4d} {result['throughput_rps']:>10} req/s  "
+                f"p50={result['latency_ms']['p50']}ms p95={result['latency_ms']['p95']}ms "
+                f"p99={result['latency_ms']['p99']}ms errors={result['errors']}"
+            )
+    return results
+
+
+def compare(results, baseline_file):
+    """与之前的结果文件对比吞吐量和p99延迟"""
+    with open(baseline_file, 'r') as f:
+        baseline = json.load(f)
+    previous = {(item['endpoint'], item['concurrency']): item for item in baseline.get('results', [])}
+    print(f"\n=== 与 {baseline_file} 对比 ===")
+    for item in results:
+        old = previous.get((item['endpoint'], item['concurrency']))
+        if not old or not old.get('throughput_rps'):
+            continue
+        throughput = (item['throughput_rps'] - old['throughput_rps']) / old['throughput_rps'] * 100
+        p99_old = old['latency_ms']['p99']
+        p99 = (item['latency_ms']['p99'] - p99_old) / p99_old * 100 if p99_old else 0
+        print(f"{item['endpoint']:8s} c={item['concurrency']:<4d} 吞吐量 {throughput:+.1f}%  p99 {p99:+.1f}%")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='MCP Server 压测工具')
+    parser.add_argument('--concurrency', default='1,8,32', help='逗号分隔的并发级别')
+    parser.add_argument('--requests', type=int, default=1000, help='每个并发级别发送的请求数')
+    parser.add_argument('--endpoints', default='forward,ip-info', help='压测的端点：forward、ip-info')
+    parser.add_argument('--latency-ms', type=float, default=0, help='上游桩服务的响应延迟（毫秒）')
+    parser.add_argument('--payload-bytes', type=int, default=1024, help='上游响应体大小（字节）')
+    parser.add_argument('--error-rate', type=float, default=0, help='上游返回500的概率（0-1）')
+    parser.add_argument('--workers', type=int, default=1, help='MCP Server工作进程数')
+    parser.add_argument('--threads', type=int, default=32, help='每个工作进程的线程数')
+    parser.add_argument('--server-url', help='压测已运行的MCP Server，而不是启动新进程')
+    parser.add_argument('--output', default='bench_results.json', help='结果输出文件')
+    parser.add_argument('--compare', help='与之前的结果文件对比')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    concurrency_levels = [int(value) for value in args.concurrency.split(',') if value]
+    endpoints = [value for value in args.endpoints.split(',') if value]
+
+    upstream = FakeUpstream(args.latency_ms / 1000, args.payload_bytes, args.error_rate).start()
+    server = None
+    try:
+        if args.server_url:
+            server_url = args.server_url.rstrip('/')
+            server_pid = None
+        else:
+            server = MCPServerProcess(free_port(), args.workers, args.threads).wait_ready()
+            server_url = server.url
+            server_pid = server.pid
+
+        results = run_benchmark(server_url, upstream.url, concurrency_levels, args.requests, endpoints, server_pid)
+    finally:
+        if server is not None:
+            server.stop()
+        upstream.stop()
+
+    report = {
+        'timestamp': datetime.now().isoformat(),
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count()
+        },
+        'parameters': {
+            'concurrency': concurrency_levels,
+            'requests': args.requests,
+            'endpoints': endpoints,
+            'latency_ms': args.latency_ms,
+            'payload_bytes': args.payload_bytes,
+            'error_rate': args.error_rate,
+            'workers': args.workers,
+            'threads': args.threads
+        },
+        'results': results
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=4)
+    print(f"\n结果已保存到: {args.output}")
+
+    if args.compare:
+        compare(results, args.compare)
+    return report
+
+
+if __name__ == '__main__':
+    main()
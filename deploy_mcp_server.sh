@@ -63,6 +63,9 @@ MCP_SERVER_PORT=5000
 MCP_DEBUG_MODE=false
 MCP_LOG_LEVEL=INFO
 MCP_TIMEOUT=30
+# 工作进程数（0表示按CPU核数）和每个进程的线程数
+MCP_WORKERS=0
+MCP_THREADS=4
 # SSL配置（可选）
 # MCP_SSL_CERT_PATH=ssl/cert.pem
 # MCP_SSL_KEY_PATH=ssl/key.pem
@@ -83,6 +86,9 @@ if [ ! -f "$INSTALL_DIR/mcp_client_server_config.json" ]; then
     "ssl_key_path": "ssl/key.pem",
     "log_level": "INFO",
     "timeout": 30,
+    "workers": 0,
+    "threads": 4,
+    "max_requests": 10000,
     "server_url": "http://127.0.0.1:5000",
     "verify_ssl": false,
     "retry_count": 3,
@@ -119,7 +125,10 @@ User=$USER
 Group=$GROUP
 WorkingDirectory=$INSTALL_DIR
 Environment="PATH=$VENV_DIR/bin"
-ExecStart=$VENV_DIR/bin/python $INSTALL_DIR/mcp_server.py
+ExecStart=$VENV_DIR/bin/python $INSTALL_DIR/mcp_launcher.py
+ExecReload=/bin/kill -HUP \$MAINPID
+KillSignal=SIGTERM
+TimeoutStopSec=35
 Restart=always
 RestartSec=5
 
@@ -185,5 +194,6 @@ echo -e "您可以通过以下命令管理服务："
 echo -e "  systemctl start $SERVICE_NAME   # 启动服务"
 echo -e "  systemctl stop $SERVICE_NAME    # 停止服务"
 echo -e "  systemctl restart $SERVICE_NAME # 重启服务"
+echo -e "  systemctl reload $SERVICE_NAME  # 平滑重启工作进程"
 echo -e "  systemctl status $SERVICE_NAME  # 查看服务状态"
 echo -e "\n请根据需要修改配置文件：${BLUE}$INSTALL_DIR/.env${NC} 和 ${BLUE}$INSTALL_DIR/mcp_client_server_config.json${NC}"
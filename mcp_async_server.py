@@ -0,0 +1,331 @@
+# -*- coding: utf-8 -*-
+"""
+MCP Server 异步服务模式
+
+基于asyncio和aiohttp提供与mcp_server.py相同的路由（/、/api/ip-info、/api/forward），
+转发请求使用非阻塞HTTP客户端，慢上游不会占用工作线程。
+/api/tunnel 将WebSocket升级请求和SSE等长时间的流式响应与上游双向桥接（见mcp_tunnel.py）。
+两个接口都与同步模式共用客户端限流配额（rate_limit_*），
+并按routes路由表改写目标、套用请求头过滤和证书校验策略，/api/forward还套用超时上限；
+异步模式没有响应缓存，路由的cache设置不起作用。
+在配置文件中设置 "server_mode": "async" 即可启用。
+"""
+import asyncio
+import json
+import logging
+import ssl
+
+import aiohttp
+from aiohttp import web
+
+from mcp_server import (
+    config, IPInfoResource, HOP_BY_HOP_HEADERS,
+    filter_forward_headers, create_ssl_context, server_info, routing_table, rate_limit,
+    RateLimitCostExceeded
+)
+from mcp_tunnel import TunnelManager, TunnelLimitReached
+
+logger = logging.getLogger(__name__)
+logger.setLevel(getattr(logging, config['log_level'], logging.INFO))
+
+
+# 异步MCP转发资源类
+class AsyncForwardResource:
+    """使用aiohttp客户端会话异步转发HTTP请求"""
+
+    def __init__(self):
+        self.session = None
+
+    async def start(self, app):
+        """应用启动时创建共享的keep-alive客户端会话"""
+        connector = aiohttp.TCPConnector(
+            limit=config['async_max_connections'],
+            keepalive_timeout=config['pool_idle_timeout'],
+            ssl=False  # 忽略SSL验证（生产环境应启用）
+        )
+        self.session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=config['timeout']),
+            auto_decompress=True
+        )
+
+    async def close(self, app):
+        """应用关闭时释放客户端会话"""
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def forward_request(self, url, method, headers=None, data=None, params=None, timeout=None, ssl=False):
+        """转发HTTP请求，timeout为None时使用会话的超时设置"""
+        try:
+            logger.info("异步转发请求: %s %s", method, url, extra={'method': method, 'url': url})
+            async with self.session.request(
+                method, url, headers=headers or {}, data=data, params=params, ssl=ssl,
+                **({'timeout': aiohttp.ClientTimeout(total=timeout)} if timeout is not None else {})
+            ) as response:
+                body = await response.read()
+                logger.info("响应状态码: %s", response.status)
+
+                # 尝试解析JSON响应
+                try:
+                    response_data = json.loads(body)
+                except ValueError:
+                    response_data = body.decode(response.get_encoding(), errors='replace')
+
+                return {
+                    'status_code': response.status,
+                    'headers': dict(response.headers),
+                    'data': response_data
+                }
+        except Exception as e:
+            logger.error("异步转发请求失败: %s", e, extra={'url': url})
+            return {
+                'status_code': 500,
+                'error': str(e) or e.__class__.__name__
+            }
+
+    async def stream_request(self, request, url, method, headers=None, data=None, params=None,
+                             timeout=None, ssl=False):
+        """以流式方式转发HTTP请求，逐块写回客户端"""
+        try:
+            upstream = await self.session.request(
+                method, url, headers=headers or {}, data=data, params=params, ssl=ssl,
+                **({'timeout': aiohttp.ClientTimeout(total=timeout)} if timeout is not None else {})
+            )
+        except Exception as e:
+            logger.error("异步流式转发请求失败: %s", e, extra={'url': url})
+            return web.json_response({'status_code': 500, 'error': str(e) or e.__class__.__name__}, status=500)
+
+        try:
+            response = web.StreamResponse(status=upstream.status)
+            encoded = 'Content-Encoding' in upstream.headers
+            for key, value in upstream.headers.items():
+                lower_key = key.lower()
+                if lower_key in HOP_BY_HOP_HEADERS or lower_key == 'content-encoding':
+                    continue
+                # aiohttp会解压响应体，解压后的长度与上游声明的不同
+                if lower_key == 'content-length' and encoded:
+                    continue
+                response.headers[key] = value
+            await response.prepare(request)
+            async for chunk in upstream.content.iter_chunked(config['stream_chunk_size']):
+                await response.write(chunk)
+            await response.write_eof()
+            return response
+        finally:
+            upstream.release()
+
+
+forward_resource = AsyncForwardResource()
+
+tunnel_manager = TunnelManager(
+    max_tunnels=config['tunnel_max_connections'],
+    idle_timeout=config['tunnel_idle_timeout'],
+    max_frame_bytes=config['tunnel_max_frame_bytes'],
+    heartbeat=config['tunnel_heartbeat'],
+    connect_timeout=config['timeout']
+)
+
+
+def apply_tunnel_config(old, new, changed):
+    """配置变更后调整隧道参数，已打开的WebSocket隧道保持原有的帧上限和心跳"""
+    tunnel_manager.max_tunnels = new['tunnel_max_connections']
+    tunnel_manager.idle_timeout = new['tunnel_idle_timeout']
+    tunnel_manager.max_frame_bytes = new['tunnel_max_frame_bytes']
+    tunnel_manager.heartbeat = new['tunnel_heartbeat']
+    tunnel_manager.connect_timeout = new['timeout']
+
+
+config.add_listener(apply_tunnel_config)
+
+# 路由证书校验方式对应的SSL上下文，客户端会话默认不校验证书
+_ssl_contexts = {}
+
+
+def route_ssl(verify):
+    """将路由的verify（true、false或CA证书路径）转换为aiohttp请求的ssl参数"""
+    if verify is False:
+        return False
+    context = _ssl_contexts.get(verify)
+    if context is None:
+        context = ssl.create_default_context(cafile=verify if isinstance(verify, str) else None)
+        _ssl_contexts[verify] = context
+    return context
+
+
+def rate_limited(request):
+    """按客户端限流，超出配额时返回带Retry-After的429响应，消耗超过桶容量时返回413响应，否则返回None"""
+    try:
+        retry_after = rate_limit(request.headers, request.remote)
+    except RateLimitCostExceeded as e:
+        return web.json_response({'status_code': 413, 'error': str(e)}, status=413)
+    if retry_after is None:
+        return None
+    return web.json_response({'status_code': 429, 'error': 'Rate limit exceeded'}, status=429,
+                             headers={'Retry-After': str(retry_after)})
+
+
+def route_request(url, headers):
+    """按路由表改写目标并过滤请求头，返回(url, headers, 路由, ssl参数)，未匹配时路由为None"""
+    route, url = routing_table.match(url)
+    if route is None:
+        return url, headers, None, False
+    return url, route.filter_headers(headers), route, route_ssl(route.verify)
+
+
+# 首页路由
+async def index(request):
+    """首页，返回服务器信息"""
+    return web.json_response(server_info())
+
+# IP信息路由
+async def get_ip_info(request):
+    """获取出口IP信息（在线程池中执行阻塞查询）"""
+    loop = asyncio.get_running_loop()
+    ip_info = await loop.run_in_executor(None, IPInfoResource.get_ip_info)
+    return web.json_response(ip_info)
+
+# 运行统计路由
+async def get_stats(request):
+    """获取服务器运行统计信息"""
+    connector = forward_resource.session.connector
+    return web.json_response({
+        'async_connector': {
+            'limit': connector.limit,
+            'limit_per_host': connector.limit_per_host
+        },
+        'tunnels': tunnel_manager.stats()
+    })
+
+# Prometheus指标路由
+async def get_metrics(request):
+    """以Prometheus文本格式导出隧道指标"""
+    return web.Response(body=tunnel_manager.prometheus().encode(),
+                        headers={'Content-Type': 'text/plain; version=0.0.4'})
+
+# 通用请求转发路由
+async def forward_request(request):
+    """转发HTTP请求"""
+    # 按客户端限流
+    limited = rate_limited(request)
+    if limited is not None:
+        return limited
+
+    # 获取目标URL
+    url = request.query.get('url')
+    if not url:
+        return web.json_response({'error': 'Missing target URL'}, status=400)
+
+    # 是否使用流式透传模式
+    stream = config['stream_mode'] or request.headers.get('X-MCP-Stream', '').lower() in ('1', 'true')
+
+    # 获取请求头，目标匹配路由时按路由改写并过滤
+    headers = filter_forward_headers(request.headers.items())
+    url, headers, route, ssl_option = route_request(url, headers)
+    timeout = route.cap_timeout(None) if route is not None else None
+
+    # 获取请求数据，大请求体或分块传输的请求体直接流式上传
+    length = request.content_length
+    if request.body_exists and (length is None or length > config['stream_request_threshold']):
+        data = request.content
+    else:
+        data = await request.read() or None
+
+    # 获取查询参数（排除url参数）
+    params = {
+        key: value for key, value in request.query.items()
+        if key.lower() != 'url'
+    }
+
+    # 流式转发请求
+    if stream:
+        return await forward_resource.stream_request(
+            request, url, request.method, headers, data, params, timeout, ssl_option
+        )
+
+    # 转发请求
+    result = await forward_resource.forward_request(
+        url, request.method, headers, data, params, timeout, ssl_option
+    )
+
+    # 返回响应
+    if 'error' in result:
+        return web.json_response(result, status=result.get('status_code', 500))
+
+    response = web.Response(
+        body=json.dumps(result['data']).encode(),
+        status=result['status_code'],
+        content_type='application/json'
+    )
+
+    # 设置响应头
+    for key, value in result['headers'].items():
+        lower_key = key.lower()
+        if lower_key not in ['content-length', 'content-encoding'] and lower_key not in HOP_BY_HOP_HEADERS:
+            response.headers[key] = value
+
+    return response
+
+
+# 流式隧道路由
+async def tunnel(request):
+    """将客户端连接与上游长连接桥接：WebSocket升级请求双向转发帧，其余请求流式透传响应体"""
+    limited = rate_limited(request)
+    if limited is not None:
+        return limited
+
+    url = request.query.get('url')
+    if not url:
+        return web.json_response({'error': 'Missing target URL'}, status=400)
+
+    # 隧道是长连接，只套用路由的目标改写、请求头过滤和证书校验，空闲由tunnel_idle_timeout控制
+    url, headers, _, ssl_option = route_request(url, filter_forward_headers(request.headers.items()))
+    params = {
+        key: value for key, value in request.query.items()
+        if key.lower() != 'url'
+    }
+    try:
+        if request.headers.get('Upgrade', '').lower() == 'websocket':
+            return await tunnel_manager.websocket(request, url, headers, params, ssl_option)
+        data = request.content if request.body_exists else None
+        return await tunnel_manager.stream(request, url, request.method, headers, data, params, ssl_option)
+    except TunnelLimitReached as e:
+        return web.json_response(
+            {'status_code': 503, 'error': str(e)}, status=503,
+            headers={'Retry-After': str(config['shed_retry_after'])}
+        )
+
+
+def create_app():
+    """创建aiohttp应用"""
+    app = web.Application(client_max_size=config['stream_request_threshold'])
+    app.on_startup.append(forward_resource.start)
+    app.on_startup.append(tunnel_manager.start)
+    app.on_cleanup.append(forward_resource.close)
+    app.on_cleanup.append(tunnel_manager.close)
+    app.router.add_get('/', index)
+    app.router.add_get('/api/ip-info', get_ip_info)
+    app.router.add_get('/api/stats', get_stats)
+    app.router.add_get('/metrics', get_metrics)
+    for method in ('GET', 'POST', 'PUT', 'DELETE', 'PATCH'):
+        app.router.add_route(method, '/api/forward', forward_request)
+        app.router.add_route(method, '/api/tunnel', tunnel)
+    return app
+
+
+def run_async_server():
+    """启动异步服务器"""
+    context = create_ssl_context()
+    scheme = 'HTTPS' if context is not None else 'HTTP'
+    logger.info("MCP Server 启动成功 (%s, async)，端口: %s", scheme, config['server_port'])
+    web.run_app(
+        create_app(),
+        host='0.0.0.0',
+        port=config['server_port'],
+        ssl_context=context,
+        print=None
+    )
+
+
+if __name__ == '__main__':
+    run_async_server()
@@ -2,12 +2,138 @@ import requests
 import json
 import os
 import logging
+import random
+import threading
+import time
+import asyncio
 from datetime import datetime
 
+import aiohttp
+
 # 配置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# 已解析的配置文件，按绝对路径缓存，文件修改时间变化时重新解析
+_config_file_cache = {}
+_config_file_lock = threading.Lock()
+
+def _read_config_file(config_file):
+    """读取并解析配置文件，多个客户端实例共享同一份解析结果"""
+    path = os.path.abspath(config_file)
+    mtime = os.stat(path).st_mtime_ns
+    with _config_file_lock:
+        cached = _config_file_cache.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        with open(path, 'r') as f:
+            data = json.load(f)
+        _config_file_cache[path] = (mtime, data)
+    logger.info(f"成功加载配置文件: {config_file}")
+    return data
+
+def load_config(config_file):
+    """加载配置文件
+    
+    Args:
+        config_file: 配置文件路径
+    
+    Returns:
+        dict: 配置字典
+    """
+    default_config = {
+        'server_url': 'http://127.0.0.1:5000',
+        'timeout': 30,
+        'retry_count': 3,
+        'retry_delay': 2,
+        'retry_max_delay': 30,
+        'retry_budget_ratio': 0.2,
+        'retry_budget_max': 10,
+        'verify_ssl': False,
+        'max_concurrency': 100
+    }
+    
+    # 从配置文件加载配置
+    if os.path.exists(config_file):
+        try:
+            default_config.update(_read_config_file(config_file))
+        except Exception as e:
+            logger.error(f"加载配置文件失败: {e}")
+    else:
+        logger.warning(f"配置文件不存在: {config_file}，使用默认配置")
+    
+    # 环境变量覆盖配置
+    for key, value in default_config.items():
+        env_key = f'MCP_{key.upper()}'
+        if env_key in os.environ:
+            env_value = os.environ[env_key]
+            # 根据值的类型进行转换
+            if isinstance(value, bool):
+                default_config[key] = env_value.lower() == 'true'
+            elif isinstance(value, int):
+                try:
+                    default_config[key] = int(env_value)
+                except ValueError:
+                    pass
+            elif isinstance(value, float):
+                try:
+                    default_config[key] = float(env_value)
+                except ValueError:
+                    pass
+            else:
+                default_config[key] = env_value
+            logger.info(f"环境变量覆盖配置: {key} = {default_config[key]}")
+    
+    return default_config
+
+# 服务器过载或网关错误时才值得重试的状态码
+RETRYABLE_STATUS = {429, 502, 503, 504}
+
+def _parse_retry_after(value):
+    """解析以秒为单位的Retry-After响应头，无法解析时返回None"""
+    try:
+        return max(float(value), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+class RetryPolicy:
+    """带抖动的指数退避和重试预算
+    
+    第n次重试前等待[0, min(retry_max_delay, retry_delay * 2^n)]内的随机时间，
+    服务器返回Retry-After时至少等待该时间。
+    每个请求向预算存入retry_budget_ratio个令牌（上限retry_budget_max），每次重试消耗一个令牌，
+    预算耗尽时不再重试，避免上游故障时重试把负载放大数倍。
+    """
+    
+    def __init__(self, config):
+        self.config = config
+        self._lock = threading.Lock()
+        self._tokens = float(config.get('retry_budget_max', 10))
+    
+    def record_request(self):
+        """记录一次新请求，向预算存入令牌"""
+        with self._lock:
+            self._tokens = min(
+                float(self.config.get('retry_budget_max', 10)),
+                self._tokens + self.config.get('retry_budget_ratio', 0.2)
+            )
+    
+    def allow_retry(self):
+        """预算充足时消耗一个令牌并返回True"""
+        with self._lock:
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+    
+    def backoff(self, attempt, retry_after=None):
+        """返回第attempt次失败后的等待秒数"""
+        max_delay = self.config.get('retry_max_delay', 30)
+        delay = random.uniform(0, min(max_delay, self.config.get('retry_delay', 2) * 2 ** attempt))
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, max_delay))
+        return delay
+
 class MCPClient:
     """MCP服务器客户端，用于与MCP服务器进行通信"""
     
@@ -19,6 +145,9 @@ class MCPClient:
         """
         self.config = self.load_config(config_file)
         self.server_url = self.config.get('server_url', 'http://127.0.0.1:5000')
+        # 持久会话，在多次调用之间复用keep-alive连接
+        self.session = requests.Session()
+        self.retry_policy = RetryPolicy(self.config)
         
     def load_config(self, config_file):
         """加载配置文件
@@ -29,44 +158,7 @@ class MCPClient:
         Returns:
             dict: 配置字典
         """
-        default_config = {
-            'server_url': 'http://127.0.0.1:5000',
-            'timeout': 30,
-            'retry_count': 3,
-            'retry_delay': 2,
-            'verify_ssl': False
-        }
-        
-        # 从配置文件加载配置
-        if os.path.exists(config_file):
-            try:
-                with open(config_file, 'r') as f:
-                    config = json.load(f)
-                default_config.update(config)
-                logger.info(f"成功加载配置文件: {config_file}")
-            except Exception as e:
-                logger.error(f"加载配置文件失败: {e}")
-        else:
-            logger.warning(f"配置文件不存在: {config_file}，使用默认配置")
-        
-        # 环境变量覆盖配置
-        for key, value in default_config.items():
-            env_key = f'MCP_{key.upper()}'
-            if env_key in os.environ:
-                env_value = os.environ[env_key]
-                # 根据值的类型进行转换
-                if isinstance(value, bool):
-                    default_config[key] = env_value.lower() == 'true'
-                elif isinstance(value, int):
-                    try:
-                        default_config[key] = int(env_value)
-                    except ValueError:
-                        pass
-                else:
-                    default_config[key] = env_value
-                logger.info(f"环境变量覆盖配置: {key} = {default_config[key]}")
-        
-        return default_config
+        return load_config(config_file)
         
     def _send_request(self, endpoint, method='GET', **kwargs):
         """向MCP服务器发送请求
@@ -89,20 +181,20 @@ class MCPClient:
         request_kwargs.update(kwargs)
         
         # 添加请求头
-        headers = request_kwargs.get('headers', {})
+        headers = dict(request_kwargs.get('headers') or {})
         headers.setdefault('Content-Type', 'application/json')
         request_kwargs['headers'] = headers
         
         # 重试机制
         retry_count = self.config.get('retry_count', 3)
-        retry_delay = self.config.get('retry_delay', 2)
+        self.retry_policy.record_request()
         
         for attempt in range(retry_count):
             try:
                 logger.info(f"发送请求: {method} {url}")
                 
                 # 发送请求
-                response = requests.request(method, url, **request_kwargs)
+                response = self.session.request(method, url, **request_kwargs)
                 
                 # 检查响应状态
                 response.raise_for_status()
@@ -116,10 +208,15 @@ class MCPClient:
             except requests.exceptions.RequestException as e:
                 logger.error(f"请求失败 (尝试 {attempt + 1}/{retry_count}): {e}")
                 
-                # 如果不是最后一次尝试，则等待后重试
-                if attempt < retry_count - 1:
-                    import time
-                    time.sleep(retry_delay)
+                # 只重试连接错误、超时和过载类状态码，且受重试预算限制
+                retry_after = None
+                retryable = True
+                if isinstance(e, requests.exceptions.HTTPError) and e.response is not None:
+                    retryable = e.response.status_code in RETRYABLE_STATUS
+                    retry_after = _parse_retry_after(e.response.headers.get('Retry-After'))
+                
+                if attempt < retry_count - 1 and retryable and self.retry_policy.allow_retry():
+                    time.sleep(self.retry_policy.backoff(attempt, retry_after))
                 else:
                     logger.error(f"请求最终失败: {e}")
                     return {'status': 'error', 'message': str(e)}
@@ -176,6 +273,37 @@ class MCPClient:
             params=forward_params
         )
     
+    def forward_batch(self, batch, stream=False):
+        """在一次往返中并行转发多个请求
+        
+        Args:
+            batch: 请求描述列表，每项包含url，可选method、headers、data、params、timeout
+            stream: 为True时返回生成器，按完成顺序产出带index字段的结果
+        
+        Returns:
+            list: 与batch顺序一致的结果列表（stream为False时）
+        """
+        if stream:
+            return self._stream_batch(batch)
+        return self._send_request('/api/forward/batch', method='POST', data=json.dumps(batch))
+    
+    def _stream_batch(self, batch):
+        """以NDJSON方式接收批量转发结果"""
+        url = f"{self.server_url}/api/forward/batch"
+        logger.info(f"发送请求: POST {url}")
+        with self.session.post(
+            url,
+            data=json.dumps(batch),
+            headers={'Content-Type': 'application/json', 'Accept': 'application/x-ndjson'},
+            timeout=self.config.get('timeout', 30),
+            verify=self.config.get('verify_ssl', False),
+            stream=True
+        ) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if line:
+                    yield json.loads(line)
+    
     def get_weather_info(self, location):
         """获取天气信息（示例功能）
         
@@ -237,6 +365,167 @@ class MCPClient:
             
         return self.config
 
+    def close(self):
+        """关闭持久会话"""
+        self.session.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+class AsyncMCPClient:
+    """基于asyncio的MCP服务器客户端，接口与MCPClient一致
+    
+    所有请求共享一个keep-alive连接池，并发请求数受max_concurrency限制，重试等待不会阻塞事件循环。
+    """
+    
+    def __init__(self, config_file='mcp_client_server_config.json'):
+        """初始化异步MCP客户端
+        
+        Args:
+            config_file: 配置文件路径
+        """
+        self.config = load_config(config_file)
+        self.server_url = self.config.get('server_url', 'http://127.0.0.1:5000')
+        self._semaphore = asyncio.Semaphore(self.config.get('max_concurrency', 100))
+        self._session = None
+        self.retry_policy = RetryPolicy(self.config)
+    
+    def _get_session(self):
+        """延迟创建共享的客户端会话（必须在事件循环中调用）"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.config.get('max_concurrency', 100),
+                ssl=None if self.config.get('verify_ssl', False) else False
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.config.get('timeout', 30))
+            )
+        return self._session
+    
+    async def close(self):
+        """关闭客户端会话"""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+    
+    async def _send_request(self, endpoint, method='GET', **kwargs):
+        """向MCP服务器发送请求
+        
+        Args:
+            endpoint: API端点
+            method: 请求方法
+            **kwargs: 其他请求参数
+        
+        Returns:
+            dict: 响应结果
+        """
+        url = f"{self.server_url}{endpoint}"
+        
+        # 添加请求头
+        headers = dict(kwargs.pop('headers', None) or {})
+        headers.setdefault('Content-Type', 'application/json')
+        
+        # 重试机制
+        retry_count = self.config.get('retry_count', 3)
+        self.retry_policy.record_request()
+        
+        for attempt in range(retry_count):
+            try:
+                logger.info(f"发送请求: {method} {url}")
+                
+                async with self._semaphore:
+                    async with self._get_session().request(method, url, headers=headers, **kwargs) as response:
+                        response.raise_for_status()
+                        
+                        # 尝试解析JSON响应
+                        text = await response.text()
+                        try:
+                            return json.loads(text)
+                        except ValueError:
+                            return {'status': 'success', 'data': text}
+                    
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.error(f"请求失败 (尝试 {attempt + 1}/{retry_count}): {e!r}")
+                
+                # 只重试连接错误、超时和过载类状态码，且受重试预算限制
+                retry_after = None
+                retryable = True
+                if isinstance(e, aiohttp.ClientResponseError):
+                    retryable = e.status in RETRYABLE_STATUS
+                    retry_after = _parse_retry_after((e.headers or {}).get('Retry-After'))
+                
+                if attempt < retry_count - 1 and retryable and self.retry_policy.allow_retry():
+                    await asyncio.sleep(self.retry_policy.backoff(attempt, retry_after))
+                else:
+                    logger.error(f"请求最终失败: {e!r}")
+                    return {'status': 'error', 'message': str(e) or e.__class__.__name__}
+    
+    async def get_server_status(self):
+        """获取MCP服务器状态
+        
+        Returns:
+            dict: 服务器状态信息
+        """
+        return await self._send_request('/')
+    
+    async def get_ip_info(self):
+        """获取出口IP信息
+        
+        Returns:
+            dict: IP信息
+        """
+        return await self._send_request('/api/ip-info')
+    
+    async def forward_request(self, target_url, method='GET', headers=None, data=None, params=None):
+        """转发HTTP请求到目标URL
+        
+        Args:
+            target_url: 目标URL
+            method: 请求方法
+            headers: 请求头
+            data: 请求数据
+            params: 查询参数
+        
+        Returns:
+            dict: 转发请求的响应结果
+        """
+        # 准备查询参数
+        forward_params = {'url': target_url}
+        if params:
+            forward_params.update({key: str(value) for key, value in params.items()})
+        
+        # 如果data是字典，转换为JSON字符串
+        request_data = json.dumps(data) if isinstance(data, dict) else data
+        
+        return await self._send_request(
+            '/api/forward',
+            method=method,
+            headers=headers,
+            data=request_data,
+            params=forward_params
+        )
+    
+    async def forward_batch(self, batch):
+        """在一次往返中并行转发多个请求
+        
+        Args:
+            batch: 请求描述列表
+        
+        Returns:
+            list: 与batch顺序一致的结果列表
+        """
+        return await self._send_request('/api/forward/batch', method='POST', data=json.dumps(batch))
+
 # 示例用法
 if __name__ == '__main__':
     # 创建MCP客户端实例
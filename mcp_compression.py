@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""
+MCP Server 内容编码协商与压缩
+
+根据Accept-Encoding协商客户端支持的编码（gzip，以及安装了brotli/zstandard时的br和zstd），
+提供一次性压缩和流式压缩。br和zstd为可选依赖，未安装时不参与协商。
+"""
+import gzip
+import zlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# 服务器优先使用的编码顺序（客户端q值相同时）
+PREFERRED_ENCODINGS = ('zstd', 'br', 'gzip')
+
+# 值得压缩的内容类型，图片、视频等已压缩的内容不再压缩
+COMPRESSIBLE_TYPES = ('text/', 'application/json', 'application/javascript', 'application/xml',
+                      'application/x-ndjson', '+json', '+xml')
+
+
+def available_encodings():
+    """返回本进程可用于压缩的编码"""
+    encodings = []
+    if zstandard is not None:
+        encodings.append('zstd')
+    if brotli is not None:
+        encodings.append('br')
+    encodings.append('gzip')
+    return encodings
+
+
+def parse_accept_encoding(value):
+    """解析Accept-Encoding头，返回{编码: q值}"""
+    result = {}
+    for item in (value or '').split(','):
+        parts = item.strip().split(';')
+        encoding = parts[0].strip().lower()
+        if not encoding:
+            continue
+        q = 1.0
+        for param in parts[1:]:
+            name, _, number = param.strip().partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    q = float(number)
+                except ValueError:
+                    q = 0.0
+        result[encoding] = q
+    return result
+
+
+def accepts(accept_encoding, encoding):
+    """客户端是否接受指定编码"""
+    accepted = parse_accept_encoding(accept_encoding)
+    return accepted.get(encoding.lower(), accepted.get('*', 0.0)) > 0
+
+
+def negotiate(accept_encoding):
+    """选择客户端接受且本进程可用的最佳编码，没有时返回None"""
+    accepted = parse_accept_encoding(accept_encoding)
+    best, best_q = None, 0.0
+    for encoding in available_encodings():
+        q = accepted.get(encoding, accepted.get('*', 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def compressible(content_type):
+    """内容类型是否值得压缩（事件流需要逐条送达，不压缩）"""
+    content_type = (content_type or '').split(';')[0].strip().lower()
+    if content_type == 'text/event-stream':
+        return False
+    return any(
+        content_type.startswith(kind) if kind.endswith('/') else
+        content_type.endswith(kind) if kind.startswith('+') else
+        content_type == kind
+        for kind in COMPRESSIBLE_TYPES
+    )
+
+
+class _Compressor:
+    """统一的流式压缩接口：compress(data)返回已产出的压缩数据，flush()结束压缩"""
+
+    def __init__(self, encoding, level):
+        if encoding == 'gzip':
+            self._obj = zlib.compressobj(level, zlib.DEFLATED, 31)
+            self._compress, self._flush = self._obj.compress, self._obj.flush
+        elif encoding == 'br':
+            self._obj = brotli.Compressor(quality=level)
+            self._compress, self._flush = self._obj.process, self._obj.finish
+        elif encoding == 'zstd':
+            self._obj = zstandard.ZstdCompressor(level=level).compressobj()
+            self._compress, self._flush = self._obj.compress, self._obj.flush
+        else:
+            raise ValueError(f'Unsupported encoding: {encoding}')
+
+    def compress(self, data):
+        return self._compress(data)
+
+    def flush(self):
+        return self._flush()
+
+
+def compressor(encoding, level):
+    """创建流式压缩器"""
+    return _Compressor(encoding, level)
+
+
+def compress(data, encoding, level):
+    """一次性压缩数据"""
+    if encoding == 'gzip':
+        return gzip.compress(data, compresslevel=level, mtime=0)
+    if encoding == 'br':
+        return brotli.compress(data, quality=level)
+    if encoding == 'zstd':
+        return zstandard.ZstdCompressor(level=level).compress(data)
+    raise ValueError(f'Unsupported encoding: {encoding}')
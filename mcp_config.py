@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+MCP Server 配置热加载
+
+ConfigStore以只读快照的方式保存当前配置：读取直接访问快照字典，请求路径上不加锁；
+修改或重新加载时复制出新字典后整体替换，读取方看到的要么是完整的旧配置，要么是完整的新配置。
+收到SIGHUP或配置文件修改时间变化时重新加载，并把变化的键通知给监听函数，
+由各子系统（连接池、缓存、线程池等）在线调整。
+"""
+import logging
+import os
+import signal
+import threading
+import time
+from collections.abc import MutableMapping
+
+logger = logging.getLogger(__name__)
+
+
+class ConfigStore(MutableMapping):
+    """可热加载的配置快照"""
+
+    def __init__(self, loader, path=None):
+        """初始化配置
+
+        Args:
+            loader: 返回完整配置字典的函数loader(strict=False)，
+                    strict为True时配置文件无法解析应抛出异常而不是退回默认值
+            path: 被监视的配置文件路径
+        """
+        self._loader = loader
+        self.path = path
+        self._data = loader()
+        self._mtime = self._file_mtime()
+        self._write_lock = threading.RLock()
+        self._listeners = []
+        self._watcher_pid = None
+        self.reloads = 0
+        self.reload_errors = 0
+
+    # 读取：直接访问当前快照
+    def __getitem__(self, key):
+        return self._data[key]
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __repr__(self):
+        return f'ConfigStore({self._data!r})'
+
+    def snapshot(self):
+        """返回当前配置快照（需要同时读取多个相关键时使用）"""
+        return self._data
+
+    # 修改：复制后整体替换
+    def __setitem__(self, key, value):
+        self.update({key: value})
+
+    def __delitem__(self, key):
+        with self._write_lock:
+            data = dict(self._data)
+            del data[key]
+            self._swap(data)
+
+    def update(self, *args, **kwargs):
+        with self._write_lock:
+            data = dict(self._data)
+            data.update(*args, **kwargs)
+            self._swap(data)
+
+    def replace(self, data):
+        """整体替换为新的配置字典"""
+        with self._write_lock:
+            self._swap(dict(data))
+
+    def _swap(self, data):
+        """替换快照并通知监听函数（调用方需持有写锁）"""
+        old = self._data
+        self._data = data
+        changed = {key for key in old.keys() | data.keys() if old.get(key) != data.get(key)}
+        if not changed:
+            return
+        for listener in list(self._listeners):
+            try:
+                listener(old, data, changed)
+            except Exception:
+                logger.exception("应用配置变更失败")
+
+    def add_listener(self, listener):
+        """注册配置变更监听函数listener(old, new, changed_keys)"""
+        self._listeners.append(listener)
+
+    def _file_mtime(self):
+        try:
+            return os.stat(self.path).st_mtime_ns if self.path else None
+        except OSError:
+            return None
+
+    def reload(self):
+        """重新加载配置文件，成功返回True"""
+        with self._write_lock:
+            self._mtime = self._file_mtime()
+            try:
+                data = self._loader(strict=True)
+            except Exception as e:
+                self.reload_errors += 1
+                logger.error("重新加载配置失败: %s", e)
+                return False
+            self._swap(data)
+            self.reloads += 1
+        logger.info("配置已重新加载: %s", self.path)
+        return True
+
+    def install_signal_handler(self):
+        """收到SIGHUP时重新加载配置（须在主线程调用，Windows上不可用）"""
+        if not hasattr(signal, 'SIGHUP'):
+            return False
+        # 在信号处理函数中只启动线程，避免在持有锁的代码中间重入
+        signal.signal(signal.SIGHUP, lambda signum, frame: threading.Thread(target=self.reload, daemon=True).start())
+        return True
+
+    def start_watcher(self, interval_key='config_watch_interval'):
+        """启动监视配置文件修改时间的后台线程，每个进程只启动一次"""
+        if self.path is None or self._watcher_pid == os.getpid() or not self._data.get(interval_key):
+            return False
+        self._watcher_pid = os.getpid()
+
+        def watch():
+            while True:
+                interval = self._data.get(interval_key)
+                if not interval:
+                    break
+                time.sleep(interval)
+                # 等待期间监视被关闭时不再检查
+                if self._data.get(interval_key) and self._file_mtime() != self._mtime:
+                    self.reload()
+            self._watcher_pid = None
+
+        threading.Thread(target=watch, name='config-watcher', daemon=True).start()
+        return True
+
+    def stats(self):
+        """返回配置加载统计信息"""
+        return {
+            'path': self.path,
+            'reloads': self.reloads,
+            'reload_errors': self.reload_errors,
+            'watching': self._watcher_pid == os.getpid()
+        }
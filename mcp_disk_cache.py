@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+"""
+MCP Server 磁盘响应缓存
+
+响应缓存的持久化层，服务重启后缓存仍然有效：
+- 所有记录追加写入同一个段文件，记录头包含键摘要、过期时间、长度和CRC校验；
+- 每个进程在内存中维护紧凑索引（键摘要 -> 偏移和长度），通过扫描段文件的新增部分增量更新；
+- 读取通过mmap直接访问页缓存，响应体以memoryview返回，不经过read()复制；
+- 段文件超过max_bytes时重写为只含有效记录的新文件（最新的记录优先），并原子替换旧文件。
+同一主机上的多个工作进程通过fcntl.flock协调：追加和压缩持有排他锁，扫描持有共享锁。
+其他进程压缩后段文件的inode发生变化，读取方据此重新映射和扫描。
+"""
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from hashlib import blake2b
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+FILE_MAGIC = b'MCPDISK1'
+RECORD_MAGIC = b'MCR1'
+# 记录头：魔数、键摘要、过期时间（Unix时间戳）、元数据长度、响应体长度、CRC32
+RECORD_HEADER = struct.Struct('<4s16sdIII')
+
+
+def available():
+    """当前平台是否支持磁盘缓存（需要fcntl.flock）"""
+    return fcntl is not None
+
+
+def _digest(key):
+    return blake2b(key.encode(), digest_size=16).digest()
+
+
+class DiskCache:
+    """基于追加写段文件和mmap读取的多进程共享缓存"""
+
+    def __init__(self, path, max_bytes=256 * 1024 * 1024, compact_ratio=0.5):
+        """初始化磁盘缓存
+
+        Args:
+            path: 段文件路径，同目录下创建同名的.lock锁文件
+            max_bytes: 段文件大小上限，超过时压缩
+            compact_ratio: 压缩后保留的记录不超过max_bytes的该比例
+        """
+        if fcntl is None:
+            raise RuntimeError('Disk cache requires fcntl')
+        self.path = path
+        self.max_bytes = max_bytes
+        self.compact_ratio = compact_ratio
+        self._lock = threading.Lock()
+        self._pid = None
+        self._fd = None
+        self._lock_fd = None
+        self._inode = None
+        self._map = None
+        self._index = {}
+        self._scanned = 0
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.compactions = 0
+        self.corrupt_tails = 0
+
+    # 文件和锁
+    def _flock(self, operation):
+        fcntl.flock(self._lock_fd, operation)
+
+    def _open(self, locked=False):
+        """打开（必要时创建）段文件并重建索引，调用方需持有线程锁
+
+        Args:
+            locked: 调用方是否已持有文件锁
+        """
+        if self._pid != os.getpid():
+            # fork出的子进程需要自己的文件描述，否则flock与父进程共享
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            if self._lock_fd is not None:
+                os.close(self._lock_fd)
+            self._lock_fd = os.open(self.path + '.lock', os.O_RDWR | os.O_CREAT, 0o644)
+            self._pid = os.getpid()
+        if self._fd is not None:
+            os.close(self._fd)
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o644)
+        if os.pread(self._fd, len(FILE_MAGIC), 0) != FILE_MAGIC:
+            if not locked:
+                self._flock(fcntl.LOCK_EX)
+            try:
+                if os.pread(self._fd, len(FILE_MAGIC), 0) != FILE_MAGIC:
+                    # 新文件或无法识别的格式：重新开始
+                    os.ftruncate(self._fd, 0)
+                    os.write(self._fd, FILE_MAGIC)
+            finally:
+                if not locked:
+                    self._flock(fcntl.LOCK_UN)
+        self._inode = os.fstat(self._fd).st_ino
+        self._map = None
+        self._index = {}
+        self._scanned = len(FILE_MAGIC)
+        self._scan(locked)
+
+    def _remap(self, size):
+        if self._map is None or len(self._map) < size:
+            # 旧映射可能仍被返回的memoryview引用，交给垃圾回收关闭
+            self._map = mmap.mmap(self._fd, size, prot=mmap.PROT_READ)
+
+    def _scan(self, locked=False):
+        """扫描段文件新增的记录并更新索引，遇到不完整或校验失败的记录时停止"""
+        if not locked:
+            self._flock(fcntl.LOCK_SH)
+        try:
+            size = os.fstat(self._fd).st_size
+            if size <= self._scanned:
+                return size
+            self._remap(size)
+            offset = self._scanned
+            while offset + RECORD_HEADER.size <= size:
+                magic, digest, expires, meta_len, body_len, crc = RECORD_HEADER.unpack_from(self._map, offset)
+                start = offset + RECORD_HEADER.size
+                end = start + meta_len + body_len
+                if magic != RECORD_MAGIC or end > size or zlib.crc32(self._map[start:end]) != crc:
+                    break
+                self._index[digest] = (start, meta_len, body_len, expires)
+                offset = end
+            self._scanned = offset
+            return size
+        finally:
+            if not locked:
+                self._flock(fcntl.LOCK_UN)
+
+    def _sync(self, locked=False):
+        """与其他进程的写入同步，返回段文件大小"""
+        if self._pid != os.getpid() or self._fd is None:
+            self._open(locked)
+        try:
+            inode = os.stat(self.path).st_ino
+        except FileNotFoundError:
+            inode = None
+        if inode != self._inode:
+            self._open(locked)
+        return self._scan(locked)
+
+    # 读写
+    def get(self, key):
+        """查找缓存记录
+
+        Returns:
+            (meta, body, expires)：元数据字典、响应体memoryview和过期时间戳，未找到时返回None
+        """
+        digest = _digest(key)
+        with self._lock:
+            self._sync()
+            location = self._index.get(digest)
+            if location is None:
+                self.misses += 1
+                return None
+            start, meta_len, body_len, expires = location
+            self._remap(start + meta_len + body_len)
+            view = memoryview(self._map)[start:start + meta_len + body_len]
+            meta = json.loads(bytes(view[:meta_len]))
+            if meta.get('key') != key:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return meta, view[meta_len:], expires
+
+    def put(self, key, meta, body, expires):
+        """追加一条记录，同一键的旧记录在压缩时被丢弃
+
+        Args:
+            key: 缓存键
+            meta: 可JSON序列化的元数据
+            body: 响应体字节串
+            expires: 过期时间（Unix时间戳）
+        """
+        meta_bytes = json.dumps(dict(meta, key=key), ensure_ascii=False).encode()
+        payload = meta_bytes + body
+        record = RECORD_HEADER.pack(
+            RECORD_MAGIC, _digest(key), expires, len(meta_bytes), len(body), zlib.crc32(payload)
+        ) + payload
+        if len(record) > self.max_bytes * self.compact_ratio:
+            return False
+        with self._lock:
+            if self._pid != os.getpid() or self._fd is None:
+                self._open()
+            self._flock(fcntl.LOCK_EX)
+            try:
+                size = self._sync(locked=True)
+                if size != self._scanned:
+                    # 进程在写入中途崩溃留下的不完整记录，截断后继续追加
+                    os.ftruncate(self._fd, self._scanned)
+                    self.corrupt_tails += 1
+                os.write(self._fd, record)
+                self._index[_digest(key)] = (
+                    self._scanned + RECORD_HEADER.size, len(meta_bytes), len(body), expires
+                )
+                self._scanned += len(record)
+                self.writes += 1
+                if self._scanned > self.max_bytes:
+                    self._compact()
+            finally:
+                self._flock(fcntl.LOCK_UN)
+        return True
+
+    def _compact(self):
+        """重写段文件，只保留最新的有效记录（调用方需持有排他锁）"""
+        self._remap(self._scanned)
+        now = time.time()
+        budget = self.max_bytes * self.compact_ratio
+        kept = []
+        total = len(FILE_MAGIC)
+        for start, meta_len, body_len, expires in sorted(
+                self._index.values(), reverse=True):
+            if expires <= now and not json.loads(self._map[start:start + meta_len]).get('revalidate'):
+                continue
+            size = RECORD_HEADER.size + meta_len + body_len
+            if total + size > budget:
+                continue
+            kept.append((start - RECORD_HEADER.size, meta_len + body_len))
+            total += size
+
+        self._replace(self._map[offset:offset + RECORD_HEADER.size + length] for offset, length in sorted(kept))
+        self.compactions += 1
+
+    def _replace(self, records):
+        """用新文件原子替换段文件并重新打开（调用方需持有排他锁）
+
+        不能原地截断：其他进程可能仍映射着旧文件，访问被截掉的部分会触发SIGBUS。
+        """
+        temp_path = f'{self.path}.{os.getpid()}.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(FILE_MAGIC)
+            for record in records:
+                f.write(record)
+        os.replace(temp_path, self.path)
+        self._open(locked=True)
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            if self._pid != os.getpid() or self._fd is None:
+                self._open()
+            self._flock(fcntl.LOCK_EX)
+            try:
+                self._replace(())
+            finally:
+                self._flock(fcntl.LOCK_UN)
+
+    def stats(self):
+        """返回缓存统计信息"""
+        with self._lock:
+            return {
+                'path': self.path,
+                'entries': len(self._index),
+                'segment_bytes': self._scanned,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'writes': self.writes,
+                'compactions': self.compactions,
+                'corrupt_tails': self.corrupt_tails
+            }
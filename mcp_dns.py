@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""
+MCP Server 进程内DNS缓存
+
+转发引擎和IP信息查询共用的解析缓存：
+- 成功结果缓存ttl秒，解析失败的结果缓存negative_ttl秒；
+- 同一主机的多个地址按地址族交错排列（类似Happy Eyeballs），并在每次使用时轮转起始地址；
+- 记录使用超过prefetch_ratio * ttl后，在后台线程中提前刷新，读取方不必等待解析。
+标准库解析器不返回记录的TTL，因此缓存时间由配置决定。
+"""
+import socket
+import threading
+import time
+from collections import OrderedDict
+
+
+class _Entry:
+    """一条缓存记录"""
+
+    __slots__ = ('addresses', 'error', 'expires', 'refresh_at', 'uses')
+
+    def __init__(self, addresses, error, expires, refresh_at):
+        self.addresses = addresses
+        self.error = error
+        self.expires = expires
+        self.refresh_at = refresh_at
+        self.uses = 0
+
+
+def _interleave(addresses):
+    """按地址族交错排列地址，首个地址族保持在前"""
+    families = OrderedDict()
+    for family, address in addresses:
+        families.setdefault(family, []).append(address)
+    groups = list(families.values())
+    result = []
+    for index in range(max((len(group) for group in groups), default=0)):
+        for group in groups:
+            if index < len(group):
+                result.append(group[index])
+    return result
+
+
+class DNSCache:
+    """带TTL、负缓存、地址轮转和后台预取的DNS缓存"""
+
+    def __init__(self, ttl=60, negative_ttl=5, prefetch_ratio=0.8, max_entries=1024,
+                 enabled=True, resolver=socket.getaddrinfo):
+        """初始化DNS缓存
+
+        Args:
+            ttl: 解析成功的记录缓存秒数
+            negative_ttl: 解析失败的记录缓存秒数
+            prefetch_ratio: 记录存在超过ttl的该比例后被使用时，在后台提前刷新
+            max_entries: 最多缓存的记录数，超出时淘汰最久未使用的记录
+            enabled: 为False时每次都直接解析
+            resolver: 解析函数，签名与socket.getaddrinfo相同
+        """
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.prefetch_ratio = prefetch_ratio
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self._resolver = resolver
+        self._entries = OrderedDict()
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.negative_hits = 0
+        self.prefetches = 0
+        self.refresh_errors = 0
+
+    def _lookup(self, host, family):
+        """调用解析器，返回去重并交错排列后的地址列表"""
+        seen = set()
+        addresses = []
+        for info in self._resolver(host, None, family, socket.SOCK_STREAM):
+            address = info[4][0]
+            if address not in seen:
+                seen.add(address)
+                addresses.append((info[0], address))
+        return _interleave(addresses)
+
+    def _store(self, key, addresses, error):
+        now = time.monotonic()
+        ttl = self.ttl if error is None else self.negative_ttl
+        entry = _Entry(addresses, error, now + ttl, now + ttl * self.prefetch_ratio)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _load(self, key):
+        """同步解析并缓存结果"""
+        try:
+            addresses = self._lookup(*key)
+        except socket.gaierror as e:
+            self._store(key, None, e)
+            raise
+        self._store(key, addresses, None)
+        return list(addresses)
+
+    def _prefetch(self, key):
+        """后台刷新记录，失败时保留旧记录直到过期"""
+        try:
+            self._store(key, self._lookup(*key), None)
+        except socket.gaierror:
+            with self._lock:
+                self.refresh_errors += 1
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def resolve(self, host, family=socket.AF_UNSPEC):
+        """返回host的地址列表，每次调用轮转起始地址，解析失败时抛出socket.gaierror"""
+        key = (host.lower(), family)
+        if not self.enabled:
+            return self._lookup(*key)
+
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.expires <= now:
+                self.misses += 1
+                entry = None
+            elif entry.error is not None:
+                self.negative_hits += 1
+                error = entry.error
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                entry.uses += 1
+                index = entry.uses % len(entry.addresses)
+                addresses = entry.addresses[index:] + entry.addresses[:index]
+                prefetch = now >= entry.refresh_at and key not in self._refreshing
+                if prefetch:
+                    self._refreshing.add(key)
+                    self.prefetches += 1
+
+        if entry is None:
+            return self._load(key)
+        if entry.error is not None:
+            raise socket.gaierror(*error.args)
+        if prefetch:
+            threading.Thread(target=self._prefetch, args=(key,), daemon=True).start()
+        return addresses
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """返回缓存统计信息"""
+        with self._lock:
+            lookups = self.hits + self.misses + self.negative_hits
+            return {
+                'enabled': self.enabled,
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'negative_hits': self.negative_hits,
+                'prefetches': self.prefetches,
+                'refresh_errors': self.refresh_errors,
+                'hit_ratio': round((self.hits + self.negative_hits) / lookups, 4) if lookups else None
+            }
@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+"""
+MCP Server HTTP/2上游传输
+
+HTTP2Adapter是requests的传输适配器，底层使用httpx（需要安装httpx[http2]）：
+- 同一主机的并发请求复用少量HTTP/2连接上的多个流，而不是每个请求占用一个套接字；
+- 通过TLS ALPN协商协议，上游不支持HTTP/2时自动使用HTTP/1.1；配置了fallback适配器时，
+  首次请求前探测一次ALPN，不支持HTTP/2的主机改由fallback按其连接池大小并发发送，
+  不会挤在为HTTP/2准备的少量连接上；
+- 返回标准的requests响应对象，转发引擎的流式读取、指标和熔断逻辑无需区分协议。
+未安装httpx或h2时available()返回False，调用方继续使用HTTP/1.1适配器。
+"""
+import socket
+import ssl
+import threading
+from collections import Counter
+from urllib.parse import urlsplit
+
+from requests import Response
+from requests.adapters import BaseAdapter
+from requests.exceptions import ConnectionError, ConnectTimeout, ReadTimeout, Timeout
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+try:
+    import httpx
+    import h2  # noqa: F401  httpx的HTTP/2支持依赖h2
+except ImportError:
+    httpx = None
+
+
+# HTTP/2禁止的连接级头部，由httpx按实际协商的协议自行处理
+_CONNECTION_HEADERS = frozenset({'connection', 'keep-alive', 'proxy-connection', 'transfer-encoding', 'upgrade', 'te'})
+
+
+def available():
+    """是否安装了HTTP/2传输所需的依赖"""
+    return httpx is not None
+
+
+def _timeout(timeout):
+    """将requests的超时参数（秒数或(连接, 读取)元组）转换为httpx.Timeout"""
+    if isinstance(timeout, tuple):
+        connect, read = timeout
+        return httpx.Timeout(read, connect=connect)
+    return httpx.Timeout(timeout)
+
+
+def _negotiated_protocol(url, timeout):
+    """通过TLS ALPN探测上游选择的协议，返回'h2'或'http/1.1'，连接失败时返回None
+
+    只用于选择传输方式，证书由随后的实际请求校验。
+    """
+    parts = urlsplit(url)
+    context = ssl.create_default_context()
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    context.set_alpn_protocols(['h2', 'http/1.1'])
+    try:
+        with socket.create_connection((parts.hostname, parts.port or 443), timeout=timeout) as sock:
+            with context.wrap_socket(sock, server_hostname=parts.hostname) as tls:
+                return tls.selected_alpn_protocol() or 'http/1.1'
+    except (OSError, ValueError):
+        return None
+
+
+class _RawStream:
+    """为httpx响应提供requests所需的raw接口（stream/read/close）"""
+
+    def __init__(self, response):
+        self._response = response
+        self.headers = response.headers
+        self.status = response.status_code
+        self.version = response.http_version
+
+    def stream(self, amt=65536, decode_content=True):
+        if decode_content:
+            return self._response.iter_bytes(amt)
+        return self._response.iter_raw(amt)
+
+    def read(self, amt=None, decode_content=True):
+        return b''.join(self.stream(amt, decode_content))
+
+    def close(self):
+        self._response.close()
+
+    def release_conn(self):
+        self._response.close()
+
+
+class HTTP2Adapter(BaseAdapter):
+    """通过HTTP/2多路复用发送请求的requests适配器"""
+
+    def __init__(self, max_connections=2, verify=False, fallback=None):
+        """初始化适配器
+
+        Args:
+            max_connections: 每个主机最多建立的连接数，每个HTTP/2连接可同时承载多个请求
+            verify: 默认的证书校验方式（True、False或CA证书路径），请求指定其他方式时另建客户端
+            fallback: 上游不支持HTTP/2时改用的HTTP/1.1适配器，为None时仍由httpx在这些连接上发送
+        """
+        super().__init__()
+        if httpx is None:
+            raise RuntimeError('HTTP/2 transport requires httpx[http2]')
+        self.max_connections = max_connections
+        self.fallback = fallback
+        self.protocol = None
+        self._negotiation = threading.Lock()
+        self._lock = threading.Lock()
+        self._clients = {}
+        self._client_for(verify)
+        self.versions = Counter()
+        self.fallback_requests = 0
+
+    def _client_for(self, verify):
+        """返回使用指定证书校验方式的httpx客户端，同一主机不同路由的校验方式可能不同"""
+        client = self._clients.get(verify)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(verify)
+                if client is None:
+                    client = httpx.Client(
+                        http2=True,
+                        verify=ssl.create_default_context(cafile=verify) if isinstance(verify, str) else verify,
+                        follow_redirects=False,
+                        limits=httpx.Limits(
+                            max_connections=self.max_connections, max_keepalive_connections=self.max_connections
+                        )
+                    )
+                    self._clients[verify] = client
+        return client
+
+    def _negotiate(self, request, timeout):
+        """返回上游支持的协议，首次请求时探测一次，并发的其他请求等待探测结果"""
+        if self.protocol is None:
+            with self._negotiation:
+                if self.protocol is None:
+                    connect_timeout = timeout[0] if isinstance(timeout, tuple) else timeout
+                    self.protocol = _negotiated_protocol(request.url, connect_timeout)
+        return self.protocol
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        if self.fallback is not None and self._negotiate(request, timeout) == 'http/1.1':
+            response = self.fallback.send(request, stream=stream, timeout=timeout, verify=verify, cert=cert, proxies=proxies)
+            with self._lock:
+                self.versions['HTTP/1.1'] += 1
+                self.fallback_requests += 1
+            return response
+
+        headers = {key: value for key, value in request.headers.items() if key.lower() not in _CONNECTION_HEADERS}
+        client = self._client_for(verify)
+        body = request.body
+        if hasattr(body, 'read') and not hasattr(body, '__iter__'):
+            # requests可以直接上传只有read()的文件类对象，httpx只接受字节串或可迭代对象
+            body = iter(lambda stream=body: stream.read(65536), b'')
+        outgoing = client.build_request(
+            request.method, request.url, headers=headers, content=body,
+            timeout=_timeout(timeout)
+        )
+        try:
+            upstream = client.send(outgoing, stream=True)
+        except httpx.ConnectTimeout as e:
+            raise ConnectTimeout(e, request=request)
+        except httpx.TimeoutException as e:
+            raise ReadTimeout(e, request=request)
+        except httpx.HTTPError as e:
+            raise ConnectionError(e, request=request)
+        with self._lock:
+            self.versions[upstream.http_version] += 1
+
+        response = Response()
+        response.status_code = upstream.status_code
+        response.headers = CaseInsensitiveDict(upstream.headers.items())
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.raw = _RawStream(upstream)
+        response.reason = upstream.reason_phrase
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        if not stream:
+            try:
+                response.content
+            except httpx.TimeoutException as e:
+                raise Timeout(e, request=request)
+        return response
+
+    def close(self):
+        for client in list(self._clients.values()):
+            client.close()
+
+    def stats(self):
+        """返回httpx建立的连接数和发送的请求数，以及各协议版本的请求数（含交给fallback的请求）"""
+        pools = [getattr(getattr(client, '_transport', None), '_pool', None) for client in list(self._clients.values())]
+        with self._lock:
+            return {
+                'connections': sum(len(pool.connections) for pool in pools if pool is not None),
+                'requests': sum(self.versions.values()) - self.fallback_requests,
+                'versions': dict(self.versions)
+            }
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+MCP Server JSON编解码
+
+安装了orjson时使用原生实现（解析和序列化都比标准库快数倍），否则使用标准库json。
+orjson不支持的输入（NaN/Infinity字面量、超过64位的整数等）自动回退到标准库处理，
+因此两种实现对外行为一致。
+"""
+import json
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+BACKENDS = ('orjson', 'json')
+
+_backend = 'orjson' if orjson is not None else 'json'
+
+
+def set_backend(name):
+    """选择编解码实现：auto、orjson或json"""
+    global _backend
+    if name == 'auto':
+        name = 'orjson' if orjson is not None else 'json'
+    if name not in BACKENDS:
+        raise ValueError(f'Unknown JSON backend: {name}')
+    if name == 'orjson' and orjson is None:
+        raise ValueError('orjson is not installed')
+    _backend = name
+
+
+def backend():
+    """返回当前使用的编解码实现"""
+    return _backend
+
+
+def loads(data):
+    """解析JSON，data可以是bytes或str"""
+    if _backend == 'orjson':
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(data)
+
+
+def dumps(obj):
+    """序列化为UTF-8编码的JSON字节串"""
+    if _backend == 'orjson':
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            pass
+    return json.dumps(obj).encode()
+
+
+def is_json(content_type):
+    """内容类型是否为JSON"""
+    content_type = (content_type or '').split(';')[0].strip().lower()
+    return content_type == 'application/json' or content_type.endswith('+json')
+
+
+class JSONProvider(DefaultJSONProvider):
+    """让Flask的jsonify和request.get_json使用同一套编解码实现"""
+
+    def dumps(self, obj, **kwargs):
+        # jsonify紧凑输出时只传入separators，此时可以使用原生实现；按Flask的sort_keys设置排序键，
+        # 但orjson总是直接输出UTF-8字符，不像ensure_ascii=True那样转义为\uXXXX（解析结果相同）
+        if _backend == 'orjson' and set(kwargs) <= {'separators'}:
+            option = orjson.OPT_NON_STR_KEYS
+            if self.sort_keys:
+                option |= orjson.OPT_SORT_KEYS
+            try:
+                return orjson.dumps(obj, option=option).decode()
+            except TypeError:
+                pass
+        return super().dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return loads(s)
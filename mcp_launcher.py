@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+"""
+MCP Server 生产启动器
+
+使用gunicorn预派生（pre-fork）多个工作进程共享同一个监听套接字，
+支持SO_REUSEPORT、HUP信号平滑重启以及处理N个请求后回收工作进程。
+工作进程数、线程数等参数来自 mcp_client_server_config.json 或 MCP_* 环境变量。
+调试模式或gunicorn不可用（如Windows）时退回到单进程开发服务器。
+启用HTTPS且安装了hypercorn时，同步模式改由hypercorn运行，通过ALPN与客户端协商HTTP/2，
+不支持HTTP/2的客户端继续使用HTTP/1.1。
+HUP信号和配置文件修改会触发配置热加载：主进程重新读取配置后再启动新的工作进程，
+每个工作进程也各自监视配置文件的修改。
+transport配置为stdio时不监听端口，在当前进程中通过标准输入输出提供MCP JSON-RPC服务。
+"""
+import multiprocessing
+import os
+
+from mcp_rpc import run_stdio
+from mcp_server import app, config, create_ssl_context, logger, rpc_server
+
+try:
+    from gunicorn.app.base import BaseApplication
+except ImportError:
+    BaseApplication = None
+
+try:
+    from hypercorn.config import Config as HypercornConfig
+    from hypercorn.run import run as run_hypercorn
+except ImportError:
+    HypercornConfig = None
+
+
+def worker_count():
+    """返回工作进程数，配置为0时按CPU核数自动计算"""
+    if config['workers'] > 0:
+        return config['workers']
+    return multiprocessing.cpu_count()
+
+
+def ssl_enabled():
+    """证书和私钥是否都存在"""
+    return os.path.exists(config['ssl_cert_path']) and os.path.exists(config['ssl_key_path'])
+
+
+def http2_enabled():
+    """是否通过hypercorn以HTTP/2服务客户端（仅同步模式，需要HTTPS）"""
+    return (
+        config['server_http2'] and HypercornConfig is not None
+        and config['server_mode'] != 'async' and ssl_enabled()
+    )
+
+
+def _on_reload(arbiter):
+    """主进程收到HUP时先重新加载配置，随后派生的工作进程继承新配置"""
+    config.reload()
+
+
+def _post_fork(server, worker):
+    """工作进程启动后监视配置文件"""
+    config.start_watcher()
+
+
+def build_options():
+    """根据服务器配置生成gunicorn参数"""
+    options = {
+        'bind': f"0.0.0.0:{config['server_port']}",
+        'workers': worker_count(),
+        'reuse_port': config['reuse_port'],
+        'max_requests': config['max_requests'],
+        'max_requests_jitter': config['max_requests_jitter'],
+        'graceful_timeout': config['graceful_timeout'],
+        'timeout': config['worker_timeout'],
+        'loglevel': config['log_level'].lower(),
+        'on_reload': _on_reload,
+        'post_fork': _post_fork
+    }
+
+    if config['server_mode'] == 'async':
+        options['worker_class'] = 'aiohttp.GunicornWebWorker'
+    else:
+        options['worker_class'] = 'gthread'
+        options['threads'] = config['threads']
+
+    # 证书和私钥都存在时启用HTTPS
+    if ssl_enabled():
+        options['certfile'] = config['ssl_cert_path']
+        options['keyfile'] = config['ssl_key_path']
+
+    return options
+
+
+def hypercorn_app():
+    """hypercorn工作进程加载的应用，工作进程以spawn方式启动，需在其中各自监视配置文件"""
+    config.start_watcher()
+    return app
+
+
+def build_hypercorn_config():
+    """根据服务器配置生成hypercorn配置"""
+    options = HypercornConfig()
+    options.application_path = 'wsgi:mcp_launcher:hypercorn_app()'
+    options.bind = [f"0.0.0.0:{config['server_port']}"]
+    options.certfile = config['ssl_cert_path']
+    options.keyfile = config['ssl_key_path']
+    options.alpn_protocols = ['h2', 'http/1.1']
+    options.workers = worker_count()
+    options.max_requests = config['max_requests'] or None
+    options.max_requests_jitter = config['max_requests_jitter']
+    options.graceful_timeout = config['graceful_timeout']
+    options.loglevel = config['log_level']
+    return options
+
+
+if BaseApplication is not None:
+    class MCPApplication(BaseApplication):
+        """以编程方式运行gunicorn的应用包装"""
+
+        def __init__(self, application, options=None):
+            self.application = application
+            self.options = options or {}
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                if key in self.cfg.settings and value is not None:
+                    self.cfg.set(key.lower(), value)
+
+        def load(self):
+            return self.application
+
+
+def load_application():
+    """按服务模式返回要运行的应用对象"""
+    if config['server_mode'] == 'async':
+        from mcp_async_server import create_app
+        return create_app()
+    return app
+
+
+def run_dev_server():
+    """以单进程开发服务器运行（调试模式或不支持gunicorn的平台）"""
+    config.install_signal_handler()
+    config.start_watcher()
+    if config['server_mode'] == 'async':
+        from mcp_async_server import run_async_server
+        run_async_server()
+        return
+
+    context = create_ssl_context()
+    scheme = 'HTTPS' if context is not None else 'HTTP'
+    logger.info(f"MCP Server 启动成功 ({scheme}，开发服务器)，端口: {config['server_port']}")
+    app.run(
+        host='0.0.0.0',
+        port=config['server_port'],
+        debug=config['debug_mode'],
+        ssl_context=context,
+        threaded=True
+    )
+
+
+def main():
+    """启动MCP Server"""
+    if config['transport'] == 'stdio':
+        # 标准输出只用于协议消息，日志写入标准错误
+        logger.info("MCP Server 以stdio传输启动")
+        config.start_watcher()
+        run_stdio(rpc_server)
+        return
+
+    if not config['debug_mode'] and http2_enabled():
+        options = build_hypercorn_config()
+        logger.info(f"MCP Server 启动 (HTTPS，HTTP/2)，端口: {config['server_port']}，工作进程: {options.workers}")
+        run_hypercorn(options)
+        return
+
+    if config['debug_mode'] or BaseApplication is None:
+        if BaseApplication is None and not config['debug_mode']:
+            logger.warning("未安装gunicorn，使用单进程开发服务器启动")
+        run_dev_server()
+        return
+
+    options = build_options()
+    logger.info(
+        f"MCP Server 启动 ({'HTTPS' if 'certfile' in options else 'HTTP'})，"
+        f"端口: {config['server_port']}，工作进程: {options['workers']}"
+    )
+    MCPApplication(load_application(), options).run()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+"""
+MCP Server 日志管道
+
+- 调用方只把日志记录放入有界队列，由后台监听线程格式化并写出，队列满时丢弃而不阻塞请求；
+- 支持文本和结构化JSON两种输出格式，extra传入的字段作为JSON记录的顶层字段；
+- 按路由前缀采样INFO及以下级别的日志，WARNING及以上总是输出；
+- truncated()包装的请求体只在日志真正输出时才截断和格式化。
+"""
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+from flask import has_request_context, request
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# LogRecord自带的属性，其余属性视为extra传入的结构化字段
+_RECORD_ATTRS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class _Truncated:
+    """延迟截断的日志参数"""
+
+    __slots__ = ('value', 'limit')
+
+    def __init__(self, value, limit):
+        self.value = value
+        self.limit = limit
+
+    def __str__(self):
+        value = self.value
+        if isinstance(value, (bytes, bytearray)):
+            size = len(value)
+            text = bytes(value[:self.limit]).decode(errors='replace')
+        else:
+            text = str(value)
+            size = len(text)
+        if size > self.limit:
+            return f'{text[:self.limit]}...({size} bytes)'
+        return text
+
+
+def truncated(value, limit):
+    """返回在格式化时才截断为limit字节（或字符）的日志参数"""
+    return _Truncated(value, limit)
+
+
+class JSONFormatter(logging.Formatter):
+    """将日志记录格式化为单行JSON"""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """按路由前缀对INFO及以下级别的日志采样
+
+    采样率来自config['log_sample_rates']（{路由前缀: 0-1}），最长前缀优先；
+    路由取日志记录的route字段，没有时取当前请求的路径。
+    """
+
+    def __init__(self, config):
+        super().__init__()
+        self.config = config
+
+    def filter(self, record):
+        rates = self.config['log_sample_rates']
+        if not rates or record.levelno >= logging.WARNING:
+            return True
+        route = getattr(record, 'route', None)
+        if route is None:
+            if not has_request_context():
+                return True
+            route = request.path
+        prefix = max((prefix for prefix in rates if route.startswith(prefix)), key=len, default=None)
+        if prefix is None:
+            return True
+        rate = rates[prefix]
+        return rate >= 1 or random.random() < rate
+
+
+class AsyncQueueHandler(QueueHandler):
+    """非阻塞的队列日志处理器
+
+    监听线程在第一次写日志时启动，fork出的子进程会重新创建自己的队列和监听线程。
+    """
+
+    def __init__(self, target, maxsize=10000):
+        super().__init__(queue.Queue(maxsize))
+        self.target = target
+        self.maxsize = maxsize
+        self.dropped = 0
+        self._pid = None
+        self._listener = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_listener(self):
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid != os.getpid():
+                self.queue = queue.Queue(self.maxsize)
+                self._listener = QueueListener(self.queue, self.target, respect_handler_level=True)
+                self._listener.start()
+                self._pid = os.getpid()
+
+    def prepare(self, record):
+        """在调用方线程中只合并消息参数，格式化交给监听线程"""
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        self._ensure_listener()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        if self._listener is not None and self._pid == os.getpid():
+            self._listener.stop()
+            self._listener = None
+        super().close()
+
+    def stats(self):
+        """返回队列统计信息"""
+        return {'queued': self.queue.qsize(), 'dropped': self.dropped}
+
+
+def setup_logging(config, logger=None):
+    """按配置在根日志记录器上安装日志管道，返回安装的处理器
+
+    Args:
+        config: 包含log_format、log_async、log_queue_size、log_sample_rates的配置
+        logger: 安装处理器的日志记录器，默认为根日志记录器
+    """
+    logger = logger or logging.getLogger()
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+        handler.close()
+
+    stream = logging.StreamHandler()
+    stream.setFormatter(JSONFormatter() if config['log_format'] == 'json' else logging.Formatter(TEXT_FORMAT))
+    handler = AsyncQueueHandler(stream, config['log_queue_size']) if config['log_async'] else stream
+    handler.addFilter(SamplingFilter(config))
+    logger.addHandler(handler)
+    return handler
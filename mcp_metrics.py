@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+"""
+MCP Server 运行指标
+
+按上游主机聚合转发请求的DNS解析、建立连接、TLS握手、首字节和总耗时，
+以及请求/响应字节数、状态码和进行中的请求数。
+耗时使用固定桶直方图记录，每次观测只需一次二分查找和几次加法，可在满负载下常开。
+"""
+import threading
+import time
+from bisect import bisect_left
+
+# 耗时直方图的桶上界（秒）
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+    0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0
+)
+
+# 记录的耗时阶段
+PHASES = ('dns', 'connect', 'tls', 'ttfb', 'total')
+
+
+class Histogram:
+    """固定桶直方图（调用方负责加锁）"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        """记录一次观测值"""
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def percentile(self, q):
+        """按桶内线性插值估算分位数，没有观测值时返回None"""
+        if self.count == 0:
+            return None
+        target = q * self.count
+        cumulative = 0
+        for index, bucket_count in enumerate(self.counts):
+            if bucket_count and cumulative + bucket_count >= target:
+                lower = self.buckets[index - 1] if index > 0 else 0.0
+                upper = self.buckets[index] if index < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower) * (target - cumulative) / bucket_count
+            cumulative += bucket_count
+        return self.buckets[-1]
+
+    def summary(self):
+        """返回计数、平均值和常用分位数"""
+        return {
+            'count': self.count,
+            'avg': round(self.sum / self.count, 6) if self.count else None,
+            'p50': _round(self.percentile(0.5)),
+            'p95': _round(self.percentile(0.95)),
+            'p99': _round(self.percentile(0.99))
+        }
+
+
+def _round(value):
+    return round(value, 6) if value is not None else None
+
+
+class _HostMetrics:
+    """单个上游主机的指标"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.status_counts = {}
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.histograms = {phase: Histogram() for phase in PHASES}
+
+
+class RequestTrace:
+    """一次上游请求的计时记录"""
+
+    __slots__ = ('host', 'started', 'timings')
+
+    def __init__(self, host):
+        self.host = host
+        self.started = time.perf_counter()
+        self.timings = {}
+
+    def first_byte(self):
+        """收到响应头时调用"""
+        self.timings['ttfb'] = time.perf_counter() - self.started
+
+
+class UpstreamMetrics:
+    """按上游主机聚合的转发指标"""
+
+    def __init__(self):
+        self._hosts = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _host(self, host):
+        metrics = self._hosts.get(host)
+        if metrics is None:
+            with self._lock:
+                metrics = self._hosts.setdefault(host, _HostMetrics())
+        return metrics
+
+    def start(self, host):
+        """开始记录一次上游请求，返回RequestTrace"""
+        trace = RequestTrace(host)
+        metrics = self._host(host)
+        with metrics.lock:
+            metrics.in_flight += 1
+        self._local.trace = trace
+        return trace
+
+    def record_phase(self, phase, seconds):
+        """记录当前线程进行中请求的某个阶段耗时（由连接类在建立连接时调用）"""
+        trace = getattr(self._local, 'trace', None)
+        if trace is not None:
+            trace.timings[phase] = trace.timings.get(phase, 0.0) + seconds
+
+    def finish(self, trace, status_code=None, request_bytes=0, response_bytes=0):
+        """结束记录，status_code为None表示请求失败"""
+        trace.timings['total'] = time.perf_counter() - trace.started
+        if getattr(self._local, 'trace', None) is trace:
+            self._local.trace = None
+        status = str(status_code) if status_code is not None else 'error'
+        metrics = self._host(trace.host)
+        with metrics.lock:
+            metrics.in_flight -= 1
+            metrics.status_counts[status] = metrics.status_counts.get(status, 0) + 1
+            metrics.request_bytes += request_bytes
+            metrics.response_bytes += response_bytes
+            for phase, seconds in trace.timings.items():
+                metrics.histograms[phase].observe(seconds)
+
+    def percentile(self, host, phase, q, min_count=1):
+        """返回某个上游主机某阶段耗时的分位数估计值，观测数不足min_count时返回None"""
+        metrics = self._hosts.get(host)
+        if metrics is None:
+            return None
+        with metrics.lock:
+            histogram = metrics.histograms[phase]
+            if histogram.count < min_count:
+                return None
+            return histogram.percentile(q)
+
+    def stats(self):
+        """返回JSON格式的统计信息"""
+        with self._lock:
+            hosts = list(self._hosts.items())
+        result = {}
+        for host, metrics in hosts:
+            with metrics.lock:
+                result[host] = {
+                    'in_flight': metrics.in_flight,
+                    'status_codes': dict(metrics.status_counts),
+                    'request_bytes': metrics.request_bytes,
+                    'response_bytes': metrics.response_bytes,
+                    'timings': {phase: histogram.summary() for phase, histogram in metrics.histograms.items()}
+                }
+        return result
+
+    def prometheus(self):
+        """返回Prometheus文本格式的指标"""
+        with self._lock:
+            hosts = list(self._hosts.items())
+
+        lines = [
+            '# HELP mcp_upstream_requests_total Forwarded upstream requests by status code.',
+            '# TYPE mcp_upstream_requests_total counter'
+        ]
+        in_flight = ['# HELP mcp_upstream_in_flight Upstream requests currently in flight.',
+                     '# TYPE mcp_upstream_in_flight gauge']
+        byte_lines = ['# HELP mcp_upstream_bytes_total Bytes sent to and received from upstreams.',
+                      '# TYPE mcp_upstream_bytes_total counter']
+        duration = ['# HELP mcp_upstream_duration_seconds Upstream request phase durations.',
+                    '# TYPE mcp_upstream_duration_seconds histogram']
+
+        for host, metrics in hosts:
+            label = escape_label(host)
+            with metrics.lock:
+                for status, count in sorted(metrics.status_counts.items()):
+                    lines.append(f'mcp_upstream_requests_total{{host="{label}",status="{status}"}} {count}')
+                in_flight.append(f'mcp_upstream_in_flight{{host="{label}"}} {metrics.in_flight}')
+                byte_lines.append(f'mcp_upstream_bytes_total{{host="{label}",direction="request"}} {metrics.request_bytes}')
+                byte_lines.append(f'mcp_upstream_bytes_total{{host="{label}",direction="response"}} {metrics.response_bytes}')
+                for phase, histogram in metrics.histograms.items():
+                    if histogram.count == 0:
+                        continue
+                    prefix = f'mcp_upstream_duration_seconds_bucket{{host="{label}",phase="{phase}"'
+                    cumulative = 0
+                    for bucket, bucket_count in zip(histogram.buckets, histogram.counts):
+                        cumulative += bucket_count
+                        duration.append(f'{prefix},le="{bucket}"}} {cumulative}')
+                    duration.append(f'{prefix},le="+Inf"}} {histogram.count}')
+                    duration.append(f'mcp_upstream_duration_seconds_sum{{host="{label}",phase="{phase}"}} {histogram.sum}')
+                    duration.append(f'mcp_upstream_duration_seconds_count{{host="{label}",phase="{phase}"}} {histogram.count}')
+
+        return '\n'.join(lines + in_flight + byte_lines + duration) + '\n'
+
+
+def escape_label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def counter_lines(name, help_text, samples, metric_type='counter'):
+    """生成一组简单计数器（或仪表）的Prometheus文本行
+
+    Args:
+        samples: {标签字符串: 值}，标签字符串形如 'kind="hits"'
+        metric_type: 指标类型，counter或gauge
+    """
+    lines = [f'# HELP {name} {help_text}', f'# TYPE {name} {metric_type}']
+    for labels, value in samples.items():
+        lines.append(f'{name}{{{labels}}} {value}' if labels else f'{name} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+def histogram_lines(name, help_text, histograms):
+    """生成一组直方图的Prometheus文本行（调用方负责加锁）
+
+    Args:
+        histograms: {标签字符串: Histogram}
+    """
+    lines = [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+    for labels, histogram in histograms.items():
+        prefix = f'{labels},' if labels else ''
+        cumulative = 0
+        for bucket, bucket_count in zip(histogram.buckets, histogram.counts):
+            cumulative += bucket_count
+            lines.append(f'{name}_bucket{{{prefix}le="{bucket}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{prefix}le="+Inf"}} {histogram.count}')
+        lines.append(f'{name}_sum{{{labels}}} {histogram.sum}')
+        lines.append(f'{name}_count{{{labels}}} {histogram.count}')
+    return '\n'.join(lines) + '\n'
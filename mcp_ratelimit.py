@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""
+MCP Server 客户端限流
+
+按客户端（API密钥或来源IP）的令牌桶限流，桶状态保存在多个工作进程共同映射的文件中，
+所有进程执行同一份配额，不需要外部服务：
+- 文件由固定数量的槽组成，每个槽记录客户端标识的64位摘要、剩余令牌数和上次更新时间；
+- 槽按8个一组，摘要决定所在的组，组内查找相同摘要或空槽，组满时替换最久未更新的槽
+  （长时间未访问的桶早已补满，替换不会放宽配额）；
+- 每组由进程内的线程锁和对锁文件对应字节的fcntl记录锁（跨进程）共同保护，
+  不同客户端大多落在不同的锁上，一次检查只需两次系统调用。
+时间使用CLOCK_MONOTONIC，同一主机上的所有进程共用同一时钟。
+不支持fcntl的平台（如Windows）退化为进程内的匿名映射，各进程分别限流。
+"""
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+from hashlib import blake2b
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from mcp_metrics import counter_lines
+
+FILE_MAGIC = b'MCPRL001'
+# 文件头：魔数、槽数
+HEADER = struct.Struct('<8sQ')
+# 槽：客户端摘要（0表示空槽）、剩余令牌数、上次更新时间
+SLOT = struct.Struct('<Qdd')
+GROUP_SLOTS = 8
+STRIPES = 256
+
+
+def available():
+    """当前平台是否支持跨进程共享限流状态（需要fcntl）"""
+    return fcntl is not None
+
+
+def _digest(identity):
+    return int.from_bytes(blake2b(identity.encode(), digest_size=8).digest(), 'little') or 1
+
+
+class RateLimiter:
+    """多进程共享的令牌桶限流器"""
+
+    def __init__(self, path=None, slots=65536):
+        """初始化限流器
+
+        Args:
+            path: 共享状态文件路径，同目录下创建同名的.lock锁文件；为None时只在进程内限流
+            slots: 槽数，即同时跟踪的客户端数上限，向上取整为8的倍数
+        """
+        self.path = path if fcntl is not None else None
+        self.groups = max(math.ceil(slots / GROUP_SLOTS), 1)
+        self.slots = self.groups * GROUP_SLOTS
+        self._lock_fd = None
+        self._open()
+        self._reset_locks()
+
+    def _open(self):
+        size = HEADER.size + SLOT.size * self.slots
+        header = HEADER.pack(FILE_MAGIC, self.slots)
+        if self.path is None:
+            self._map = mmap.mmap(-1, size)
+            self._map[:HEADER.size] = header
+            return
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock_fd = os.open(self.path + '.lock', os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+        try:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                if os.fstat(fd).st_size != size or os.pread(fd, HEADER.size, 0) != header:
+                    # 新文件或槽数变化：换用新文件，仍映射旧文件的进程不受影响
+                    os.close(fd)
+                    temp_path = f'{self.path}.{os.getpid()}.tmp'
+                    with open(temp_path, 'wb') as f:
+                        f.write(header)
+                        f.truncate(size)
+                    os.replace(temp_path, self.path)
+                    fd = os.open(self.path, os.O_RDWR)
+                self._map = mmap.mmap(fd, size)
+            finally:
+                os.close(fd)
+        finally:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def _reset_locks(self):
+        """创建进程内的线程锁和计数，fork出的子进程需要重新创建（锁可能在fork时被其他线程持有）"""
+        self._pid = os.getpid()
+        self._locks = [threading.Lock() for _ in range(STRIPES)]
+        self._allowed = [0] * STRIPES
+        self._rejected = [0] * STRIPES
+        self._evictions = [0] * STRIPES
+
+    def acquire(self, identity, rate, burst, cost=1):
+        """为客户端消耗cost个令牌
+
+        Args:
+            identity: 客户端标识
+            rate: 每秒补充的令牌数
+            burst: 桶容量（允许的突发请求数）
+            cost: 本次消耗的令牌数
+
+        Returns:
+            (allowed, retry_after)：是否放行，以及拒绝时建议的重试等待秒数
+        """
+        if self._pid != os.getpid():
+            self._reset_locks()
+        digest = _digest(identity)
+        group = digest % self.groups
+        stripe = group % STRIPES
+        base = HEADER.size + group * GROUP_SLOTS * SLOT.size
+        lock = self._locks[stripe]
+        with lock:
+            if self._lock_fd is not None:
+                fcntl.lockf(self._lock_fd, fcntl.LOCK_EX, 1, stripe)
+            try:
+                now = time.monotonic()
+                offset = self._find_slot(base, digest, stripe)
+                key, tokens, updated = SLOT.unpack_from(self._map, offset)
+                if key != digest or now < updated:
+                    # 新客户端，或状态来自重启前的时钟
+                    tokens = burst
+                else:
+                    tokens = min(burst, tokens + (now - updated) * rate)
+                allowed = tokens >= cost
+                if allowed:
+                    tokens -= cost
+                    self._allowed[stripe] += 1
+                else:
+                    self._rejected[stripe] += 1
+                SLOT.pack_into(self._map, offset, digest, tokens, now)
+            finally:
+                if self._lock_fd is not None:
+                    fcntl.lockf(self._lock_fd, fcntl.LOCK_UN, 1, stripe)
+        if allowed:
+            return True, 0
+        return False, (cost - tokens) / rate if rate > 0 else float('inf')
+
+    def _find_slot(self, base, digest, stripe):
+        """返回组内该客户端的槽偏移，不存在时返回空槽或最久未更新的槽（调用方需持有锁）"""
+        empty = None
+        oldest = None
+        oldest_time = math.inf
+        for index in range(GROUP_SLOTS):
+            offset = base + index * SLOT.size
+            key, _, updated = SLOT.unpack_from(self._map, offset)
+            if key == digest:
+                return offset
+            if key == 0:
+                if empty is None:
+                    empty = offset
+            elif updated < oldest_time:
+                oldest, oldest_time = offset, updated
+        if empty is not None:
+            return empty
+        self._evictions[stripe] += 1
+        return oldest
+
+    def clear(self):
+        """清空所有客户端的状态"""
+        for stripe in range(STRIPES):
+            self._locks[stripe].acquire()
+        try:
+            if self._lock_fd is not None:
+                fcntl.lockf(self._lock_fd, fcntl.LOCK_EX, STRIPES, 0)
+            try:
+                self._map[HEADER.size:] = bytes(len(self._map) - HEADER.size)
+            finally:
+                if self._lock_fd is not None:
+                    fcntl.lockf(self._lock_fd, fcntl.LOCK_UN, STRIPES, 0)
+        finally:
+            for lock in self._locks:
+                lock.release()
+
+    def stats(self):
+        """返回本进程的限流统计信息"""
+        return {
+            'path': self.path,
+            'slots': self.slots,
+            'shared': self.path is not None,
+            'allowed': sum(self._allowed),
+            'rejected': sum(self._rejected),
+            'evictions': sum(self._evictions)
+        }
+
+    def prometheus(self):
+        """返回Prometheus文本格式的限流指标"""
+        stats = self.stats()
+        return (
+            counter_lines('mcp_rate_limit_total', 'Client requests checked by the rate limiter.', {
+                'result="allowed"': stats['allowed'],
+                'result="rejected"': stats['rejected']
+            })
+            + counter_lines('mcp_rate_limit_evictions_total', 'Client buckets evicted from a full slot group.', {
+                '': stats['evictions']
+            })
+        )
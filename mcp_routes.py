@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+"""
+MCP Server 转发路由表
+
+在mcp_client_server_config.json的routes中为转发目标配置路由和策略：
+    "routes": {
+        "github": {"upstream": "https://api.github.com", "timeout": 10,
+                   "headers_allow": ["accept", "authorization"], "cache": true, "verify": true},
+        "https://internal.example.com/": {"verify": "/etc/ssl/internal-ca.pem", "headers_deny": ["cookie"]}
+    }
+键为短路由名（可含/，如 gh/v3）或URL前缀：
+- 短路由名必须配置upstream，转发 url=github/repos/x 时目标为 https://api.github.com/repos/x；
+- URL前缀可以不配置upstream，只为该前缀下的目标套用策略，scheme和主机名不区分大小写，默认端口可省略；
+- upstream也可以是 upstream://组名，由上游组选择副本。
+策略包括timeout（上限秒数）、headers_allow / headers_deny（请求头允许和拒绝列表）、
+cache（是否使用响应缓存）和verify（证书校验：true、false或CA证书路径）。
+路由表在启动和配置热加载时编译为按路径段索引的前缀树，请求头过滤集合也在编译时计算，
+每次转发只需沿前缀树查找一次最长匹配。
+"""
+import logging
+import threading
+
+from mcp_metrics import counter_lines, escape_label
+
+logger = logging.getLogger(__name__)
+
+
+class Route:
+    """编译后的一条路由"""
+
+    __slots__ = ('name', 'upstream', 'timeout', 'cache', 'verify', 'filter_headers', 'hits')
+
+    def __init__(self, name, upstream=None, timeout=None, headers_allow=None, headers_deny=None,
+                 cache=True, verify=False, always_deny=()):
+        """初始化路由
+
+        Args:
+            name: 路由名或URL前缀
+            upstream: 目标基础URL，为None时不改写目标
+            timeout: 转发超时上限（秒），None表示使用全局设置
+            headers_allow: 只转发这些请求头，None表示不限制
+            headers_deny: 不转发这些请求头
+            cache: 是否使用响应缓存
+            verify: 证书校验方式
+            always_deny: 任何路由都不转发的请求头（逐跳头部等）
+        """
+        self.name = name
+        self.upstream = upstream.rstrip('/') if upstream else None
+        self.timeout = timeout
+        self.cache = cache
+        self.verify = verify
+        self.hits = 0
+
+        deny = frozenset(header.lower() for header in headers_deny or ()) | frozenset(always_deny)
+        if headers_allow is not None:
+            keep = frozenset(header.lower() for header in headers_allow) - deny
+            self.filter_headers = lambda headers: {
+                key: value for key, value in headers.items() if key.lower() in keep
+            }
+        elif deny:
+            self.filter_headers = lambda headers: {
+                key: value for key, value in headers.items() if key.lower() not in deny
+            }
+        else:
+            self.filter_headers = dict
+
+    def cap_timeout(self, timeout):
+        """返回不超过路由上限的超时时间，timeout为None时返回路由上限"""
+        if self.timeout is None:
+            return timeout
+        return self.timeout if timeout is None else min(timeout, self.timeout)
+
+
+class _Node:
+    __slots__ = ('children', 'route')
+
+    def __init__(self):
+        self.children = {}
+        self.route = None
+
+
+# 与scheme对应的默认端口，匹配URL前缀时省略
+DEFAULT_PORTS = {'http': ':80', 'ws': ':80', 'https': ':443', 'wss': ':443'}
+
+
+def _normalise(url):
+    """将URL的scheme和主机名转为小写并去掉默认端口，短路由名原样返回"""
+    scheme, separator, rest = url.partition('://')
+    if not separator or not scheme.replace('+', '').replace('-', '').replace('.', '').isalnum():
+        return url
+    scheme = scheme.lower()
+    authority_end = len(rest)
+    for delimiter in '/?#':
+        index = rest.find(delimiter)
+        if index != -1:
+            authority_end = min(authority_end, index)
+    userinfo, at, host = rest[:authority_end].rpartition('@')
+    host = host.lower()
+    default_port = DEFAULT_PORTS.get(scheme)
+    if default_port and host.endswith(default_port):
+        host = host[:-len(default_port)]
+    return f'{scheme}://{userinfo}{at}{host}{rest[authority_end:]}'
+
+
+def _segments(prefix):
+    """将路由名或URL前缀按/拆分为路径段，末尾的/不计入"""
+    return prefix.rstrip('/').split('/')
+
+
+class RoutingTable:
+    """按路径段索引的路由前缀树"""
+
+    def __init__(self, always_deny=()):
+        """初始化路由表
+
+        Args:
+            always_deny: 任何路由都不转发的请求头
+        """
+        self.always_deny = frozenset(always_deny)
+        self._root = _Node()
+        self._routes = []
+        self._lock = threading.Lock()
+
+    def compile(self, routes_config):
+        """按配置重建前缀树，无效的路由记录错误后跳过，整体替换保证查找方不会看到中间状态"""
+        root = _Node()
+        routes = []
+        for name, spec in (routes_config or {}).items():
+            try:
+                upstream = spec.get('upstream')
+                if not upstream and '://' not in name:
+                    raise ValueError('route name without upstream')
+                timeout = spec.get('timeout')
+                route = Route(
+                    name, upstream,
+                    float(timeout) if timeout is not None else None,
+                    spec.get('headers_allow'), spec.get('headers_deny'),
+                    bool(spec.get('cache', True)), spec.get('verify', False), self.always_deny
+                )
+            except (AttributeError, TypeError, ValueError) as e:
+                logger.error("路由配置无效: %s: %s", name, e)
+                continue
+            node = root
+            for segment in _segments(_normalise(name)):
+                node = node.children.setdefault(segment, _Node())
+            node.route = route
+            routes.append(route)
+        self._root = root
+        self._routes = routes
+
+    def match(self, url):
+        """查找目标的最长前缀匹配路由，URL的scheme和主机名不区分大小写，默认端口可写可不写
+
+        Returns:
+            (route, target)：匹配的路由和改写后的目标URL；没有匹配时为(None, url)
+        """
+        node = self._root
+        if not node.children:
+            return None, url
+        normalised = _normalise(url)
+        path_end = len(normalised)
+        for separator in '?#':
+            index = normalised.find(separator)
+            if index != -1:
+                path_end = min(path_end, index)
+
+        matched = None
+        matched_end = 0
+        offset = 0
+        for segment in normalised[:path_end].split('/'):
+            node = node.children.get(segment)
+            if node is None:
+                break
+            offset += len(segment)
+            if node.route is not None:
+                matched, matched_end = node.route, offset
+            offset += 1
+        if matched is None:
+            return None, url
+
+        with self._lock:
+            matched.hits += 1
+        if matched.upstream is None:
+            return matched, url
+        return matched, matched.upstream + normalised[matched_end:]
+
+    def stats(self):
+        """返回各路由的配置摘要和命中次数"""
+        return {
+            route.name: {
+                'upstream': route.upstream,
+                'timeout': route.timeout,
+                'cache': route.cache,
+                'verify': route.verify,
+                'hits': route.hits
+            }
+            for route in self._routes
+        }
+
+    def prometheus(self):
+        """返回Prometheus文本格式的路由命中指标"""
+        return counter_lines('mcp_route_requests_total', 'Forwarded requests matched by each route.', {
+            f'route="{escape_label(route.name)}"': route.hits for route in self._routes
+        })
@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+"""
+MCP Server JSON-RPC传输
+
+实现Model Context Protocol的JSON-RPC 2.0消息处理，供stdio和Streamable HTTP两种传输共用：
+- 支持initialize、ping、tools/list、tools/call以及notifications/cancelled；
+- tools/call在线程池中执行，同一会话中的多个请求可以同时进行，
+  每个请求完成后立即通过send回调发出响应，响应顺序与请求顺序无关（以id对应）；
+- 消息可以是单个JSON对象，也可以是JSON数组（批量）。
+stdio传输按行读取标准输入中的消息，响应逐行写入标准输出；日志只写标准错误。
+"""
+import logging
+import sys
+import threading
+import time
+import uuid
+
+import mcp_json
+
+logger = logging.getLogger(__name__)
+
+PROTOCOL_VERSIONS = ('2025-03-26', '2024-11-05')
+
+# JSON-RPC错误码
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+INTERNAL_ERROR = -32603
+
+
+class Tool:
+    """一个MCP工具：名称、说明、参数JSON Schema和处理函数handler(arguments) -> 结果字典"""
+
+    def __init__(self, name, description, input_schema, handler):
+        self.name = name
+        self.description = description
+        self.input_schema = input_schema
+        self.handler = handler
+
+    def describe(self):
+        return {'name': self.name, 'description': self.description, 'inputSchema': self.input_schema}
+
+
+class RPCError(Exception):
+    """以JSON-RPC错误响应返回给客户端的异常"""
+
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+def _error(request_id, code, message):
+    return {'jsonrpc': '2.0', 'id': request_id, 'error': {'code': code, 'message': message}}
+
+
+def _result(request_id, result):
+    return {'jsonrpc': '2.0', 'id': request_id, 'result': result}
+
+
+def count_requests(payload):
+    """返回消息（或批量消息）将得到的响应数：每个请求和每条格式无效的消息各一个"""
+    messages = payload if isinstance(payload, list) else [payload]
+    if not messages:
+        return 1
+    count = 0
+    for message in messages:
+        if not isinstance(message, dict) or message.get('jsonrpc') != '2.0':
+            count += 1
+        elif 'method' in message and 'id' in message:
+            count += 1
+    return count
+
+
+class RPCServer:
+    """MCP JSON-RPC服务端：工具注册和会话管理"""
+
+    def __init__(self, tools, executor, server_info, session_ttl=3600):
+        """初始化服务端
+
+        Args:
+            tools: Tool列表
+            executor: 执行tools/call的线程池
+            server_info: initialize响应中的serverInfo（name、version）
+            session_ttl: 没有进行中调用的会话空闲多少秒后被回收
+        """
+        self.tools = {tool.name: tool for tool in tools}
+        self.executor = executor
+        self.server_info = server_info
+        self.session_ttl = session_ttl
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+        self.cancelled = 0
+
+    def session(self, session_id=None):
+        """返回指定id的会话，id未知时创建（多进程部署下会话可能落在其他进程）"""
+        now = time.monotonic()
+        with self._lock:
+            for key, idle in list(self._sessions.items()):
+                if not idle._pending and now - idle.last_used > self.session_ttl:
+                    del self._sessions[key]
+            session = self._sessions.get(session_id) if session_id else None
+            if session is None:
+                session = RPCSession(self, session_id or uuid.uuid4().hex)
+                self._sessions[session.id] = session
+            session.last_used = now
+            return session
+
+    def close_session(self, session_id):
+        """结束会话并取消尚未开始的调用"""
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+        if session is not None:
+            session.close()
+        return session is not None
+
+    def stats(self):
+        """返回调用统计信息"""
+        with self._lock:
+            return {
+                'sessions': len(self._sessions),
+                'calls': self.calls,
+                'errors': self.errors,
+                'cancelled': self.cancelled
+            }
+
+
+class RPCSession:
+    """一个MCP会话，记录进行中的调用以便取消"""
+
+    def __init__(self, server, session_id):
+        self.server = server
+        self.id = session_id
+        self.protocol_version = None
+        self.last_used = time.monotonic()
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def receive(self, payload, send):
+        """处理收到的消息（对象或数组），每个响应通过send(message)发出
+
+        被取消的请求不发送响应，而是调用send(None)，便于调用方统计未完成的请求数。
+        """
+        if isinstance(payload, list):
+            if not payload:
+                send(_error(None, INVALID_REQUEST, 'Empty batch'))
+            for message in payload:
+                self._receive_one(message, send)
+        else:
+            self._receive_one(payload, send)
+
+    def _receive_one(self, message, send):
+        if not isinstance(message, dict) or message.get('jsonrpc') != '2.0':
+            send(_error(message.get('id') if isinstance(message, dict) else None, INVALID_REQUEST, 'Invalid Request'))
+            return
+        method = message.get('method')
+        if method is None:
+            # 客户端对服务端请求的响应，本服务端不发出请求，忽略
+            return
+        params = message.get('params') or {}
+        if not isinstance(params, dict):
+            if 'id' in message:
+                send(_error(message['id'], INVALID_PARAMS, 'Params must be an object'))
+            return
+        if 'id' not in message:
+            self._notification(method, params)
+            return
+
+        request_id = message['id']
+        if method == 'tools/call':
+            self._call(request_id, params, send)
+            return
+        try:
+            send(_result(request_id, self._handle(method, params)))
+        except RPCError as e:
+            send(_error(request_id, e.code, e.message))
+
+    def _handle(self, method, params):
+        """处理无需在线程池中执行的请求"""
+        if method == 'initialize':
+            requested = params.get('protocolVersion')
+            self.protocol_version = requested if requested in PROTOCOL_VERSIONS else PROTOCOL_VERSIONS[0]
+            return {
+                'protocolVersion': self.protocol_version,
+                'capabilities': {'tools': {'listChanged': False}},
+                'serverInfo': self.server.server_info
+            }
+        if method == 'ping':
+            return {}
+        if method == 'tools/list':
+            return {'tools': [tool.describe() for tool in self.server.tools.values()]}
+        raise RPCError(METHOD_NOT_FOUND, f'Method not found: {method}')
+
+    def _notification(self, method, params):
+        if method == 'notifications/cancelled':
+            with self._lock:
+                entry = self._pending.get(params.get('requestId'))
+            if entry is not None and entry[0].cancel():
+                # 尚未开始执行的调用被取消，不再发送响应
+                with self._lock:
+                    self._pending.pop(params.get('requestId'), None)
+                with self.server._lock:
+                    self.server.cancelled += 1
+                entry[1](None)
+
+    def _call(self, request_id, params, send):
+        """在线程池中执行工具调用，完成后发送响应"""
+        tool = self.server.tools.get(params.get('name'))
+        if tool is None:
+            send(_error(request_id, INVALID_PARAMS, f"Unknown tool: {params.get('name')}"))
+            return
+        arguments = params.get('arguments') or {}
+        if not isinstance(arguments, dict):
+            send(_error(request_id, INVALID_PARAMS, 'Tool arguments must be an object'))
+            return
+        with self.server._lock:
+            self.server.calls += 1
+
+        def run():
+            try:
+                response = _result(request_id, tool.handler(arguments))
+            except RPCError as e:
+                response = _error(request_id, e.code, e.message)
+            except Exception as e:
+                logger.exception("工具调用失败: %s", tool.name)
+                with self.server._lock:
+                    self.server.errors += 1
+                response = _error(request_id, INTERNAL_ERROR, str(e))
+            with self._lock:
+                self._pending.pop(request_id, None)
+            send(response)
+
+        with self._lock:
+            future = self.server.executor.submit(run)
+            self._pending[request_id] = (future, send)
+
+    def close(self):
+        """取消尚未开始的调用"""
+        with self._lock:
+            pending = list(self._pending.values())
+            self._pending.clear()
+        for future, send in pending:
+            if future.cancel():
+                send(None)
+
+
+def text_result(data, is_error=False):
+    """将数据包装为tools/call结果，文本内容为JSON"""
+    text = data if isinstance(data, str) else mcp_json.dumps(data).decode()
+    return {'content': [{'type': 'text', 'text': text}], 'isError': is_error}
+
+
+def encode(message):
+    """序列化一条JSON-RPC消息"""
+    return mcp_json.dumps(message)
+
+
+def run_stdio(server, stdin=None, stdout=None):
+    """以stdio传输运行：逐行读取请求，响应完成后立即逐行写出
+
+    标准输入关闭后等待进行中的调用完成再返回。
+    """
+    stdin = stdin or sys.stdin.buffer
+    stdout = stdout or sys.stdout.buffer
+    session = server.session()
+    write_lock = threading.Lock()
+
+    def send(message):
+        if message is None:
+            return
+        data = encode(message) + b'\n'
+        with write_lock:
+            stdout.write(data)
+            stdout.flush()
+
+    for line in stdin:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            payload = mcp_json.loads(line)
+        except ValueError:
+            send(_error(None, PARSE_ERROR, 'Parse error'))
+            continue
+        session.receive(payload, send)
+
+    server.executor.shutdown(wait=True)
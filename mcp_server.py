@@ -6,6 +6,40 @@ import json
 from datetime import datetime
 import ssl
 import socket
+import threading
+import math
+import queue
+import time
+from collections import OrderedDict
+from concurrent.futures import (ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED,
+                                TimeoutError as FuturesTimeoutError)
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import NameResolutionError, NewConnectionError, ConnectTimeoutError
+from requests.utils import DEFAULT_ACCEPT_ENCODING
+
+from mcp_metrics import UpstreamMetrics, Histogram, counter_lines, histogram_lines, escape_label
+from mcp_compression import accepts, compress, compressible, compressor, negotiate
+import mcp_json
+from mcp_dns import DNSCache
+from mcp_logging import AsyncQueueHandler, setup_logging, truncated
+from mcp_config import ConfigStore
+from mcp_http2 import HTTP2Adapter, available as http2_available
+from mcp_disk_cache import DiskCache, available as disk_cache_available
+from mcp_upstream import UpstreamGroups, UnknownUpstreamGroup
+from mcp_ratelimit import RateLimiter, available as rate_limit_shared
+from mcp_routes import RoutingTable
+from mcp_rpc import RPCServer, Tool, count_requests, encode, text_result, PARSE_ERROR
+
+if __name__ == '__main__':
+    # 直接运行本文件时交给启动器，启动器以mcp_server模块导入本文件；
+    # 不能继续执行下面的初始化，否则配置、连接池和线程池会在__main__和mcp_server中各创建一份
+    import runpy
+    runpy.run_module('mcp_launcher', run_name='__main__')
+    raise SystemExit(0)
 
 # 配置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -13,18 +47,106 @@ logger = logging.getLogger(__name__)
 
 # 创建Flask应用
 app = Flask(__name__)
+app.json = mcp_json.JSONProvider(app)
+
+# 配置文件路径
+CONFIG_PATH = 'mcp_client_server_config.json'
 
 # 从配置文件加载配置
-def load_config():
-    """加载服务器配置"""
-    config_path = 'mcp_client_server_config.json'
+def load_config(strict=False):
+    """加载服务器配置
+
+    Args:
+        strict: 为True时配置文件无法解析则抛出异常（热加载时使用，避免退回默认配置）
+    """
+    config_path = CONFIG_PATH
     default_config = {
         'server_port': 5000,
-        'debug_mode': True,
+        'debug_mode': False,
         'ssl_cert_path': 'ssl/cert.pem',
+        'server_http2': True,
         'ssl_key_path': 'ssl/key.pem',
         'log_level': 'INFO',
-        'timeout': 30
+        'timeout': 30,
+        'pool_maxsize': 10,
+        'pool_timeout': 10,
+        'pool_idle_timeout': 60,
+        'upstream_http2': True,
+        'upstream_http2_max_connections': 2,
+        'stream_mode': False,
+        'stream_chunk_size': 65536,
+        'stream_request_threshold': 1048576,
+        'server_mode': 'flask',
+        'async_max_connections': 1000,
+        'tunnel_max_connections': 10000,
+        'tunnel_idle_timeout': 300,
+        'tunnel_max_frame_bytes': 1048576,
+        'tunnel_heartbeat': 30,
+        'workers': 0,
+        'threads': 4,
+        'max_requests': 10000,
+        'max_requests_jitter': 1000,
+        'graceful_timeout': 30,
+        'worker_timeout': 60,
+        'reuse_port': True,
+        'ip_info_ttl': 300,
+        'response_cache_enabled': True,
+        'response_cache_max_bytes': 67108864,
+        'disk_cache_enabled': False,
+        'disk_cache_path': 'cache/mcp_response_cache.seg',
+        'disk_cache_max_bytes': 268435456,
+        'batch_max_workers': 32,
+        'batch_max_items': 100,
+        'transport': 'http',
+        'mcp_rpc_max_workers': 64,
+        'mcp_session_ttl': 3600,
+        'max_inflight': 512,
+        'host_max_concurrency': 10,
+        'admission_queue_timeout': 5,
+        'shed_retry_after': 1,
+        'breaker_failure_ratio': 0.5,
+        'breaker_min_requests': 20,
+        'breaker_window': 30,
+        'breaker_open_seconds': 30,
+        'breaker_slow_call': 10,
+        'adaptive_timeout': True,
+        'adaptive_timeout_multiplier': 3,
+        'adaptive_timeout_min': 5,
+        'adaptive_timeout_min_samples': 50,
+        'compression_enabled': True,
+        'compression_min_size': 1024,
+        'gzip_level': 6,
+        'brotli_level': 4,
+        'zstd_level': 3,
+        'coalesce_enabled': True,
+        'coalesce_exclude_prefixes': [],
+        'routes': {},
+        'rate_limit_enabled': False,
+        'rate_limit_rate': 50,
+        'rate_limit_burst': 100,
+        'rate_limit_key_header': 'X-API-Key',
+        'rate_limit_clients': {},
+        'rate_limit_path': 'cache/mcp_rate_limit.bin',
+        'rate_limit_slots': 65536,
+        'upstream_groups': {},
+        'upstream_health_interval': 10,
+        'upstream_health_timeout': 2,
+        'upstream_unhealthy_threshold': 3,
+        'hedge_percentile': 0.95,
+        'hedge_min_samples': 20,
+        'hedge_max_workers': 32,
+        'json_backend': 'auto',
+        'json_passthrough': True,
+        'dns_cache_enabled': True,
+        'dns_ttl': 60,
+        'dns_negative_ttl': 5,
+        'dns_cache_max_entries': 1024,
+        'log_format': 'text',
+        'log_async': True,
+        'log_queue_size': 10000,
+        'log_sample_rates': {},
+        'log_body_max_bytes': 1024,
+        'config_watch_interval': 2
     }
     
     if os.path.exists(config_path):
@@ -33,6 +155,8 @@ def load_config():
                 user_config = json.load(f)
             default_config.update(user_config)
         except Exception as e:
+            if strict:
+                raise
             logger.error(f"加载配置文件失败: {e}")
     
     # 环境变量覆盖配置
@@ -48,109 +172,1973 @@ def load_config():
                     default_config[key] = int(env_value)
                 except ValueError:
                     pass
+            elif isinstance(value, float):
+                try:
+                    default_config[key] = float(env_value)
+                except ValueError:
+                    pass
+            elif isinstance(value, list):
+                default_config[key] = [item.strip() for item in env_value.split(',') if item.strip()]
+            elif isinstance(value, dict):
+                try:
+                    default_config[key] = json.loads(env_value)
+                except ValueError:
+                    pass
             else:
                 default_config[key] = env_value
     
     return default_config
 
-# 加载配置
-config = load_config()
+# 加载配置，修改配置文件或收到SIGHUP时热加载
+config = ConfigStore(load_config, CONFIG_PATH)
 
-# 设置日志级别
+# 设置日志级别，安装异步日志管道
 logger.setLevel(getattr(logging, config['log_level'], logging.INFO))
+log_handler = setup_logging(config)
+
+# 选择JSON编解码实现
+try:
+    mcp_json.set_backend(config['json_backend'])
+except ValueError as e:
+    logger.warning("JSON编解码配置无效，使用默认实现: %s", e)
 
 # IP信息资源类
 class IPInfoResource:
     """提供IP信息相关功能"""
     
+    @staticmethod
+    def fetch_ip_info():
+        """并发查询本地IP、公网IP和地理位置信息，任一查询失败时抛出异常"""
+        def lookup_local_ip():
+            return dns_cache.resolve(socket.gethostname(), socket.AF_INET)[0]
+
+        def lookup_public_ip():
+            response = requests.get('https://api.ipify.org', timeout=5)
+            response.raise_for_status()
+            return response.text
+
+        def lookup_geo_info():
+            # 不指定IP时ipapi.co返回调用方（即本机出口IP）的地理位置
+            return requests.get('https://ipapi.co/json/', timeout=5).json()
+
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            local_ip = executor.submit(lookup_local_ip)
+            public_ip = executor.submit(lookup_public_ip)
+            geo_info = executor.submit(lookup_geo_info)
+            local_ip, public_ip, geo_info = local_ip.result(), public_ip.result(), geo_info.result()
+
+        return {
+            'local_ip': local_ip,
+            'public_ip': public_ip,
+            'location': geo_info.get('city', '') + ', ' + geo_info.get('region', '') + ', ' + geo_info.get('country_name', ''),
+            'isp': geo_info.get('org', '')
+        }
+
     @staticmethod
     def get_ip_info():
-        """获取当前服务器的出口IP信息"""
+        """获取当前服务器的出口IP信息（读取缓存）"""
+        return ip_info_cache.get()
+
+
+class IPInfoCache:
+    """出口IP信息缓存
+
+    后台线程在缓存过期前刷新，读取方直接返回缓存值而不等待外部查询；
+    刷新失败时继续返回旧值，并通过stale标记告知调用方。
+    """
+
+    # 缓存存活到TTL的该比例时开始刷新
+    REFRESH_RATIO = 0.8
+    # 刷新失败后的重试间隔占TTL的比例
+    RETRY_RATIO = 0.1
+
+    def __init__(self, fetch, ttl=300):
+        """初始化缓存
+
+        Args:
+            fetch: 查询IP信息的函数，失败时抛出异常
+            ttl: 缓存有效期（秒）
+        """
+        self._fetch = fetch
+        self.ttl = ttl
+        self._value = None
+        self._fetched_at = 0
+        self._error = None
+        self._refresh_lock = threading.Lock()
+        self._thread_lock = threading.Lock()
+        self._thread_pid = None
+
+    def refresh(self):
+        """执行一次刷新，成功返回True"""
+        with self._refresh_lock:
+            return self._refresh_locked()
+
+    def _refresh_locked(self):
         try:
-            # 获取本地IP地址
-            local_ip = socket.gethostbyname(socket.gethostname())
-            
-            # 获取公网IP地址
-            public_ip = requests.get('https://api.ipify.org', timeout=5).text
-            
-            # 获取地理位置信息
-            geo_info = requests.get(f'https://ipapi.co/{public_ip}/json/', timeout=5).json()
-            
-            return {
-                'local_ip': local_ip,
-                'public_ip': public_ip,
-                'location': geo_info.get('city', '') + ', ' + geo_info.get('region', '') + ', ' + geo_info.get('country_name', ''),
-                'isp': geo_info.get('org', '')
-            }
+            value = self._fetch()
         except Exception as e:
             logger.error(f"获取IP信息失败: {e}")
+            self._error = str(e)
+            return False
+        self._value = value
+        self._fetched_at = time.time()
+        self._error = None
+        return True
+
+    def _next_refresh_delay(self):
+        if self._value is None or self._error is not None:
+            return max(self.ttl * self.RETRY_RATIO, 1)
+        age = time.time() - self._fetched_at
+        return max(self.ttl * self.REFRESH_RATIO - age, 0)
+
+    def _refresh_loop(self):
+        while True:
+            time.sleep(self._next_refresh_delay())
+            self.refresh()
+
+    def _ensure_refresher(self):
+        """确保当前进程中有后台刷新线程（fork出的工作进程需要重新启动线程）"""
+        pid = os.getpid()
+        if self._thread_pid == pid:
+            return
+        with self._thread_lock:
+            if self._thread_pid != pid:
+                threading.Thread(target=self._refresh_loop, name='ip-info-refresher', daemon=True).start()
+                self._thread_pid = pid
+
+    def get(self):
+        """返回缓存的IP信息，仅第一次调用时同步查询，之后的重试都由后台线程完成"""
+        if self._value is None and self._error is None:
+            with self._refresh_lock:
+                if self._value is None and self._error is None:
+                    self._refresh_locked()
+        self._ensure_refresher()
+
+        value = self._value
+        if value is None:
             return {
                 'local_ip': '无法获取',
                 'public_ip': '无法获取',
                 'location': '无法获取',
                 'isp': '无法获取',
-                'error': str(e)
+                'error': self._error
+            }
+
+        result = dict(value)
+        result['cached_at'] = datetime.fromtimestamp(self._fetched_at).isoformat()
+        if self._error is not None or time.time() - self._fetched_at > self.ttl:
+            result['stale'] = True
+            if self._error is not None:
+                result['error'] = self._error
+        return result
+
+
+# 全局IP信息缓存
+ip_info_cache = IPInfoCache(IPInfoResource.fetch_ip_info, ttl=config['ip_info_ttl'])
+
+# 全局上游转发指标
+upstream_metrics = UpstreamMetrics()
+
+# 全局DNS缓存，转发连接和IP信息查询共用
+dns_cache = DNSCache(
+    ttl=config['dns_ttl'],
+    negative_ttl=config['dns_negative_ttl'],
+    max_entries=config['dns_cache_max_entries'],
+    enabled=config['dns_cache_enabled']
+)
+
+# 上游连接
+class _InstrumentedConnectionMixin:
+    """通过DNS缓存解析地址并记录DNS解析和TCP建立连接的耗时"""
+
+    _tcp_elapsed = 0.0
+
+    def _new_conn(self):
+        started = time.perf_counter()
+        host = self._dns_host
+        try:
+            addresses = dns_cache.resolve(host)
+        except socket.gaierror as e:
+            raise NameResolutionError(self.host, self, e) from e
+        resolved = time.perf_counter()
+        upstream_metrics.record_phase('dns', resolved - started)
+
+        # 依次尝试解析出的地址，全部失败时抛出最后一个错误
+        try:
+            for index, address in enumerate(addresses):
+                self._dns_host = address
+                try:
+                    return super()._new_conn()
+                except (NewConnectionError, ConnectTimeoutError):
+                    if index == len(addresses) - 1:
+                        raise
+        finally:
+            self._dns_host = host
+            self._tcp_elapsed = time.perf_counter() - started
+            upstream_metrics.record_phase('connect', time.perf_counter() - resolved)
+
+
+class _InstrumentedHTTPConnection(_InstrumentedConnectionMixin, HTTPConnection):
+    """带耗时记录的HTTP连接"""
+
+
+class _InstrumentedHTTPSConnection(_InstrumentedConnectionMixin, HTTPSConnection):
+    """带耗时记录的HTTPS连接，额外记录TLS握手耗时"""
+
+    def connect(self):
+        started = time.perf_counter()
+        super().connect()
+        upstream_metrics.record_phase('tls', time.perf_counter() - started - self._tcp_elapsed)
+
+
+# 上游连接池
+class _UpstreamHTTPConnectionPool(HTTPConnectionPool):
+    """连接数达到上限时最多等待pool_timeout秒，而不是无限阻塞"""
+
+    ConnectionCls = _InstrumentedHTTPConnection
+
+    def _get_conn(self, timeout=None):
+        if timeout is None:
+            timeout = config['pool_timeout']
+        return super()._get_conn(timeout=timeout)
+
+
+class _UpstreamHTTPSConnectionPool(HTTPSConnectionPool):
+    """HTTPS版本的上游连接池"""
+
+    ConnectionCls = _InstrumentedHTTPSConnection
+
+    def _get_conn(self, timeout=None):
+        if timeout is None:
+            timeout = config['pool_timeout']
+        return super()._get_conn(timeout=timeout)
+
+
+class _UpstreamAdapter(HTTPAdapter):
+    """单个上游主机使用的适配器，限制该主机的最大连接数"""
+
+    def __init__(self, pool_maxsize):
+        super().__init__(pool_connections=1, pool_maxsize=pool_maxsize, pool_block=True)
+
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        super().init_poolmanager(connections, maxsize, block=block, **pool_kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _UpstreamHTTPConnectionPool,
+            'https': _UpstreamHTTPSConnectionPool
+        }
+
+
+class UpstreamSessionPool:
+    """按上游主机维护keep-alive会话，复用已建立的TCP/TLS连接
+
+    http2_connections大于0且安装了httpx[http2]时，HTTPS上游改用HTTP/2适配器，
+    并发请求在少量连接上多路复用，上游不支持HTTP/2时由ALPN协商退回HTTP/1.1连接池。
+    """
+
+    def __init__(self, pool_maxsize=10, idle_timeout=60, http2_connections=0):
+        """初始化连接池
+
+        Args:
+            pool_maxsize: 每个上游主机的最大连接数
+            idle_timeout: 会话空闲多少秒后被回收
+            http2_connections: 每个HTTPS上游主机的HTTP/2连接数，0表示只使用HTTP/1.1
+        """
+        self.pool_maxsize = pool_maxsize
+        self.idle_timeout = idle_timeout
+        self.http2_connections = http2_connections
+        self._sessions = {}
+        # 调整大小后仍有进行中请求的旧会话，按会话id索引
+        self._retired = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def host_key(url):
+        """返回URL对应的上游主机键（scheme://host:port）"""
+        parts = urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc}".lower()
+
+    def _create_session(self, key):
+        session = requests.Session()
+        adapter = _UpstreamAdapter(self.pool_maxsize)
+        session.mount('http://', adapter)
+        if key.startswith('https://') and self.http2_connections > 0 and http2_available():
+            session.mount('https://', HTTP2Adapter(self.http2_connections, fallback=adapter))
+        else:
+            session.mount('https://', adapter)
+        return session
+
+    def _evict_idle(self, now):
+        """回收空闲超时且没有进行中请求的会话（调用方需持有锁）"""
+        for key, entry in list(self._sessions.items()):
+            if entry['active'] == 0 and now - entry['last_used'] > self.idle_timeout:
+                del self._sessions[key]
+                entry['session'].close()
+                self.evictions += 1
+
+    def acquire(self, url):
+        """获取目标URL所属主机的会话，调用方用完后必须调用release"""
+        key = self.host_key(url)
+        now = time.monotonic()
+        with self._lock:
+            self._evict_idle(now)
+            entry = self._sessions.get(key)
+            if entry is None:
+                self.misses += 1
+                entry = {'session': self._create_session(key), 'active': 0, 'last_used': now}
+                self._sessions[key] = entry
+            else:
+                self.hits += 1
+            entry['active'] += 1
+            entry['last_used'] = now
+            return entry['session']
+
+    def release(self, url, session=None):
+        """归还会话，传入session时可正确归还调整大小前取得的旧会话"""
+        key = self.host_key(url)
+        with self._lock:
+            entry = self._sessions.get(key)
+            if session is not None and (entry is None or entry['session'] is not session):
+                retired = self._retired.get(id(session))
+                if retired is not None:
+                    retired['active'] -= 1
+                    if retired['active'] == 0:
+                        del self._retired[id(session)]
+                        retired['session'].close()
+                return
+            if entry is not None:
+                entry['active'] -= 1
+                entry['last_used'] = time.monotonic()
+
+    def resize(self, pool_maxsize):
+        """调整每个主机的最大连接数
+
+        空闲会话立即关闭，有进行中请求的会话在请求全部完成后关闭，新请求使用新大小的会话。
+        """
+        with self._lock:
+            self.pool_maxsize = pool_maxsize
+            for entry in self._sessions.values():
+                if entry['active'] == 0:
+                    entry['session'].close()
+                else:
+                    self._retired[id(entry['session'])] = entry
+            self._sessions.clear()
+
+    def request(self, method, url, **kwargs):
+        """通过连接池发送请求"""
+        session = self.acquire(url)
+        try:
+            return session.request(method, url, **kwargs)
+        finally:
+            self.release(url, session)
+
+    def stats(self):
+        """返回连接池统计信息"""
+        with self._lock:
+            hosts = {}
+            for key, entry in self._sessions.items():
+                connections = 0
+                requests_served = 0
+                protocols = None
+                for adapter in set(entry['session'].adapters.values()):
+                    if isinstance(adapter, HTTP2Adapter):
+                        http2 = adapter.stats()
+                        connections += http2['connections'] or 0
+                        requests_served += http2['requests']
+                        protocols = http2['versions']
+                        continue
+                    for pool_key in adapter.poolmanager.pools.keys():
+                        pool = adapter.poolmanager.pools.get(pool_key)
+                        if pool is not None:
+                            connections += pool.num_connections
+                            requests_served += pool.num_requests
+                hosts[key] = {
+                    'active': entry['active'],
+                    'idle_seconds': round(time.monotonic() - entry['last_used'], 3),
+                    'connections_opened': connections,
+                    'requests': requests_served
+                }
+                if protocols is not None:
+                    hosts[key]['protocols'] = protocols
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'pool_maxsize': self.pool_maxsize,
+                'hosts': hosts
+            }
+
+    def close(self):
+        """关闭所有会话"""
+        with self._lock:
+            for entry in self._sessions.values():
+                entry['session'].close()
+            self._sessions.clear()
+
+
+# 全局上游连接池
+upstream_pool = UpstreamSessionPool(
+    pool_maxsize=config['pool_maxsize'],
+    idle_timeout=config['pool_idle_timeout'],
+    http2_connections=config['upstream_http2_max_connections'] if config['upstream_http2'] else 0
+)
+
+# 准入控制
+class AdmissionRejected(Exception):
+    """上游请求被准入控制拒绝"""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class _HostGate:
+    """单个上游主机的并发闸门（舱壁），上限每次从配置读取以便在线调整"""
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.active = 0
+        self.waiting = 0
+        self.queue_time = Histogram()
+        self.timeouts = 0
+
+
+class AdmissionController:
+    """上游请求的准入控制
+
+    全局进行中请求数超过max_inflight时立即以503拒绝；
+    每个上游主机最多host_max_concurrency个并发请求，超出的请求排队等待，
+    等待超过admission_queue_timeout秒后拒绝。上限为0表示不限制。
+    """
+
+    def __init__(self):
+        self._gates = {}
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.shed = 0
+
+    def _gate(self, host):
+        gate = self._gates.get(host)
+        if gate is None:
+            with self._lock:
+                gate = self._gates.setdefault(host, _HostGate())
+        return gate
+
+    def acquire(self, host):
+        """为一次上游请求申请名额，失败时抛出AdmissionRejected"""
+        with self._lock:
+            if config['max_inflight'] and self.in_flight >= config['max_inflight']:
+                self.shed += 1
+                raise AdmissionRejected('Server overloaded', config['shed_retry_after'])
+            self.in_flight += 1
+
+        gate = self._gate(host)
+        started = time.monotonic()
+        with gate.condition:
+            gate.waiting += 1
+            try:
+                admitted = gate.condition.wait_for(
+                    lambda: not config['host_max_concurrency'] or gate.active < config['host_max_concurrency'],
+                    timeout=config['admission_queue_timeout']
+                )
+                gate.queue_time.observe(time.monotonic() - started)
+                if not admitted:
+                    gate.timeouts += 1
+                    with self._lock:
+                        self.in_flight -= 1
+                    raise AdmissionRejected(f'Upstream {host} busy', config['shed_retry_after'])
+                gate.active += 1
+            finally:
+                gate.waiting -= 1
+
+    def release(self, host):
+        """归还名额"""
+        gate = self._gate(host)
+        with gate.condition:
+            gate.active -= 1
+            gate.condition.notify()
+        with self._lock:
+            self.in_flight -= 1
+
+    def prometheus(self):
+        """返回Prometheus文本格式的准入控制指标"""
+        with self._lock:
+            gates = list(self._gates.items())
+            samples = {'reason="shed"': self.shed}
+        histograms = {}
+        for host, gate in gates:
+            label = escape_label(host)
+            with gate.condition:
+                samples[f'reason="queue_timeout",host="{label}"'] = gate.timeouts
+                histograms[f'host="{label}"'] = gate.queue_time
+        return (
+            counter_lines('mcp_admission_rejected_total', 'Upstream requests rejected by admission control.', samples)
+            + histogram_lines('mcp_admission_queue_seconds', 'Time spent waiting for an upstream slot.', histograms)
+        )
+
+    def stats(self):
+        """返回准入控制统计信息"""
+        with self._lock:
+            gates = list(self._gates.items())
+            result = {
+                'in_flight': self.in_flight,
+                'max_inflight': config['max_inflight'],
+                'host_max_concurrency': config['host_max_concurrency'],
+                'shed': self.shed,
+                'hosts': {}
+            }
+        for host, gate in gates:
+            with gate.condition:
+                result['hosts'][host] = {
+                    'active': gate.active,
+                    'waiting': gate.waiting,
+                    'queue_timeouts': gate.timeouts,
+                    'queue_time': gate.queue_time.summary()
+                }
+        return result
+
+
+# 全局准入控制
+admission = AdmissionController()
+
+# 熔断
+class CircuitOpen(AdmissionRejected):
+    """上游主机的熔断器处于打开状态"""
+
+
+class _HostBreaker:
+    """单个上游主机的熔断器状态"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.state = 'closed'
+        self.window_started = time.monotonic()
+        self.requests = 0
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+        self.opened = 0
+        self.rejected = 0
+
+
+class CircuitBreaker:
+    """按上游主机的熔断器（关闭/打开/半开）
+
+    在breaker_window秒的窗口内至少有breaker_min_requests个请求、
+    且失败比例达到breaker_failure_ratio时打开熔断器。
+    失败包括连接错误、超时、5xx响应以及首字节耗时超过breaker_slow_call秒的慢请求。
+    打开期间请求立即被拒绝，breaker_open_seconds秒后进入半开状态，只放行一个探测请求，
+    探测成功则关闭，失败则重新打开。
+    """
+
+    STATES = ('closed', 'open', 'half_open')
+
+    def __init__(self):
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def _host(self, host):
+        breaker = self._hosts.get(host)
+        if breaker is None:
+            with self._lock:
+                breaker = self._hosts.setdefault(host, _HostBreaker())
+        return breaker
+
+    def allow(self, host):
+        """检查是否放行请求，熔断器打开时抛出CircuitOpen"""
+        breaker = self._host(host)
+        with breaker.lock:
+            if breaker.state == 'closed':
+                return
+            remaining = breaker.opened_at + config['breaker_open_seconds'] - time.monotonic()
+            if breaker.state == 'open' and remaining <= 0:
+                breaker.state = 'half_open'
+            if breaker.state == 'half_open' and not breaker.probing:
+                breaker.probing = True
+                return
+            breaker.rejected += 1
+        raise CircuitOpen(f'Circuit open for {host}', max(1, math.ceil(remaining)))
+
+    def abort(self, host):
+        """放行后未实际发出请求时调用，释放半开状态的探测名额"""
+        breaker = self._host(host)
+        with breaker.lock:
+            breaker.probing = False
+
+    def record(self, host, success):
+        """记录一次请求结果"""
+        breaker = self._host(host)
+        now = time.monotonic()
+        with breaker.lock:
+            if breaker.state == 'half_open':
+                breaker.probing = False
+                if success:
+                    breaker.state = 'closed'
+                    breaker.window_started = now
+                    breaker.requests = breaker.failures = 0
+                else:
+                    self._open(host, breaker, now)
+                return
+            if breaker.state == 'open':
+                return
+
+            if now - breaker.window_started > config['breaker_window']:
+                breaker.window_started = now
+                breaker.requests = breaker.failures = 0
+            breaker.requests += 1
+            if not success:
+                breaker.failures += 1
+            if (breaker.requests >= config['breaker_min_requests']
+                    and breaker.failures >= breaker.requests * config['breaker_failure_ratio']):
+                self._open(host, breaker, now)
+
+    @staticmethod
+    def _open(host, breaker, now):
+        breaker.state = 'open'
+        breaker.opened_at = now
+        breaker.opened += 1
+        logger.warning("上游熔断器打开: %s", host, extra={'host': host})
+
+    def prometheus(self):
+        """返回Prometheus文本格式的熔断器指标"""
+        with self._lock:
+            hosts = list(self._hosts.items())
+        states, opened, rejected = {}, {}, {}
+        for host, breaker in hosts:
+            label = f'host="{escape_label(host)}"'
+            with breaker.lock:
+                states[label] = self.STATES.index(breaker.state)
+                opened[label] = breaker.opened
+                rejected[label] = breaker.rejected
+        return (
+            counter_lines('mcp_circuit_breaker_state', 'Circuit breaker state (0 closed, 1 open, 2 half-open).',
+                          states, metric_type='gauge')
+            + counter_lines('mcp_circuit_breaker_opened_total', 'Times the circuit breaker opened.', opened)
+            + counter_lines('mcp_circuit_breaker_rejected_total', 'Requests rejected by an open circuit.', rejected)
+        )
+
+    def stats(self):
+        """返回熔断器统计信息"""
+        with self._lock:
+            hosts = list(self._hosts.items())
+        result = {}
+        for host, breaker in hosts:
+            with breaker.lock:
+                result[host] = {
+                    'state': breaker.state,
+                    'window_requests': breaker.requests,
+                    'window_failures': breaker.failures,
+                    'opened': breaker.opened,
+                    'rejected': breaker.rejected
+                }
+            result[host]['timeout'] = upstream_timeout(host)
+        return result
+
+
+# 全局熔断器
+circuit_breaker = CircuitBreaker()
+
+
+def upstream_timeout(host):
+    """按上游主机观测到的首字节耗时p99自适应计算超时时间
+
+    样本数达到adaptive_timeout_min_samples后，超时取p99的adaptive_timeout_multiplier倍，
+    且不小于adaptive_timeout_min、不大于配置的timeout。
+    """
+    if not config['adaptive_timeout']:
+        return config['timeout']
+    p99 = upstream_metrics.percentile(host, 'ttfb', 0.99, min_count=config['adaptive_timeout_min_samples'])
+    if p99 is None:
+        return config['timeout']
+    return min(config['timeout'], max(config['adaptive_timeout_min'], p99 * config['adaptive_timeout_multiplier']))
+
+
+def _admit(host):
+    """依次检查熔断器和准入控制，被拒绝时抛出AdmissionRejected"""
+    circuit_breaker.allow(host)
+    try:
+        admission.acquire(host)
+    except AdmissionRejected:
+        circuit_breaker.abort(host)
+        raise
+
+
+def _upstream_ok(status_code, trace):
+    """判断一次上游请求对熔断器而言是否成功"""
+    if status_code is None or status_code >= 500:
+        return False
+    return trace.timings.get('ttfb', 0.0) < config['breaker_slow_call']
+
+# 并发请求合并
+class SingleFlight:
+    """相同键的并发调用只执行一次，其余调用方等待并共享结果"""
+
+    class _Call:
+        def __init__(self):
+            self.event = threading.Event()
+            self.result = None
+            self.error = None
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.coalesced = 0
+
+    def do(self, key, func):
+        """执行func并返回结果，同一键已有进行中的调用时等待其结果"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = self._Call()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+    def in_flight(self):
+        """返回进行中的调用数"""
+        with self._lock:
+            return len(self._calls)
+
+
+# 非缓存转发的请求合并，与响应缓存相互独立
+forward_flight = SingleFlight()
+
+# 可以合并的幂等方法
+COALESCE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+def should_coalesce(method, url, data=None):
+    """判断转发请求能否与相同的并发请求合并
+
+    只合并没有请求体的幂等请求；目标URL以coalesce_exclude_prefixes中任一前缀开头时不合并。
+    """
+    if not config['coalesce_enabled'] or method.upper() not in COALESCE_METHODS or data:
+        return False
+    return not any(url.startswith(prefix) for prefix in config['coalesce_exclude_prefixes'])
+
+
+def _check_replica(url):
+    """上游副本的主动健康检查，返回非5xx状态码即为健康"""
+    response = upstream_pool.request('GET', url, timeout=config['upstream_health_timeout'], verify=False)
+    return response.status_code < 500
+
+
+# 上游副本组，目标URL为upstream://组名/路径时由组选择副本
+upstream_groups = UpstreamGroups(
+    _check_replica,
+    interval=config['upstream_health_interval'],
+    unhealthy_threshold=config['upstream_unhealthy_threshold']
+)
+upstream_groups.configure(config['upstream_groups'])
+
+# 对冲请求使用的线程池，只在有空闲线程时提交任务（见submit_hedge），任务不会排队
+hedge_executor = ThreadPoolExecutor(max_workers=config['hedge_max_workers'], thread_name_prefix='hedge-forward')
+hedge_slots = threading.Semaphore(config['hedge_max_workers'])
+
+
+def submit_hedge(fn, *args):
+    """对冲线程池有空闲线程时提交任务并返回Future，线程池已满时返回None"""
+    if not hedge_slots.acquire(blocking=False):
+        return None
+
+    def run():
+        try:
+            return fn(*args)
+        finally:
+            hedge_slots.release()
+
+    return hedge_executor.submit(run)
+
+
+def hedge_delay(group, replica, method, data):
+    """返回发送对冲请求前的等待秒数，不应对冲时返回None
+
+    只对冲没有请求体的幂等请求，等待时间为该副本主机总耗时的hedge_percentile分位数，
+    样本数不足hedge_min_samples时不对冲。
+    """
+    if not group.hedge or len(group.replicas) < 2 or method.upper() not in COALESCE_METHODS or data:
+        return None
+    return upstream_metrics.percentile(
+        UpstreamSessionPool.host_key(replica.url), 'total', config['hedge_percentile'],
+        min_count=config['hedge_min_samples']
+    )
+
+
+def _send_to_group(group, target, method, headers=None, data=None, params=None, timeout=None, verify=False):
+    """向上游组中负载最低的副本发送请求
+
+    副本从实际开始发送起hedge_delay内没有返回时向另一个副本发送同样的请求，采用先返回的结果；
+    较慢的请求在后台完成后释放连接，结果被丢弃。对冲线程池已满时不对冲，原请求在当前线程发送，
+    避免上游已经饱和时请求排队等待线程、等待时间又被计入对冲延迟而使上游负载加倍。
+    """
+    def attempt(replica, in_flight=None):
+        group.begin(replica)
+        if in_flight is not None:
+            in_flight.set()
+        started = time.monotonic()
+        ok = False
+        try:
+            response = MCPForwardResource.send(replica.url + target, method, headers, data, params, timeout, verify)
+            ok = response.status_code < 500
+            return response
+        finally:
+            group.end(replica, time.monotonic() - started, ok)
+
+    primary = group.pick()
+    delay = hedge_delay(group, primary, method, data)
+    if delay is None:
+        return attempt(primary)
+
+    in_flight = threading.Event()
+    first = submit_hedge(attempt, primary, in_flight)
+    if first is None:
+        return attempt(primary)
+    in_flight.wait()
+    try:
+        return first.result(timeout=delay)
+    except FuturesTimeoutError:
+        pass
+    secondary = group.pick(exclude=(primary,))
+    second = submit_hedge(attempt, secondary) if secondary is not None else None
+    if second is None:
+        return first.result()
+
+    logger.info("发送对冲请求: %s -> %s", primary.url, secondary.url, extra={'method': method, 'url': target})
+    pending = {first, second}
+    error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            try:
+                response = future.result()
+            except Exception as e:
+                error = e
+                continue
+            group.record_hedge(won=future is second)
+            return response
+    group.record_hedge(won=False)
+    raise error
+
+
+def _param_pairs(params):
+    """将查询参数转换为可哈希的(键, 值)元组，列表值展开为多个同名参数，按键排序（同名参数保持原顺序）"""
+    if not params:
+        return ()
+    if isinstance(params, (str, bytes)):
+        return (params,)
+    pairs = []
+    for key, value in (params.items() if hasattr(params, 'items') else params):
+        values = value if isinstance(value, (list, tuple)) else [value]
+        pairs.extend((str(key), str(item)) for item in values if item is not None)
+    return tuple(sorted(pairs, key=lambda pair: pair[0]))
+
+
+def _coalesce_key(method, url, headers, params, timeout):
+    """合并键包含全部请求头，携带不同凭据的请求不会共享结果"""
+    return (
+        method.upper(),
+        url,
+        _param_pairs(params),
+        tuple(sorted((key.lower(), value) for key, value in headers.items())),
+        timeout
+    )
+
+
+def _parse_cache_control(value):
+    """解析Cache-Control头，返回{指令: 值}"""
+    directives = {}
+    for part in (value or '').split(','):
+        name, _, argument = part.strip().partition('=')
+        if name:
+            directives[name.lower()] = argument.strip('"') or None
+    return directives
+
+
+# 转发响应缓存
+class ResponseCache:
+    """幂等转发请求的HTTP响应缓存
+
+    遵循Cache-Control/Expires确定新鲜度，过期后携带ETag/Last-Modified发送条件请求重新验证；
+    按响应体字节数限制总大小并以LRU淘汰，同一键的并发未命中只向上游发送一次请求。
+    配置了磁盘缓存（DiskCache）时，内存未命中的请求先查询磁盘，新存储的响应同时写入磁盘，
+    磁盘上每个URL只保留最近一次存储的变体。
+    """
+
+    CACHEABLE_METHODS = frozenset(['GET', 'HEAD'])
+    CACHEABLE_STATUS = frozenset([200, 203, 204, 300, 301, 404, 410])
+    # 携带这些请求头的请求的响应属于特定用户，共享缓存只能存储明确声明可共享的响应（RFC 9111 §3.5）
+    CREDENTIAL_HEADERS = frozenset(['authorization', 'cookie'])
+
+    def __init__(self, max_bytes, enabled=True, disk=None):
+        """初始化缓存
+
+        Args:
+            max_bytes: 缓存响应体的总字节数上限
+            enabled: 是否启用缓存
+            disk: 可选的DiskCache持久化层
+        """
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self.disk = disk
+        self._entries = OrderedDict()
+        self._vary = {}
+        self._lock = threading.Lock()
+        self._flight = SingleFlight()
+        self.bytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.stores = 0
+        self.evictions = 0
+
+    def accepts(self, method, headers):
+        """判断请求能否使用缓存"""
+        if not self.enabled or method.upper() not in self.CACHEABLE_METHODS:
+            return False
+        for key, value in headers.items():
+            if key.lower() == 'cache-control' and 'no-store' in _parse_cache_control(value):
+                return False
+        return True
+
+    @staticmethod
+    def _base_key(method, url, params):
+        return (method.upper(), url, _param_pairs(params))
+
+    @staticmethod
+    def _vary_values(vary, headers):
+        """返回Vary列出的请求头的值"""
+        lower_headers = {key.lower(): value for key, value in headers.items()}
+        return tuple(lower_headers.get(name, '') for name in vary)
+
+    def _key(self, base_key, headers):
+        """在基础键上追加Vary列出的请求头的值"""
+        vary = self._vary.get(base_key, ())
+        if not vary:
+            return base_key
+        return base_key + self._vary_values(vary, headers)
+
+    @staticmethod
+    def _lifetime(headers, directives):
+        """计算响应的新鲜度有效期（秒），无法确定时返回None"""
+        if 'no-cache' in directives:
+            return 0
+        for name in ('s-maxage', 'max-age'):
+            if name in directives:
+                try:
+                    return max(int(directives[name]) - int(headers.get('Age', 0)), 0)
+                except (TypeError, ValueError):
+                    return 0
+        if 'Expires' in headers:
+            try:
+                expires = parsedate_to_datetime(headers['Expires'])
+                date = parsedate_to_datetime(headers['Date']) if 'Date' in headers else datetime.now(expires.tzinfo)
+                return max((expires - date).total_seconds(), 0)
+            except (TypeError, ValueError):
+                return 0
+        return None
+
+    def _store(self, base_key, headers, response, result, credentialed=False):
+        """存储可缓存的响应，携带凭据的请求只存储带public或s-maxage的响应"""
+        response_headers = response.headers
+        directives = _parse_cache_control(response_headers.get('Cache-Control'))
+        vary = tuple(sorted(
+            name.strip().lower() for name in response_headers.get('Vary', '').split(',') if name.strip()
+        ))
+        if response.status_code not in self.CACHEABLE_STATUS or 'no-store' in directives \
+                or 'private' in directives or '*' in vary:
+            return
+        if credentialed and 'public' not in directives and 's-maxage' not in directives:
+            return
+
+        lifetime = self._lifetime(response_headers, directives)
+        etag = response_headers.get('ETag')
+        last_modified = response_headers.get('Last-Modified')
+        if lifetime is None:
+            # 没有新鲜度信息但有验证器时，每次使用前都重新验证
+            if not (etag or last_modified):
+                return
+            lifetime = 0
+
+        size = len(response.content)
+        if size > self.max_bytes:
+            return
+
+        entry = {
+            'result': result,
+            'size': size,
+            'expires': time.monotonic() + lifetime,
+            'etag': etag,
+            'last_modified': last_modified
+        }
+        with self._lock:
+            self._vary[base_key] = vary
+            self._insert(self._key(base_key, headers), entry)
+            self.stores += 1
+        self._persist(base_key, vary, self._vary_values(vary, headers), entry, lifetime)
+
+    def _insert(self, key, entry):
+        """加入内存缓存并淘汰超出容量的条目（调用方需持有锁）"""
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.bytes -= old['size']
+        self._entries[key] = entry
+        self.bytes += entry['size']
+        while self.bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.bytes -= evicted['size']
+            self.evictions += 1
+
+    def _persist(self, base_key, vary, vary_values, entry, lifetime):
+        """将缓存条目写入磁盘缓存"""
+        if self.disk is None:
+            return
+        result = entry['result']
+        meta = {
+            'status_code': result['status_code'],
+            'headers': result['headers'],
+            'raw': 'raw' in result,
+            'vary': list(vary),
+            'vary_values': list(vary_values),
+            'etag': entry['etag'],
+            'last_modified': entry['last_modified'],
+            'revalidate': bool(entry['etag'] or entry['last_modified'])
+        }
+        body = result['raw'] if 'raw' in result else mcp_json.dumps(result['data'])
+        try:
+            self.disk.put(repr(base_key), meta, body, time.time() + lifetime)
+        except OSError as e:
+            logger.warning("写入磁盘缓存失败: %s", e)
+
+    def _load_disk(self, base_key, headers):
+        """从磁盘缓存加载条目到内存缓存，返回(key, entry)，未找到或变体不匹配时返回None"""
+        try:
+            found = self.disk.get(repr(base_key))
+        except (OSError, ValueError) as e:
+            logger.warning("读取磁盘缓存失败: %s", e)
+            return None
+        if found is None:
+            return None
+        meta, body, expires = found
+        vary = tuple(meta['vary'])
+        if list(self._vary_values(vary, headers)) != meta['vary_values']:
+            return None
+        result = {'status_code': meta['status_code'], 'headers': meta['headers']}
+        if meta['raw']:
+            result['raw'] = bytes(body)
+        else:
+            try:
+                result['data'] = mcp_json.loads(bytes(body))
+            except ValueError as e:
+                logger.warning("磁盘缓存记录无法解析，按未命中处理: %s", e)
+                return None
+        entry = {
+            'result': result,
+            'size': len(body),
+            'expires': time.monotonic() + expires - time.time(),
+            'etag': meta['etag'],
+            'last_modified': meta['last_modified']
+        }
+        with self._lock:
+            self._vary[base_key] = vary
+            key = self._key(base_key, headers)
+            self._insert(key, entry)
+        return key, entry
+
+    def _revalidated(self, key, entry, response):
+        """304响应：用新的头信息刷新缓存条目"""
+        headers = dict(entry['result']['headers'])
+        for name in ('Cache-Control', 'Expires', 'Date', 'ETag', 'Last-Modified', 'Age'):
+            if name in response.headers:
+                headers[name] = response.headers[name]
+        lifetime = self._lifetime(headers, _parse_cache_control(headers.get('Cache-Control'))) or 0
+        result = dict(entry['result'], headers=headers)
+        with self._lock:
+            entry['result'] = result
+            entry['expires'] = time.monotonic() + lifetime
+            entry['etag'] = headers.get('ETag')
+            entry['last_modified'] = headers.get('Last-Modified')
+            if key in self._entries:
+                self._entries.move_to_end(key)
+            self.revalidations += 1
+            vary = self._vary.get(key[:3], ())
+        # 缓存键的前三项是基础键，其余为Vary请求头的值
+        self._persist(key[:3], vary, key[3:], entry, lifetime)
+        return result
+
+    @staticmethod
+    def _tagged(result, status):
+        """返回带缓存状态头的结果副本"""
+        headers = dict(result['headers'])
+        headers['X-MCP-Cache'] = status
+        return dict(result, headers=headers)
+
+    def fetch(self, method, url, headers, params, send, build, timeout=None, coalesce=True):
+        """从缓存返回结果，未命中或已过期时请求上游
+
+        Args:
+            send: 接收额外条件请求头并返回requests响应对象的函数
+            build: 将requests响应对象转换为转发结果的函数
+            timeout: 本次请求的超时时间，超时时间不同的请求不会合并
+            coalesce: 为False时未命中的请求不与其他并发请求合并；携带凭据的请求总是不合并
+        """
+        base_key = self._base_key(method, url, params)
+        request_directives = {}
+        credentialed = False
+        for name, value in headers.items():
+            lower_name = name.lower()
+            if lower_name == 'cache-control':
+                request_directives = _parse_cache_control(value)
+            elif lower_name in self.CREDENTIAL_HEADERS:
+                credentialed = True
+
+        with self._lock:
+            key = self._key(base_key, headers)
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                if 'no-cache' not in request_directives and entry['expires'] > time.monotonic():
+                    self.hits += 1
+                    return self._tagged(entry['result'], 'HIT')
+
+        if entry is None and self.disk is not None:
+            loaded = self._load_disk(base_key, headers)
+            if loaded is not None:
+                key, entry = loaded
+                if 'no-cache' not in request_directives and entry['expires'] > time.monotonic():
+                    with self._lock:
+                        self.hits += 1
+                        self.disk_hits += 1
+                    return self._tagged(entry['result'], 'HIT')
+
+        with self._lock:
+            self.misses += 1
+
+        def load():
+            extra_headers = {}
+            if entry is not None:
+                if entry['etag']:
+                    extra_headers['If-None-Match'] = entry['etag']
+                if entry['last_modified']:
+                    extra_headers['If-Modified-Since'] = entry['last_modified']
+            response = send(extra_headers)
+            if response.status_code == 304 and entry is not None:
+                return self._tagged(self._revalidated(key, entry, response), 'REVALIDATED')
+            result = build(response)
+            self._store(base_key, headers, response, result, credentialed)
+            return self._tagged(result, 'MISS')
+
+        if not coalesce or credentialed:
+            return load()
+        return self._flight.do((key, timeout), load)
+
+    def stats(self):
+        """返回缓存统计信息"""
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'entries': len(self._entries),
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'revalidations': self.revalidations,
+                'coalesced': self._flight.coalesced,
+                'stores': self.stores,
+                'evictions': self.evictions,
+                'disk': self.disk.stats() if self.disk is not None else None
             }
 
+    def resize(self, max_bytes):
+        """调整缓存容量，超出新容量的最久未使用条目被淘汰"""
+        with self._lock:
+            self.max_bytes = max_bytes
+            while self.bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.bytes -= evicted['size']
+                self.evictions += 1
+
+    def clear(self):
+        """清空缓存（包括磁盘缓存）"""
+        with self._lock:
+            self._entries.clear()
+            self._vary.clear()
+            self.bytes = 0
+        if self.disk is not None:
+            self.disk.clear()
+
+
+def create_disk_cache():
+    """按配置创建磁盘缓存，未启用或平台不支持时返回None"""
+    if not config['disk_cache_enabled']:
+        return None
+    if not disk_cache_available():
+        logger.warning("当前平台不支持磁盘缓存（需要fcntl），仅使用内存缓存")
+        return None
+    return DiskCache(config['disk_cache_path'], config['disk_cache_max_bytes'])
+
+
+# 全局响应缓存
+response_cache = ResponseCache(
+    max_bytes=config['response_cache_max_bytes'],
+    enabled=config['response_cache_enabled'],
+    disk=create_disk_cache()
+)
+
+# 逐跳头部，不应在代理两端之间转发
+HOP_BY_HOP_HEADERS = frozenset([
+    'connection', 'keep-alive', 'proxy-authenticate', 'proxy-authorization',
+    'te', 'trailers', 'transfer-encoding', 'upgrade'
+])
+
+# 转发路由表，启动和配置热加载时编译
+routing_table = RoutingTable(always_deny=HOP_BY_HOP_HEADERS | {'host'})
+routing_table.compile(config['routes'])
+
+
+class _UpstreamBody:
+    """上游响应体的分块迭代器，迭代结束或被关闭时释放上游连接并记录指标
+
+    decode为False时原样产出上游的压缩字节，不在本进程解压；on_close在关闭时以本次请求是否成功为参数调用。
+    """
+
+    def __init__(self, response, url, chunk_size, trace, request_bytes, decode=True, session=None,
+                 on_close=None):
+        self._response = response
+        self._url = url
+        self._session = session
+        self._chunk_size = chunk_size
+        self._trace = trace
+        self._request_bytes = request_bytes
+        self._decode = decode
+        self._response_bytes = 0
+        self._on_close = on_close
+        self._failed = False
+        self._closed = False
+
+    def __iter__(self):
+        if self._decode:
+            chunks = self._response.iter_content(chunk_size=self._chunk_size)
+        else:
+            chunks = self._response.raw.stream(self._chunk_size, decode_content=False)
+        try:
+            for chunk in chunks:
+                if chunk:
+                    self._response_bytes += len(chunk)
+                    yield chunk
+        except Exception:
+            self._failed = True
+            raise
+        finally:
+            self.close()
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._response.close()
+            upstream_pool.release(self._url, self._session)
+            admission.release(self._trace.host)
+            upstream_metrics.finish(
+                self._trace, self._response.status_code, self._request_bytes, self._response_bytes
+            )
+            if self._on_close is not None:
+                self._on_close(self._response.status_code < 500 and not self._failed)
+
+
+class _CompressedBody:
+    """对流式响应体逐块压缩，关闭时同时关闭内层响应体"""
+
+    def __init__(self, body, encoding):
+        self._body = body
+        self._encoding = encoding
+
+    def __iter__(self):
+        stream = compressor(self._encoding, encoding_level(self._encoding))
+        for chunk in self._body:
+            data = stream.compress(chunk)
+            if data:
+                yield data
+        yield stream.flush()
+
+    def close(self):
+        self._body.close()
+
+
+def encoding_level(encoding):
+    """返回配置的压缩级别"""
+    return config[{'gzip': 'gzip_level', 'br': 'brotli_level', 'zstd': 'zstd_level'}[encoding]]
+
+
+def _header(headers, name):
+    """不区分大小写地读取请求头"""
+    for key, value in (headers or {}).items():
+        if key.lower() == name:
+            return value
+    return None
+
+
+def _body_size(data):
+    """估算请求体字节数，无法确定时返回0"""
+    if isinstance(data, bytes):
+        return len(data)
+    if isinstance(data, str):
+        return len(data.encode())
+    if isinstance(data, _SizedStream):
+        return data.len
+    return 0
+
+
+class _SizedStream:
+    """带长度信息的只读流，使requests以Content-Length方式流式上传请求体"""
+
+    def __init__(self, stream, length):
+        self._stream = stream
+        self.len = length
+
+    def read(self, size=-1):
+        return self._stream.read(size)
+
+
+def _iter_stream(stream, chunk_size=65536):
+    """按块读取分块传输的请求体"""
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
 # MCP转发资源类
 class MCPForwardResource:
     """提供MCP请求转发功能"""
     
     @staticmethod
-    def forward_request(url, method, headers=None, data=None, params=None):
-        """转发HTTP请求"""
+    def send(url, method, headers=None, data=None, params=None, timeout=None, verify=False):
+        """发送请求到上游，返回已读取完响应体的requests响应对象
+
+        verify为证书校验方式（True、False或CA证书路径），由路由配置，默认不校验。
+        """
+        host = UpstreamSessionPool.host_key(url)
+        _admit(host)
+        session = upstream_pool.acquire(url)
+        trace = upstream_metrics.start(host)
+        status_code = None
+        response_bytes = 0
         try:
-            # 准备请求头
-            request_headers = headers or {}
-            
-            # 记录请求信息
-            logger.info(f"转发请求: {method} {url}")
-            logger.debug(f"请求头: {request_headers}")
-            logger.debug(f"请求数据: {data}")
-            
-            # 发送请求
-            response = requests.request(
+            response = session.request(
                 method=method,
                 url=url,
-                headers=request_headers,
+                headers=headers or {},
                 data=data,
                 params=params,
-                timeout=config['timeout'],
-                verify=False  # 忽略SSL验证（生产环境应设为True）
+                timeout=timeout or upstream_timeout(host),
+                verify=verify,
+                stream=True
             )
+            trace.first_byte()
+            response_bytes = len(response.content)
+            status_code = response.status_code
+        finally:
+            upstream_pool.release(url, session)
+            admission.release(host)
+            circuit_breaker.record(host, _upstream_ok(status_code, trace))
+            upstream_metrics.finish(trace, status_code, _body_size(data), response_bytes)
+        
+        # 记录响应信息
+        logger.info("响应状态码: %s", response.status_code, extra={'url': url, 'status_code': response.status_code})
+        return response
+
+    @staticmethod
+    def dispatch(url, method, headers=None, data=None, params=None, timeout=None, verify=False):
+        """发送请求，目标为upstream://组名/路径时经上游组选择副本"""
+        resolved = upstream_groups.resolve(url)
+        if resolved is None:
+            return MCPForwardResource.send(url, method, headers, data, params, timeout, verify)
+        group, target = resolved
+        return _send_to_group(group, target, method, headers, data, params, timeout, verify)
+
+    @staticmethod
+    def build_result(response):
+        """将上游响应转换为转发结果
+
+        json_passthrough开启且上游返回JSON时只保留原始字节（raw）而不解析，
+        需要解析后的数据时使用result_data。
+        """
+        result = {
+            'status_code': response.status_code,
+            'headers': dict(response.headers)
+        }
+        if config['json_passthrough'] and mcp_json.is_json(response.headers.get('Content-Type')):
+            result['raw'] = response.content
+            return result
+        
+        # 尝试解析JSON响应
+        try:
+            result['data'] = mcp_json.loads(response.content)
+        except ValueError:
+            result['data'] = response.text
+        return result
+
+    @staticmethod
+    def forward_request(url, method, headers=None, data=None, params=None, timeout=None, coalesce=True):
+        """转发HTTP请求
+
+        相同的幂等请求并发到达时只向上游发送一次，coalesce为False时跳过合并。
+        目标匹配路由表时按路由改写目标URL并套用其请求头过滤、超时、缓存和证书校验策略。
+        """
+        route, url = routing_table.match(url)
+        verify = False
+        if route is not None:
+            headers = route.filter_headers(headers or {})
+            timeout = route.cap_timeout(timeout)
+            verify = route.verify
+        try:
+            # 准备请求头，响应体要在本进程解析，只向上游声明能解码的编码
+            request_headers = {
+                key: value for key, value in (headers or {}).items()
+                if key.lower() != 'accept-encoding'
+            }
+            request_headers['Accept-Encoding'] = DEFAULT_ACCEPT_ENCODING
             
-            # 记录响应信息
-            logger.info(f"响应状态码: {response.status_code}")
+            # 记录请求信息（参数延迟格式化，请求体按log_body_max_bytes截断）
+            logger.info("转发请求: %s %s", method, url, extra={'method': method, 'url': url})
+            logger.debug("请求头: %s", request_headers)
+            logger.debug("请求数据: %s", truncated(data, config['log_body_max_bytes']))
             
-            # 尝试解析JSON响应
-            try:
-                response_data = response.json()
-            except ValueError:
-                response_data = response.text
+            # 可缓存的请求先查询响应缓存
+            if (route is None or route.cache) and response_cache.accepts(method, request_headers):
+                return response_cache.fetch(
+                    method, url, request_headers, params,
+                    lambda extra_headers: MCPForwardResource.dispatch(
+                        url, method, {**request_headers, **extra_headers}, data, params, timeout, verify
+                    ),
+                    MCPForwardResource.build_result,
+                    timeout,
+                    coalesce and should_coalesce(method, url, data)
+                )
             
+            # 发送请求
+            def load():
+                response = MCPForwardResource.dispatch(url, method, request_headers, data, params, timeout, verify)
+                return MCPForwardResource.build_result(response)
+
+            if coalesce and should_coalesce(method, url, data):
+                return forward_flight.do(_coalesce_key(method, url, request_headers, params, timeout), load)
+            return load()
+        except AdmissionRejected as e:
+            logger.warning("转发请求被拒绝: %s", e, extra={'url': url})
             return {
-                'status_code': response.status_code,
-                'headers': dict(response.headers),
-                'data': response_data
+                'status_code': 503,
+                'error': str(e),
+                'retry_after': e.retry_after
+            }
+        except UnknownUpstreamGroup as e:
+            return {
+                'status_code': 400,
+                'error': str(e)
+            }
+        except requests.Timeout as e:
+            # 与批量请求的单项截止时间超时一致，上游超时返回504
+            logger.warning("转发请求超时: %s", e, extra={'url': url})
+            return {
+                'status_code': 504,
+                'error': str(e)
             }
         except Exception as e:
-            logger.error(f"转发请求失败: {e}")
+            logger.error("转发请求失败: %s", e, extra={'url': url})
             return {
                 'status_code': 500,
                 'error': str(e)
             }
 
-# 首页路由
-@app.route('/')
-def index():
-    """首页，返回服务器信息"""
-    return jsonify({
+    @staticmethod
+    def stream_request(url, method, headers=None, data=None, params=None):
+        """以流式方式转发HTTP请求，不缓冲也不解析响应体
+
+        目标为upstream://组名/路径时选择负载最低的副本，流式请求不对冲；匹配路由表时套用路由策略。
+
+        Returns:
+            dict: 包含status_code、headers以及按块产出响应体的body
+        """
+        route, url = routing_table.match(url)
+        verify = False
+        if route is not None:
+            headers = route.filter_headers(headers or {})
+            verify = route.verify
+        try:
+            resolved = upstream_groups.resolve(url)
+        except UnknownUpstreamGroup as e:
+            return {
+                'status_code': 400,
+                'error': str(e)
+            }
+        finish = None
+        if resolved is not None:
+            group, target = resolved
+            replica = group.pick()
+            url = replica.url + target
+            group.begin(replica)
+            started = time.monotonic()
+
+            def finish(ok):
+                group.end(replica, time.monotonic() - started, ok)
+        host = UpstreamSessionPool.host_key(url)
+        timeout = upstream_timeout(host)
+        if route is not None:
+            timeout = route.cap_timeout(timeout)
+        try:
+            _admit(host)
+        except AdmissionRejected as e:
+            logger.warning("流式转发请求被拒绝: %s", e, extra={'url': url})
+            if finish is not None:
+                finish(False)
+            return {
+                'status_code': 503,
+                'error': str(e),
+                'retry_after': e.retry_after
+            }
+        session = upstream_pool.acquire(url)
+        trace = upstream_metrics.start(host)
+        try:
+            logger.info("流式转发请求: %s %s", method, url, extra={'method': method, 'url': url})
+            response = session.request(
+                method=method,
+                url=url,
+                headers=headers or {},
+                data=data,
+                params=params,
+                timeout=timeout,
+                verify=verify,
+                stream=True
+            )
+        except Exception as e:
+            upstream_pool.release(url, session)
+            admission.release(host)
+            circuit_breaker.record(host, False)
+            upstream_metrics.finish(trace, None, _body_size(data))
+            logger.error("流式转发请求失败: %s", e, extra={'url': url})
+            if finish is not None:
+                finish(False)
+            return {
+                'status_code': 500,
+                'error': str(e)
+            }
+
+        trace.first_byte()
+        circuit_breaker.record(host, _upstream_ok(response.status_code, trace))
+        logger.info("响应状态码: %s", response.status_code, extra={'url': url, 'status_code': response.status_code})
+
+        # 客户端接受上游使用的编码时原样透传压缩字节
+        encoding = response.headers.get('Content-Encoding', '').strip().lower()
+        passthrough = encoding not in ('', 'identity') and accepts(_header(headers, 'accept-encoding'), encoding)
+        return {
+            'status_code': response.status_code,
+            'headers': dict(response.headers),
+            'passthrough': passthrough,
+            'body': _UpstreamBody(
+                response, url, config['stream_chunk_size'], trace, _body_size(data),
+                decode=not passthrough, session=session, on_close=finish
+            )
+        }
+
+def result_data(result):
+    """返回转发结果中解析后的响应数据"""
+    if 'raw' not in result:
+        return result['data']
+    try:
+        return mcp_json.loads(result['raw'])
+    except ValueError:
+        return result['raw'].decode(errors='replace')
+
+
+def result_body(result):
+    """返回转发结果的JSON响应体，上游原始JSON字节直接复用"""
+    if 'raw' in result:
+        return result['raw']
+    return mcp_json.dumps(result['data'])
+
+
+# 批量转发使用的有界线程池
+batch_executor = ThreadPoolExecutor(max_workers=config['batch_max_workers'], thread_name_prefix='batch-forward')
+
+# MCP JSON-RPC工具调用使用的线程池，同一会话的多个调用同时执行
+rpc_executor = ThreadPoolExecutor(max_workers=config['mcp_rpc_max_workers'], thread_name_prefix='mcp-rpc')
+
+
+def _ip_info_tool(arguments):
+    """ip-info工具：返回出口IP信息"""
+    return text_result(IPInfoResource.get_ip_info())
+
+
+def _forward_tool(arguments):
+    """forward工具：转发一个HTTP请求，参数与批量转发的请求描述相同"""
+    result = _forward_batch_item(arguments)
+    return text_result(result, is_error='error' in result)
+
+
+rpc_server = RPCServer([
+    Tool('ip-info', 'Get the public egress IP address and its location information.',
+         {'type': 'object', 'properties': {}}, _ip_info_tool),
+    Tool('forward', 'Forward an HTTP request to the target URL and return its status, headers and body.', {
+        'type': 'object',
+        'properties': {
+            'url': {'type': 'string', 'description': 'Target URL, or upstream://group/path for an upstream group'},
+            'method': {'type': 'string', 'default': 'GET'},
+            'headers': {'type': 'object', 'additionalProperties': {'type': 'string'}},
+            'data': {'description': 'Request body: a string, or an object/array sent as JSON'},
+            'params': {'type': 'object', 'additionalProperties': {'type': 'string'}},
+            'timeout': {'type': 'number', 'description': 'Timeout in seconds, capped by the server timeout'}
+        },
+        'required': ['url']
+    }, _forward_tool)
+], rpc_executor, {'name': 'MCP Server', 'version': '1.0.0'}, session_ttl=config['mcp_session_ttl'])
+
+def create_rate_limiter():
+    """按配置创建客户端限流器，平台不支持fcntl时各进程分别限流"""
+    if not rate_limit_shared():
+        logger.warning("当前平台不支持跨进程共享限流状态（需要fcntl），各工作进程分别限流")
+    return RateLimiter(config['rate_limit_path'], config['rate_limit_slots'])
+
+
+# 客户端限流器，启用后创建
+rate_limiter = create_rate_limiter() if config['rate_limit_enabled'] else None
+
+
+def client_identity(headers, address):
+    """返回客户端标识：rate_limit_key_header头中的API密钥，没有或密钥未在rate_limit_clients中配置时为来源IP
+
+    只信任配置过的密钥，否则客户端每次换一个密钥就能得到新的桶，还会挤掉其他客户端的桶。
+
+    Returns:
+        (identity, name)：限流使用的标识和在rate_limit_clients中查找单独配额的名称
+    """
+    header = config['rate_limit_key_header']
+    key = headers.get(header) if header else None
+    if key and key in config['rate_limit_clients']:
+        return 'key:' + key, key
+    address = address or ''
+    return 'ip:' + address, address
+
+
+class RateLimitCostExceeded(Exception):
+    """单个请求消耗的令牌数超过客户端的桶容量，等待多久都无法放行"""
+
+    def __init__(self, cost, burst):
+        super().__init__(f"Request costs {cost} tokens, exceeding the rate limit burst ({burst})")
+        self.cost = cost
+        self.burst = burst
+
+
+def rate_limit(headers, address, cost=1):
+    """按客户端限流，放行时返回None，超出配额时返回建议的重试等待秒数
+
+    Args:
+        headers: 请求头
+        address: 客户端来源IP
+        cost: 本次请求消耗的令牌数（批量请求按请求项数计）
+
+    Raises:
+        RateLimitCostExceeded: cost超过该客户端的桶容量
+    """
+    limiter = rate_limiter
+    if limiter is None or not config['rate_limit_enabled']:
+        return None
+    identity, name = client_identity(headers, address)
+    quota = config['rate_limit_clients'].get(name) or {}
+    rate = quota.get('rate', config['rate_limit_rate'])
+    burst = quota.get('burst', config['rate_limit_burst'])
+    if cost > burst:
+        raise RateLimitCostExceeded(cost, burst)
+    allowed, retry_after = limiter.acquire(identity, rate, burst, cost)
+    if allowed:
+        return None
+    logger.debug("客户端请求被限流: %s", identity if identity.startswith('ip:') else 'key:***')
+    return max(math.ceil(min(retry_after, 3600)), 1)
+
+
+def rate_limit_response(cost=1):
+    """按当前请求的客户端限流，超出配额时返回带Retry-After的429响应，消耗超过桶容量时返回413响应，否则返回None"""
+    try:
+        retry_after = rate_limit(request.headers, request.remote_addr, cost)
+    except RateLimitCostExceeded as e:
+        return jsonify({'status_code': 413, 'error': str(e)}), 413
+    if retry_after is None:
+        return None
+    response = jsonify({'status_code': 429, 'error': 'Rate limit exceeded'})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+
+# 需要重启才能生效的配置
+RESTART_REQUIRED_KEYS = frozenset([
+    'server_port', 'ssl_cert_path', 'ssl_key_path', 'server_http2', 'server_mode', 'async_max_connections', 'workers', 'threads',
+    'reuse_port', 'max_requests', 'max_requests_jitter', 'graceful_timeout', 'worker_timeout',
+    'log_format', 'log_async', 'log_queue_size', 'disk_cache_enabled', 'disk_cache_path', 'hedge_max_workers',
+    'transport', 'mcp_rpc_max_workers', 'rate_limit_path', 'rate_limit_slots'
+])
+
+
+def apply_config(old, new, changed):
+    """配置变更后在线调整各子系统（其余配置在每次使用时读取，无需处理）"""
+    global batch_executor, rate_limiter
+    if 'log_level' in changed:
+        logger.setLevel(getattr(logging, new['log_level'], logging.INFO))
+    if 'pool_maxsize' in changed:
+        upstream_pool.resize(new['pool_maxsize'])
+    if changed & {'upstream_http2', 'upstream_http2_max_connections'}:
+        upstream_pool.http2_connections = new['upstream_http2_max_connections'] if new['upstream_http2'] else 0
+        upstream_pool.resize(upstream_pool.pool_maxsize)
+    if 'pool_idle_timeout' in changed:
+        upstream_pool.idle_timeout = new['pool_idle_timeout']
+    if 'response_cache_enabled' in changed:
+        response_cache.enabled = new['response_cache_enabled']
+    if 'response_cache_max_bytes' in changed:
+        response_cache.resize(new['response_cache_max_bytes'])
+    if 'disk_cache_max_bytes' in changed and response_cache.disk is not None:
+        response_cache.disk.max_bytes = new['disk_cache_max_bytes']
+    if 'batch_max_workers' in changed:
+        # 已提交的任务在旧线程池中继续执行
+        old_executor = batch_executor
+        batch_executor = ThreadPoolExecutor(max_workers=new['batch_max_workers'], thread_name_prefix='batch-forward')
+        old_executor.shutdown(wait=False)
+    if 'mcp_session_ttl' in changed:
+        rpc_server.session_ttl = new['mcp_session_ttl']
+    if 'routes' in changed:
+        routing_table.compile(new['routes'])
+    if new['rate_limit_enabled'] and rate_limiter is None:
+        rate_limiter = create_rate_limiter()
+    if 'upstream_groups' in changed:
+        upstream_groups.configure(new['upstream_groups'])
+    if 'upstream_health_interval' in changed:
+        # 检查线程每轮读取间隔，间隔为0时退出，下次解析组时重新启动
+        upstream_groups.interval = new['upstream_health_interval']
+    if 'upstream_unhealthy_threshold' in changed:
+        upstream_groups.unhealthy_threshold = new['upstream_unhealthy_threshold']
+        upstream_groups.configure(new['upstream_groups'])
+    if 'ip_info_ttl' in changed:
+        ip_info_cache.ttl = new['ip_info_ttl']
+    if changed & {'dns_cache_enabled', 'dns_ttl', 'dns_negative_ttl', 'dns_cache_max_entries'}:
+        dns_cache.enabled = new['dns_cache_enabled']
+        dns_cache.ttl = new['dns_ttl']
+        dns_cache.negative_ttl = new['dns_negative_ttl']
+        dns_cache.max_entries = new['dns_cache_max_entries']
+    if 'json_backend' in changed:
+        try:
+            mcp_json.set_backend(new['json_backend'])
+        except ValueError as e:
+            logger.warning("JSON编解码配置无效: %s", e)
+    pending = sorted(changed & RESTART_REQUIRED_KEYS)
+    if pending:
+        logger.warning("以下配置需要重启后生效: %s", ', '.join(pending))
+
+
+config.add_listener(apply_config)
+
+
+def _batch_item_timeout(spec):
+    """单个批量请求的超时时间，不超过全局timeout"""
+    try:
+        return min(float(spec.get('timeout') or config['timeout']), config['timeout'])
+    except (TypeError, ValueError):
+        return config['timeout']
+
+
+def _forward_batch_item(spec):
+    """执行批量请求中的一项"""
+    if not isinstance(spec, dict) or not spec.get('url'):
+        return {'status_code': 400, 'error': 'Missing target URL'}
+
+    headers = dict(spec.get('headers') or {})
+    data = spec.get('data')
+    if isinstance(data, (dict, list)):
+        data = json.dumps(data)
+        if not any(key.lower() == 'content-type' for key in headers):
+            headers['Content-Type'] = 'application/json'
+
+    result = MCPForwardResource.forward_request(
+        spec['url'],
+        (spec.get('method') or 'GET').upper(),
+        headers,
+        data,
+        spec.get('params'),
+        _batch_item_timeout(spec),
+        spec.get('coalesce', True) is not False
+    )
+    if 'raw' in result:
+        data = result_data(result)
+        result = {key: value for key, value in result.items() if key != 'raw'}
+        result['data'] = data
+    return result
+
+
+def submit_batch(specs):
+    """并行提交批量请求，返回[(future, 截止时间)]"""
+    now = time.monotonic()
+    submitted = []
+    for spec in specs:
+        timeout = _batch_item_timeout(spec) if isinstance(spec, dict) else config['timeout']
+        submitted.append((batch_executor.submit(_forward_batch_item, spec), now + timeout))
+    return submitted
+
+
+def _batch_result(future, deadline):
+    """在截止时间前等待单项结果，超时返回504"""
+    try:
+        return future.result(timeout=max(deadline - time.monotonic(), 0))
+    except FuturesTimeoutError:
+        future.cancel()
+        return {'status_code': 504, 'error': 'Batch item timed out'}
+
+
+def iter_batch_completed(submitted):
+    """按完成顺序产出(序号, 结果)"""
+    index_of = {future: index for index, (future, _) in enumerate(submitted)}
+    deadline = max((item_deadline for _, item_deadline in submitted), default=time.monotonic())
+    pending = set(index_of)
+    try:
+        for future in as_completed(index_of, timeout=max(deadline - time.monotonic(), 0)):
+            pending.discard(future)
+            yield index_of[future], _batch_result(future, submitted[index_of[future]][1])
+    except FuturesTimeoutError:
+        pass
+    for future in sorted(pending, key=index_of.get):
+        future.cancel()
+        yield index_of[future], {'status_code': 504, 'error': 'Batch item timed out'}
+
+
+def filter_forward_headers(items):
+    """过滤需要转发给上游的请求头（排除Flask特定的头信息和逐跳头部）"""
+    return {
+        key: value for key, value in items
+        if not key.lower().startswith('x-') and key.lower() != 'host'
+        and key.lower() not in HOP_BY_HOP_HEADERS
+    }
+
+def create_ssl_context():
+    """证书和私钥都存在时创建服务端SSL上下文，否则返回None"""
+    if not (os.path.exists(config['ssl_cert_path']) and os.path.exists(config['ssl_key_path'])):
+        return None
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(config['ssl_cert_path'], config['ssl_key_path'])
+    return context
+
+def server_info():
+    """返回服务器基本信息"""
+    return {
         'status': 'running',
         'name': 'MCP Server',
         'version': '1.0.0',
         'timestamp': datetime.now().isoformat(),
-        'available_endpoints': ['/', '/api/ip-info', '/api/forward']
-    })
+        'available_endpoints': ['/', '/api/ip-info', '/api/forward', '/api/forward/batch', '/api/stats', '/metrics', '/mcp']
+    }
+
+def error_response(result):
+    """将转发失败结果转换为JSON错误响应，被拒绝时附带Retry-After头"""
+    response = jsonify(result)
+    response.status_code = result.get('status_code', 500)
+    if 'retry_after' in result:
+        response.headers['Retry-After'] = str(result['retry_after'])
+    return response
+
+def _read_streamed_body():
+    """入站请求体过大或为分块传输时，返回可流式上传的对象，否则返回None"""
+    length = request.content_length
+    if length is None:
+        if request.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            return _iter_stream(request.stream, config['stream_chunk_size'])
+        return None
+    if length > config['stream_request_threshold']:
+        return _SizedStream(request.stream, length)
+    return None
+
+def _stream_response(result):
+    """将流式转发结果包装为逐块输出的Flask响应
+
+    透传时保留上游的Content-Encoding和Content-Length；
+    否则响应体已被解压，必要时按客户端支持的编码重新压缩。
+    """
+    upstream_headers = result['headers']
+    passthrough = result.get('passthrough', False)
+    encoded = 'content-encoding' in {key.lower() for key in upstream_headers}
+    body = result['body']
+    length = None
+    content_type = None
+    response_headers = {}
+    for key, value in upstream_headers.items():
+        lower_key = key.lower()
+        if lower_key in HOP_BY_HOP_HEADERS:
+            continue
+        if not passthrough:
+            if lower_key == 'content-encoding':
+                continue
+            # requests会解压响应体，解压后的长度与上游声明的不同
+            if lower_key == 'content-length':
+                if encoded:
+                    continue
+                length = int(value) if value.isdigit() else None
+        if lower_key == 'content-type':
+            content_type = value
+        response_headers[key] = value
+
+    encoding = None
+    if (not passthrough and config['compression_enabled'] and compressible(content_type)
+            and (length is None or length >= config['compression_min_size'])):
+        encoding = negotiate(request.headers.get('Accept-Encoding'))
+    if encoding is not None:
+        body = _CompressedBody(body, encoding)
+        response_headers = {key: value for key, value in response_headers.items() if key.lower() != 'content-length'}
+        response_headers['Content-Encoding'] = encoding
+
+    response = Response(body, status=result['status_code'])
+    for key, value in response_headers.items():
+        response.headers[key] = value
+    if encoding is not None:
+        response.vary.add('Accept-Encoding')
+    return response
+
+# 响应压缩
+@app.after_request
+def compress_response(response):
+    """非流式响应超过compression_min_size时按客户端支持的编码压缩"""
+    if (not config['compression_enabled'] or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers or response.status_code in (204, 304)
+            or not compressible(response.mimetype)):
+        return response
+    data = response.get_data()
+    if len(data) < config['compression_min_size']:
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = negotiate(request.headers.get('Accept-Encoding'))
+    if encoding is not None:
+        response.set_data(compress(data, encoding, encoding_level(encoding)))
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+# 首页路由
+@app.route('/')
+def index():
+    """首页，返回服务器信息"""
+    return jsonify(server_info())
 
 # IP信息路由
 @app.route('/api/ip-info', methods=['GET'])
@@ -159,10 +2147,75 @@ def get_ip_info():
     ip_info = IPInfoResource.get_ip_info()
     return jsonify(ip_info)
 
+# 运行统计路由
+@app.route('/api/stats', methods=['GET'])
+def get_stats():
+    """获取服务器运行统计信息"""
+    return jsonify({
+        'upstream_pool': upstream_pool.stats(),
+        'response_cache': response_cache.stats(),
+        'upstream_metrics': upstream_metrics.stats(),
+        'admission': admission.stats(),
+        'circuit_breaker': circuit_breaker.stats(),
+        'dns_cache': dns_cache.stats(),
+        'upstream_groups': upstream_groups.stats(),
+        'routes': routing_table.stats(),
+        'rate_limit': rate_limiter.stats() if rate_limiter is not None else {},
+        'mcp_rpc': rpc_server.stats(),
+        'logging': log_handler.stats() if isinstance(log_handler, AsyncQueueHandler) else {},
+        'config': config.stats(),
+        'coalescing': {
+            'enabled': config['coalesce_enabled'],
+            'in_flight': forward_flight.in_flight(),
+            'coalesced': forward_flight.coalesced
+        }
+    })
+
+# Prometheus指标路由
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """以Prometheus文本格式导出运行指标"""
+    pool_stats = upstream_pool.stats()
+    cache_stats = response_cache.stats()
+    body = upstream_metrics.prometheus()
+    body += counter_lines('mcp_upstream_pool_total', 'Upstream session pool lookups and evictions.', {
+        'result="hit"': pool_stats['hits'],
+        'result="miss"': pool_stats['misses'],
+        'result="eviction"': pool_stats['evictions']
+    })
+    body += counter_lines('mcp_response_cache_total', 'Response cache lookups.', {
+        'result="hit"': cache_stats['hits'],
+        'result="miss"': cache_stats['misses'],
+        'result="revalidated"': cache_stats['revalidations'],
+        'result="coalesced"': cache_stats['coalesced']
+    })
+    body += counter_lines('mcp_forward_coalesced_total', 'Uncached forwards that waited on an identical in-flight request.', {
+        '': forward_flight.coalesced
+    })
+    dns_stats = dns_cache.stats()
+    body += counter_lines('mcp_dns_cache_total', 'DNS cache lookups.', {
+        'result="hit"': dns_stats['hits'],
+        'result="miss"': dns_stats['misses'],
+        'result="negative_hit"': dns_stats['negative_hits'],
+        'result="prefetch"': dns_stats['prefetches']
+    })
+    body += admission.prometheus()
+    body += circuit_breaker.prometheus()
+    body += upstream_groups.prometheus()
+    body += routing_table.prometheus()
+    if rate_limiter is not None:
+        body += rate_limiter.prometheus()
+    return Response(body, mimetype='text/plain; version=0.0.4')
+
 # 通用请求转发路由
 @app.route('/api/forward', methods=['GET', 'POST', 'PUT', 'DELETE', 'PATCH'])
 def forward_request():
     """转发HTTP请求"""
+    # 按客户端限流
+    limited = rate_limit_response()
+    if limited is not None:
+        return limited
+
     # 获取目标URL
     url = request.args.get('url')
     if not url:
@@ -171,17 +2224,22 @@ def forward_request():
     # 获取请求方法
     method = request.method
     
-    # 获取请求头（排除Flask特定的头信息）
-    headers = {
-        key: value for key, value in request.headers.items()
-        if not key.lower().startswith('x-') and key.lower() != 'host'
-    }
+    # 是否使用流式透传模式
+    stream = config['stream_mode'] or request.headers.get('X-MCP-Stream', '').lower() in ('1', 'true')
     
-    # 获取请求数据
-    try:
-        data = request.get_json() if request.is_json else request.data
-    except Exception:
-        data = request.data
+    # 获取请求头（排除Flask特定的头信息和逐跳头部）
+    headers = filter_forward_headers(request.headers.items())
+    
+    # 获取请求数据，大请求体直接流式上传
+    data = _read_streamed_body()
+    if data is None:
+        if stream:
+            data = request.get_data()
+        else:
+            try:
+                data = request.get_json() if request.is_json else request.data
+            except Exception:
+                data = request.data
     
     # 获取查询参数（排除url参数）
     params = {
@@ -189,16 +2247,24 @@ def forward_request():
         if key.lower() != 'url'
     }
     
-    # 转发请求
-    result = MCPForwardResource.forward_request(url, method, headers, data, params)
+    # 流式转发请求
+    if stream:
+        result = MCPForwardResource.stream_request(url, method, headers, data, params)
+        if 'error' in result:
+            return error_response(result)
+        return _stream_response(result)
+    
+    # 转发请求，X-MCP-No-Coalesce头可关闭本次请求的合并
+    coalesce = request.headers.get('X-MCP-No-Coalesce', '').lower() not in ('1', 'true')
+    result = MCPForwardResource.forward_request(url, method, headers, data, params, coalesce=coalesce)
     
     # 返回响应
     if 'error' in result:
-        return jsonify(result), result.get('status_code', 500)
+        return error_response(result)
     
     # 创建响应对象
     response = Response(
-        json.dumps(result['data']),
+        result_body(result),
         status=result['status_code'],
         mimetype='application/json'
     )
@@ -210,28 +2276,86 @@ def forward_request():
     
     return response
 
-# 启动服务器
-if __name__ == '__main__':
-    # 检查是否启用SSL
-    use_ssl = os.path.exists(config['ssl_cert_path']) and os.path.exists(config['ssl_key_path'])
-    
-    if use_ssl:
-        # 使用SSL启动服务器
-        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
-        context.load_cert_chain(config['ssl_cert_path'], config['ssl_key_path'])
-        
-        logger.info(f"MCP Server 启动成功 (HTTPS)，端口: {config['server_port']}")
-        app.run(
-            host='0.0.0.0',
-            port=config['server_port'],
-            debug=config['debug_mode'],
-            ssl_context=context
-        )
-    else:
-        # 不使用SSL启动服务器
-        logger.info(f"MCP Server 启动成功 (HTTP)，端口: {config['server_port']}")
-        app.run(
-            host='0.0.0.0',
-            port=config['server_port'],
-            debug=config['debug_mode']
-        )
\ No newline at end of file
+# 批量请求转发路由
+@app.route('/api/forward/batch', methods=['POST'])
+def forward_batch():
+    """并行转发一组请求
+
+    请求体为请求描述（url、method、headers、data、params、timeout、coalesce）组成的JSON数组。
+    默认按原顺序返回结果数组；Accept为application/x-ndjson时按完成顺序逐行返回。
+    """
+    specs = request.get_json(silent=True)
+    if not isinstance(specs, list):
+        return jsonify({'error': 'Request body must be a JSON array'}), 400
+    if len(specs) > config['batch_max_items']:
+        return jsonify({'error': f"Too many requests in batch (max {config['batch_max_items']})"}), 413
+    limited = rate_limit_response(max(len(specs), 1))
+    if limited is not None:
+        return limited
+
+    submitted = submit_batch(specs)
+
+    if 'application/x-ndjson' in request.headers.get('Accept', ''):
+        def generate():
+            for index, result in iter_batch_completed(submitted):
+                yield mcp_json.dumps(dict(result, index=index)) + b'\n'
+        return Response(generate(), mimetype='application/x-ndjson')
+
+    return jsonify([_batch_result(future, deadline) for future, deadline in submitted])
+
+# MCP Streamable HTTP传输路由
+@app.route('/mcp', methods=['GET', 'POST', 'DELETE'])
+def mcp_endpoint():
+    """MCP JSON-RPC端点
+
+    POST的请求体为单个JSON-RPC消息或批量数组，会话由Mcp-Session-Id头标识，initialize时分配。
+    Accept包含text/event-stream时以SSE逐条返回响应（按完成顺序），否则全部完成后以JSON返回。
+    DELETE结束会话；不支持由服务端主动推送的GET流。
+    """
+    session_id = request.headers.get('Mcp-Session-Id')
+    if request.method == 'DELETE':
+        if not session_id:
+            return jsonify({'error': 'Missing Mcp-Session-Id header'}), 400
+        return ('', 204) if rpc_server.close_session(session_id) else ('', 404)
+    if request.method == 'GET':
+        return jsonify({'error': 'Server-initiated streams are not supported'}), 405
+
+    try:
+        payload = mcp_json.loads(request.get_data())
+        parsed = True
+    except ValueError:
+        payload, parsed = None, False
+    # 批量消息按其中的请求数消耗令牌，只含通知的消息和无法解析的消息计为一个
+    limited = rate_limit_response(max(count_requests(payload), 1))
+    if limited is not None:
+        return limited
+    if not parsed:
+        return Response(encode({'jsonrpc': '2.0', 'id': None, 'error': {'code': PARSE_ERROR, 'message': 'Parse error'}}),
+                        status=400, mimetype='application/json')
+
+    messages = payload if isinstance(payload, list) else [payload]
+    initializing = any(isinstance(message, dict) and message.get('method') == 'initialize' for message in messages)
+    session = rpc_server.session(None if initializing else session_id)
+    expected = count_requests(payload)
+    responses = queue.Queue()
+    session.receive(payload, responses.put)
+    headers = {'Mcp-Session-Id': session.id}
+    if not expected:
+        return Response(status=202, headers=headers)
+
+    if 'text/event-stream' in request.headers.get('Accept', ''):
+        def generate():
+            remaining = expected
+            while remaining:
+                message = responses.get()
+                remaining -= 1
+                if message is not None:
+                    yield b'event: message\ndata: ' + encode(message) + b'\n\n'
+        headers['Cache-Control'] = 'no-cache'
+        return Response(generate(), mimetype='text/event-stream', headers=headers)
+
+    collected = [message for message in (responses.get() for _ in range(expected)) if message is not None]
+    if not collected:
+        return Response(status=202, headers=headers)
+    body = collected if isinstance(payload, list) else collected[0]
+    return Response(encode(body), mimetype='application/json', headers=headers)
@@ -0,0 +1,302 @@
+# -*- coding: utf-8 -*-
+"""
+MCP Server 流式隧道
+
+异步服务模式下的 /api/tunnel 端点，将客户端连接与上游的长连接双向桥接：
+- 客户端发起WebSocket升级时，与上游建立WebSocket连接并双向转发文本和二进制帧，
+  一方关闭时以相同的关闭码关闭另一方；
+- 普通请求（如SSE事件流）以流式响应透传上游响应体，收到多少转发多少，不做缓冲。
+所有隧道运行在事件循环中，每个隧道只占用两个协程而不是线程。
+每次只读取一帧（或一块）并在写入对端完成（缓冲区排空）后才读取下一帧，
+读取队列满时暂停从套接字读取，由TCP流控把背压传回发送方，
+因此每个隧道占用的内存不超过两个读取队列加上单帧上限（tunnel_max_frame_bytes）。
+两个方向都超过tunnel_idle_timeout秒没有数据时关闭隧道。
+"""
+import asyncio
+import logging
+import time
+
+import aiohttp
+from aiohttp import web
+
+from mcp_metrics import counter_lines
+from mcp_server import HOP_BY_HOP_HEADERS
+
+logger = logging.getLogger(__name__)
+
+# 由aiohttp自行生成的WebSocket握手头，不转发给上游
+WEBSOCKET_HANDSHAKE_HEADERS = frozenset([
+    'sec-websocket-key', 'sec-websocket-version', 'sec-websocket-extensions',
+    'sec-websocket-accept', 'sec-websocket-protocol'
+])
+
+CLOSE_REASONS = ('client', 'upstream', 'idle', 'error')
+
+
+class TunnelLimitReached(Exception):
+    """同时打开的隧道数达到上限"""
+
+
+class _Tunnel:
+    """一个隧道的活动时间和流量计数"""
+
+    __slots__ = ('manager', 'last_activity', 'reason')
+
+    def __init__(self, manager):
+        self.manager = manager
+        self.last_activity = time.monotonic()
+        self.reason = None
+
+    def relayed(self, direction, size):
+        """记录一帧（或一块）数据，direction为upstream（客户端到上游）或client（上游到客户端）"""
+        self.last_activity = time.monotonic()
+        self.manager.frames[direction] += 1
+        self.manager.bytes[direction] += size
+
+    def idle_for(self):
+        return time.monotonic() - self.last_activity
+
+    def close(self, reason):
+        """记录关闭原因，只记录第一次"""
+        if self.reason is None:
+            self.reason = reason
+
+
+class TunnelManager:
+    """隧道的并发上限、帧转发和统计（只在事件循环线程中使用，无需加锁）"""
+
+    def __init__(self, max_tunnels=10000, idle_timeout=300, max_frame_bytes=1048576, heartbeat=30,
+                 connect_timeout=30):
+        """初始化隧道管理器
+
+        Args:
+            max_tunnels: 同时打开的隧道数上限
+            idle_timeout: 双向都没有数据多少秒后关闭隧道
+            max_frame_bytes: WebSocket单帧大小上限
+            heartbeat: WebSocket心跳（ping）间隔秒数，0表示不发送
+            connect_timeout: 连接上游的超时时间
+        """
+        self.max_tunnels = max_tunnels
+        self.idle_timeout = idle_timeout
+        self.max_frame_bytes = max_frame_bytes
+        self.heartbeat = heartbeat
+        self.connect_timeout = connect_timeout
+        self.session = None
+        self.active = {'websocket': 0, 'stream': 0}
+        self.opened = {'websocket': 0, 'stream': 0}
+        self.rejected = 0
+        self.closed = dict.fromkeys(CLOSE_REASONS, 0)
+        self.frames = {'upstream': 0, 'client': 0}
+        self.bytes = {'upstream': 0, 'client': 0}
+
+    async def start(self, app):
+        """应用启动时创建隧道专用的客户端会话
+
+        不与普通转发共用连接池：长连接会长期占用连接，隧道总数由max_tunnels限制，
+        会话也不设置总超时，空闲由idle_timeout控制。
+        """
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=0, ssl=False),
+            timeout=aiohttp.ClientTimeout(total=None, sock_connect=self.connect_timeout),
+            auto_decompress=False
+        )
+
+    async def close(self, app):
+        """应用关闭时释放客户端会话"""
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    def _open(self, kind):
+        if sum(self.active.values()) >= self.max_tunnels:
+            self.rejected += 1
+            raise TunnelLimitReached(f'Too many open tunnels (max {self.max_tunnels})')
+        self.active[kind] += 1
+        self.opened[kind] += 1
+        return _Tunnel(self)
+
+    def _close(self, kind, tunnel):
+        self.active[kind] -= 1
+        self.closed[tunnel.reason or 'error'] += 1
+
+    # WebSocket
+    async def websocket(self, request, url, headers=None, params=None, ssl=False):
+        """将已请求升级的客户端连接与上游WebSocket桥接，返回WebSocketResponse
+
+        ssl为False时不校验上游证书，也可以传入SSLContext
+        """
+        tunnel = self._open('websocket')
+        upstream = None
+        client = None
+        try:
+            protocols = [
+                protocol.strip()
+                for protocol in request.headers.get('Sec-WebSocket-Protocol', '').split(',') if protocol.strip()
+            ]
+            headers = {
+                key: value for key, value in (headers or {}).items()
+                if key.lower() not in WEBSOCKET_HANDSHAKE_HEADERS
+            }
+            try:
+                upstream = await self.session.ws_connect(
+                    url, headers=headers, params=params, protocols=protocols, max_msg_size=self.max_frame_bytes,
+                    heartbeat=self.heartbeat or None, autoclose=False,
+                    timeout=self.connect_timeout, ssl=ssl
+                )
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.warning("隧道连接上游WebSocket失败: %s: %s", url, e)
+                tunnel.close('error')
+                status = e.status if isinstance(e, aiohttp.WSServerHandshakeError) else 502
+                return web.json_response({'status_code': status, 'error': str(e) or e.__class__.__name__},
+                                         status=status)
+
+            # 与上游协商出的子协议原样告知客户端
+            client = web.WebSocketResponse(
+                protocols=[upstream.protocol] if upstream.protocol else (),
+                max_msg_size=self.max_frame_bytes, heartbeat=self.heartbeat or None, autoclose=False
+            )
+            await client.prepare(request)
+            logger.debug("WebSocket隧道已建立: %s", url)
+            await self._run(tunnel, self._pump_frames(tunnel, client, upstream, 'upstream'),
+                            self._pump_frames(tunnel, upstream, client, 'client'))
+            return client
+        except asyncio.CancelledError:
+            # 客户端断开时aiohttp取消处理协程
+            tunnel.close('client')
+            raise
+        finally:
+            for ws in (upstream, client):
+                if ws is not None and not ws.closed:
+                    await ws.close()
+            self._close('websocket', tunnel)
+
+    async def _pump_frames(self, tunnel, source, target, direction):
+        """从source逐帧读取并写入target，写入完成后才读取下一帧"""
+        closer = 'client' if direction == 'upstream' else 'upstream'
+        while True:
+            try:
+                message = await source.receive(timeout=self._idle_wait(tunnel))
+            except asyncio.TimeoutError:
+                if tunnel.idle_for() >= self.idle_timeout:
+                    tunnel.close('idle')
+                    await target.close(code=aiohttp.WSCloseCode.GOING_AWAY, message=b'Idle timeout')
+                    return
+                continue
+
+            if message.type == aiohttp.WSMsgType.TEXT:
+                tunnel.relayed(direction, len(message.data))
+                await target.send_str(message.data)
+            elif message.type == aiohttp.WSMsgType.BINARY:
+                tunnel.relayed(direction, len(message.data))
+                await target.send_bytes(message.data)
+            elif message.type == aiohttp.WSMsgType.CLOSE:
+                tunnel.close(closer)
+                await target.close(code=message.data or aiohttp.WSCloseCode.OK,
+                                   message=(message.extra or '').encode())
+                return
+            elif message.type == aiohttp.WSMsgType.ERROR:
+                tunnel.close('error')
+                await target.close(code=aiohttp.WSCloseCode.INTERNAL_ERROR)
+                return
+            else:
+                # CLOSING、CLOSED：连接已在关闭
+                tunnel.close(closer)
+                return
+
+    # 流式响应（SSE等）
+    async def stream(self, request, url, method, headers=None, data=None, params=None, ssl=False):
+        """以流式响应透传上游响应体，返回StreamResponse，ssl的含义同websocket"""
+        tunnel = self._open('stream')
+        try:
+            timeout = aiohttp.ClientTimeout(total=None, sock_connect=self.connect_timeout,
+                                            sock_read=self.idle_timeout)
+            try:
+                upstream = await self.session.request(
+                    method, url, headers=headers or {}, data=data, params=params, timeout=timeout, ssl=ssl
+                )
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.warning("隧道连接上游失败: %s: %s", url, e)
+                tunnel.close('error')
+                return web.json_response({'status_code': 502, 'error': str(e) or e.__class__.__name__}, status=502)
+
+            try:
+                response = web.StreamResponse(status=upstream.status)
+                for key, value in upstream.headers.items():
+                    if key.lower() not in HOP_BY_HOP_HEADERS and key.lower() != 'content-length':
+                        response.headers[key] = value
+                # 避免中间代理缓冲事件流
+                response.headers.setdefault('Cache-Control', 'no-cache')
+                response.headers['X-Accel-Buffering'] = 'no'
+                await response.prepare(request)
+                try:
+                    async for chunk in upstream.content.iter_any():
+                        tunnel.relayed('client', len(chunk))
+                        await response.write(chunk)
+                    tunnel.close('upstream')
+                    await response.write_eof()
+                except asyncio.TimeoutError:
+                    tunnel.close('idle')
+                except (ConnectionError, aiohttp.ClientConnectionError) as e:
+                    # 客户端断开时写入失败，上游断开时读取失败
+                    tunnel.close('client' if isinstance(e, ConnectionError) else 'error')
+                except asyncio.CancelledError:
+                    tunnel.close('client')
+                    raise
+                return response
+            finally:
+                if tunnel.reason == 'upstream':
+                    upstream.release()
+                else:
+                    # 未读完的连接不能复用
+                    upstream.close()
+        finally:
+            self._close('stream', tunnel)
+
+    # 共用
+    def _idle_wait(self, tunnel):
+        """距离空闲超时还剩多少秒"""
+        return max(self.idle_timeout - tunnel.idle_for(), 0.01)
+
+    async def _run(self, tunnel, *pumps):
+        """同时运行两个方向的转发，任一方向结束后取消另一方向"""
+        tasks = [asyncio.ensure_future(pump) for pump in pumps]
+        try:
+            done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if not task.cancelled() and task.exception() is not None:
+                    tunnel.close('error')
+                    logger.warning("隧道转发失败: %s", task.exception())
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self):
+        """返回隧道统计信息"""
+        return {
+            'active': dict(self.active),
+            'opened': dict(self.opened),
+            'rejected': self.rejected,
+            'closed': dict(self.closed),
+            'frames': dict(self.frames),
+            'bytes': dict(self.bytes),
+            'max_tunnels': self.max_tunnels
+        }
+
+    def prometheus(self):
+        """返回Prometheus文本格式的隧道指标"""
+        return (
+            counter_lines('mcp_tunnels_active', 'Open tunnels.',
+                          {f'kind="{kind}"': count for kind, count in self.active.items()}, metric_type='gauge')
+            + counter_lines('mcp_tunnels_opened_total', 'Tunnels opened.',
+                            {f'kind="{kind}"': count for kind, count in self.opened.items()})
+            + counter_lines('mcp_tunnels_rejected_total', 'Tunnels rejected at the concurrency limit.',
+                            {'': self.rejected})
+            + counter_lines('mcp_tunnels_closed_total', 'Tunnels closed by reason.',
+                            {f'reason="{reason}"': count for reason, count in self.closed.items()})
+            + counter_lines('mcp_tunnel_frames_total', 'Frames or chunks relayed through tunnels.',
+                            {f'direction="{direction}"': count for direction, count in self.frames.items()})
+            + counter_lines('mcp_tunnel_bytes_total', 'Payload bytes relayed through tunnels.',
+                            {f'direction="{direction}"': count for direction, count in self.bytes.items()})
+        )
+
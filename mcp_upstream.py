@@ -0,0 +1,266 @@
+# -*- coding: utf-8 -*-
+"""
+MCP Server 上游副本组
+
+在mcp_client_server_config.json的upstream_groups中定义命名的上游组：
+    "upstream_groups": {
+        "backend": {"replicas": ["http://10.0.0.1:8080", "http://10.0.0.2:8080"],
+                    "health_path": "/health", "hedge": true}
+    }
+转发时以 upstream://backend/path?query 作为目标URL，由组选择副本：
+- 负载均衡按 (进行中请求数 + 1) * 响应时间EWMA 取最小值，没有样本的副本优先被尝试；
+- 后台线程定期请求health_path，连续失败达到阈值（含真实请求失败）的副本不再被选择，
+  所有副本都不健康时仍在全部副本中选择；
+- 对冲请求由调用方（转发引擎）根据延迟分位数决定，这里只提供排除已用副本的选择。
+"""
+import logging
+import os
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+from mcp_metrics import counter_lines, escape_label
+
+logger = logging.getLogger(__name__)
+
+SCHEME = 'upstream'
+
+
+class UnknownUpstreamGroup(LookupError):
+    """目标URL引用了未配置的上游组"""
+
+
+class Replica:
+    """上游组中的一个副本"""
+
+    __slots__ = ('url', 'healthy', 'outstanding', 'ewma', 'failures', 'requests', 'errors')
+
+    def __init__(self, url):
+        self.url = url.rstrip('/')
+        self.healthy = True
+        self.outstanding = 0
+        self.ewma = None
+        self.failures = 0
+        self.requests = 0
+        self.errors = 0
+
+    def score(self):
+        """负载评分，越小越优先"""
+        return (self.outstanding + 1) * (self.ewma or 0.0)
+
+
+class UpstreamGroup:
+    """一组可互相替代的上游副本"""
+
+    def __init__(self, name, replicas, health_path='/health', hedge=False,
+                 unhealthy_threshold=3, ewma_alpha=0.3):
+        """初始化上游组
+
+        Args:
+            name: 组名
+            replicas: 副本基础URL列表（scheme://host:port[/prefix]）
+            health_path: 健康检查路径，为空时不做主动检查
+            hedge: 是否对幂等请求发送对冲请求
+            unhealthy_threshold: 连续失败多少次后标记为不健康
+            ewma_alpha: 响应时间EWMA的平滑系数
+        """
+        if not replicas:
+            raise ValueError(f'Upstream group {name} has no replicas')
+        self.name = name
+        self.replicas = [Replica(url) for url in replicas]
+        self.health_path = health_path
+        self.hedge = hedge
+        self.unhealthy_threshold = unhealthy_threshold
+        self.ewma_alpha = ewma_alpha
+        self._lock = threading.Lock()
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def pick(self, exclude=()):
+        """选择负载最低的健康副本，exclude中的副本不参与选择，没有可选副本时返回None"""
+        with self._lock:
+            candidates = [replica for replica in self.replicas if replica not in exclude]
+            healthy = [replica for replica in candidates if replica.healthy]
+            candidates = healthy or candidates
+            if not candidates:
+                return None
+            return min(candidates, key=lambda replica: (replica.score(), replica.outstanding, random.random()))
+
+    def begin(self, replica):
+        """向副本发送请求前调用"""
+        with self._lock:
+            replica.outstanding += 1
+            replica.requests += 1
+
+    def end(self, replica, seconds, ok):
+        """请求结束后调用，更新进行中请求数、响应时间EWMA和被动健康状态"""
+        with self._lock:
+            replica.outstanding -= 1
+            if ok:
+                replica.ewma = seconds if replica.ewma is None else \
+                    replica.ewma + self.ewma_alpha * (seconds - replica.ewma)
+            self._record_health(replica, ok)
+            if not ok:
+                replica.errors += 1
+
+    def _record_health(self, replica, ok):
+        """记录一次成功或失败（调用方需持有锁）"""
+        if ok:
+            replica.failures = 0
+            if not replica.healthy:
+                replica.healthy = True
+                logger.info("上游副本恢复健康: %s", replica.url)
+        else:
+            replica.failures += 1
+            if replica.healthy and replica.failures >= self.unhealthy_threshold:
+                replica.healthy = False
+                logger.warning("上游副本不健康: %s", replica.url)
+
+    def set_health(self, replica, ok):
+        """记录主动健康检查的结果"""
+        with self._lock:
+            self._record_health(replica, ok)
+
+    def record_hedge(self, won):
+        """记录一次对冲请求，won表示对冲请求先于原请求返回"""
+        with self._lock:
+            self.hedges += 1
+            if won:
+                self.hedge_wins += 1
+
+    def stats(self):
+        """返回组的统计信息"""
+        with self._lock:
+            return {
+                'hedge': self.hedge,
+                'hedges': self.hedges,
+                'hedge_wins': self.hedge_wins,
+                'replicas': {
+                    replica.url: {
+                        'healthy': replica.healthy,
+                        'outstanding': replica.outstanding,
+                        'ewma_seconds': round(replica.ewma, 6) if replica.ewma is not None else None,
+                        'requests': replica.requests,
+                        'errors': replica.errors
+                    }
+                    for replica in self.replicas
+                }
+            }
+
+
+class UpstreamGroups:
+    """上游组注册表和健康检查"""
+
+    def __init__(self, checker, interval=10, unhealthy_threshold=3):
+        """初始化注册表
+
+        Args:
+            checker: 健康检查函数checker(url)，副本健康时返回True
+            interval: 健康检查间隔秒数，0表示不做主动检查
+            unhealthy_threshold: 连续失败多少次后标记为不健康
+        """
+        self._checker = checker
+        self.interval = interval
+        self.unhealthy_threshold = unhealthy_threshold
+        self._groups = {}
+        self._checker_pid = None
+        self._lock = threading.Lock()
+
+    def configure(self, groups_config):
+        """按配置创建或更新上游组，副本URL不变的副本保留负载和健康状态"""
+        groups = {}
+        for name, spec in (groups_config or {}).items():
+            try:
+                group = UpstreamGroup(
+                    name, spec.get('replicas') or [], spec.get('health_path', '/health'),
+                    bool(spec.get('hedge', False)), self.unhealthy_threshold
+                )
+            except (AttributeError, ValueError) as e:
+                logger.error("上游组配置无效: %s: %s", name, e)
+                continue
+            old = self._groups.get(name)
+            if old is not None:
+                existing = {replica.url: replica for replica in old.replicas}
+                group.replicas = [existing.get(replica.url, replica) for replica in group.replicas]
+            groups[name] = group
+        with self._lock:
+            self._groups = groups
+
+    def get(self, name):
+        """返回指定名称的组，不存在时返回None"""
+        return self._groups.get(name)
+
+    def resolve(self, url):
+        """解析upstream://组名/路径形式的目标URL
+
+        Returns:
+            (group, target)：上游组和副本URL之后要追加的路径及查询串；普通URL返回None
+
+        Raises:
+            UnknownUpstreamGroup: 引用的组不存在
+        """
+        if not url.startswith(SCHEME + '://'):
+            return None
+        parts = urlsplit(url)
+        group = self._groups.get(parts.netloc)
+        if group is None:
+            raise UnknownUpstreamGroup(f'Unknown upstream group: {parts.netloc}')
+        target = parts.path or '/'
+        if parts.query:
+            target += '?' + parts.query
+        self.start_health_checks()
+        return group, target
+
+    def check(self):
+        """对所有配置了health_path的副本执行一次健康检查"""
+        for group in list(self._groups.values()):
+            if not group.health_path:
+                continue
+            for replica in list(group.replicas):
+                try:
+                    ok = bool(self._checker(replica.url + group.health_path))
+                except Exception as e:
+                    logger.debug("健康检查失败 %s: %s", replica.url, e)
+                    ok = False
+                group.set_health(replica, ok)
+
+    def start_health_checks(self):
+        """启动后台健康检查线程，每个进程只启动一次"""
+        if self._checker_pid == os.getpid() or not self.interval:
+            return False
+        with self._lock:
+            if self._checker_pid == os.getpid():
+                return False
+            self._checker_pid = os.getpid()
+
+        def run():
+            while self.interval:
+                self.check()
+                time.sleep(self.interval)
+            self._checker_pid = None
+
+        threading.Thread(target=run, name='upstream-health', daemon=True).start()
+        return True
+
+    def prometheus(self):
+        """返回Prometheus文本格式的上游组指标"""
+        healthy, requests, hedges = {}, {}, {}
+        for name, group in list(self._groups.items()):
+            stats = group.stats()
+            for url, replica in stats['replicas'].items():
+                label = f'group="{escape_label(name)}",replica="{escape_label(url)}"'
+                healthy[label] = int(replica['healthy'])
+                requests[label] = replica['requests']
+            hedges[f'group="{escape_label(name)}",result="sent"'] = stats['hedges']
+            hedges[f'group="{escape_label(name)}",result="won"'] = stats['hedge_wins']
+        return (
+            counter_lines('mcp_upstream_replica_healthy', 'Upstream replica health (1 healthy, 0 unhealthy).',
+                          healthy, metric_type='gauge')
+            + counter_lines('mcp_upstream_replica_requests_total', 'Requests sent to each upstream replica.', requests)
+            + counter_lines('mcp_upstream_hedged_total', 'Hedged requests sent and won.', hedges)
+        )
+
+    def stats(self):
+        """返回所有组的统计信息"""
+        return {name: group.stats() for name, group in list(self._groups.items())}
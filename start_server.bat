@@ -17,6 +17,6 @@ REM 安装依赖
 "%PYTHON_PATH%" -m pip install -r requirements.txt
 
 REM 启动服务器
-"%PYTHON_PATH%" mcp_server.py
+"%PYTHON_PATH%" mcp_launcher.py
 
 pause
\ No newline at end of file
@@ -15,5 +15,5 @@ fi
 # 安装依赖
 "$PYTHON_PATH" -m pip install -r requirements.txt
 
-# 启动服务器
-"$PYTHON_PATH" mcp_server.py
\ No newline at end of file
+# 启动服务器（多进程启动器）
+"$PYTHON_PATH" mcp_launcher.py
\ No newline at end of file
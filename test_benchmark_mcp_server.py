@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+"""
+MCP Server 压测工具测试文件
+"""
+import json
+import unittest
+
+import requests
+
+from benchmark_mcp_server import FakeUpstream, run_load
+
+
+class FakeUpstreamTestCase(unittest.TestCase):
+    """本地上游桩服务和压测统计的测试用例"""
+
+    def test_payload_size(self):
+        """测试响应体大小符合配置"""
+        upstream = FakeUpstream(payload_size=4096).start()
+        try:
+            response = requests.get(upstream.url + '/bench')
+            self.assertEqual(response.status_code, 200)
+            self.assertGreaterEqual(len(response.content), 4096)
+            self.assertIn('items', json.loads(response.content))
+        finally:
+            upstream.stop()
+
+    def test_run_load_counts_errors(self):
+        """测试压测结果统计请求数、错误数和延迟分位数"""
+        upstream = FakeUpstream(error_rate=1.0).start()
+        try:
+            result = run_load(upstream.url + '/bench', None, concurrency=4, total_requests=20)
+        finally:
+            upstream.stop()
+        self.assertEqual(result['requests'], 20)
+        self.assertEqual(result['errors'], 20)
+        self.assertLessEqual(result['latency_ms']['p50'], result['latency_ms']['p99'])
+        self.assertGreater(result['throughput_rps'], 0)
+
+if __name__ == '__main__':
+    unittest.main()
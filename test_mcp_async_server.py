@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+"""
+MCP Server 异步服务模式测试文件
+"""
+import asyncio
+import time
+import unittest
+
+import aiohttp
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+from mcp_async_server import create_app, tunnel_manager
+from mcp_server import config
+
+# 桩服务/flood已写出的字节数
+flood_written = [0]
+
+
+def create_stub_upstream():
+    """创建本地上游桩服务"""
+    async def echo(request):
+        return web.json_response({
+            'path': request.path, 'query': dict(request.query),
+            'headers': {key.lower(): value for key, value in request.headers.items()}
+        })
+
+    async def slow(request):
+        await asyncio.sleep(0.2)
+        return web.json_response({'slow': True})
+
+    async def text(request):
+        return web.Response(text='plain text body')
+
+    async def ws_echo(request):
+        ws = web.WebSocketResponse(protocols=('mcp',))
+        await ws.prepare(request)
+        async for message in ws:
+            if message.type == aiohttp.WSMsgType.TEXT:
+                if message.data == 'close':
+                    await ws.close(code=4000, message=b'bye')
+                else:
+                    await ws.send_str('echo:' + message.data)
+            elif message.type == aiohttp.WSMsgType.BINARY:
+                await ws.send_bytes(message.data[::-1])
+        return ws
+
+    async def events(request):
+        response = web.StreamResponse(headers={'Content-Type': 'text/event-stream'})
+        await response.prepare(request)
+        for index in range(3):
+            await response.write(f'data: {index}\n\n'.encode())
+            await asyncio.sleep(0.2)
+        await response.write_eof()
+        return response
+
+    async def flood(request):
+        response = web.StreamResponse()
+        await response.prepare(request)
+        chunk = b'x' * 65536
+        for _ in range(1024):
+            await response.write(chunk)
+            flood_written[0] += len(chunk)
+        await response.write_eof()
+        return response
+
+    upstream = web.Application()
+    upstream.router.add_get('/ws', ws_echo)
+    upstream.router.add_get('/events', events)
+    upstream.router.add_get('/flood', flood)
+    upstream.router.add_get('/echo', echo)
+    upstream.router.add_get('/slow', slow)
+    upstream.router.add_get('/text', text)
+    return upstream
+
+
+class AsyncServerTestCase(unittest.IsolatedAsyncioTestCase):
+    """异步服务模式的测试用例"""
+
+    async def asyncSetUp(self):
+        self.upstream = TestServer(create_stub_upstream())
+        await self.upstream.start_server()
+        self.base_url = str(self.upstream.make_url(''))
+        self.client = TestClient(TestServer(create_app()))
+        await self.client.start_server()
+
+    async def asyncTearDown(self):
+        await self.client.close()
+        await self.upstream.close()
+
+    async def test_index(self):
+        """测试服务器首页"""
+        response = await self.client.get('/')
+        self.assertEqual(response.status, 200)
+        data = await response.json()
+        self.assertEqual(data['status'], 'running')
+
+    async def test_forward(self):
+        """测试转发请求到本地上游"""
+        response = await self.client.get('/api/forward', params={'url': self.base_url + '/echo', 'a': '1'})
+        self.assertEqual(response.status, 200)
+        data = await response.json()
+        self.assertEqual(data['path'], '/echo')
+        self.assertEqual(data['query'], {'a': '1'})
+
+    async def test_forward_missing_url(self):
+        """测试缺少目标URL时返回400"""
+        response = await self.client.get('/api/forward')
+        self.assertEqual(response.status, 400)
+
+    async def test_stream_forward(self):
+        """测试流式模式原样透传响应体"""
+        response = await self.client.get(
+            '/api/forward',
+            params={'url': self.base_url + '/text'},
+            headers={'X-MCP-Stream': '1'}
+        )
+        self.assertEqual(response.status, 200)
+        self.assertEqual(await response.read(), b'plain text body')
+
+    async def test_forward_by_route(self):
+        """测试按路由名改写目标并过滤请求头，隧道同样使用路由"""
+        saved = dict(config)
+        config.update({'routes': {'stub': {'upstream': self.base_url, 'headers_deny': ['Authorization']}}})
+        try:
+            response = await self.client.get('/api/forward', params={'url': 'stub/echo', 'a': '1'},
+                                             headers={'Authorization': 'secret', 'Accept': 'application/json'})
+            data = await response.json()
+            self.assertEqual((data['path'], data['query']), ('/echo', {'a': '1'}))
+            self.assertNotIn('authorization', data['headers'])
+            self.assertEqual(data['headers']['accept'], 'application/json')
+
+            response = await self.client.get('/api/tunnel', params={'url': 'stub/text'})
+            self.assertEqual(await response.read(), b'plain text body')
+        finally:
+            config.replace(saved)
+
+    async def test_concurrent_slow_forwards(self):
+        """测试大量并发慢请求不会相互阻塞"""
+        start = time.monotonic()
+        responses = await asyncio.gather(*[
+            self.client.get('/api/forward', params={'url': self.base_url + '/slow'})
+            for _ in range(100)
+        ])
+        elapsed = time.monotonic() - start
+        self.assertTrue(all(response.status == 200 for response in responses))
+        # 串行执行需要20秒，并发执行应远小于该值
+        self.assertLess(elapsed, 5)
+
+
+class TunnelTestCase(unittest.IsolatedAsyncioTestCase):
+    """流式隧道的测试用例"""
+
+    async def asyncSetUp(self):
+        self.saved = (tunnel_manager.max_tunnels, tunnel_manager.idle_timeout)
+        self.upstream = TestServer(create_stub_upstream())
+        await self.upstream.start_server()
+        self.base_url = str(self.upstream.make_url(''))
+        self.client = TestClient(TestServer(create_app()))
+        await self.client.start_server()
+
+    async def asyncTearDown(self):
+        await self.client.close()
+        await self.upstream.close()
+        tunnel_manager.max_tunnels, tunnel_manager.idle_timeout = self.saved
+
+    def connect(self, path='/ws'):
+        return self.client.ws_connect('/api/tunnel', params={'url': self.base_url + path}, protocols=('mcp',))
+
+    async def test_websocket_frames_and_close(self):
+        """测试WebSocket帧双向转发，子协议和关闭码传回客户端"""
+        before = tunnel_manager.stats()
+        ws = await self.connect()
+        self.assertEqual(ws.protocol, 'mcp')
+        await ws.send_str('hello')
+        self.assertEqual(await ws.receive_str(timeout=2), 'echo:hello')
+        await ws.send_bytes(b'abc')
+        self.assertEqual(await ws.receive_bytes(timeout=2), b'cba')
+        await ws.send_str('close')
+        message = await ws.receive(timeout=2)
+        self.assertEqual(message.type, aiohttp.WSMsgType.CLOSE)
+        self.assertEqual(message.data, 4000)
+        await ws.close()
+
+        stats = (await (await self.client.get('/api/stats')).json())['tunnels']
+        self.assertEqual(stats['active']['websocket'], 0)
+        self.assertEqual(stats['closed']['upstream'] - before['closed']['upstream'], 1)
+        self.assertEqual(stats['frames']['upstream'] - before['frames']['upstream'], 3)
+        self.assertEqual(stats['frames']['client'] - before['frames']['client'], 2)
+
+    async def test_many_concurrent_tunnels(self):
+        """测试大量同时打开的隧道互不阻塞"""
+        url = self.client.make_url('/api/tunnel')
+        # 测试客户端默认的连接池上限为100，这里使用不限连接数的会话
+        async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=0)) as session:
+            sockets = await asyncio.gather(*[
+                session.ws_connect(url, params={'url': self.base_url + '/ws'}) for _ in range(200)
+            ])
+            self.assertEqual(tunnel_manager.stats()['active']['websocket'], 200)
+            for index, ws in enumerate(sockets):
+                await ws.send_str(str(index))
+            replies = await asyncio.gather(*[ws.receive_str(timeout=5) for ws in sockets])
+            self.assertEqual(replies, [f'echo:{index}' for index in range(200)])
+            await asyncio.gather(*[ws.close() for ws in sockets])
+
+    async def test_idle_timeout(self):
+        """测试双向都没有数据时关闭隧道"""
+        tunnel_manager.idle_timeout = 0.3
+        ws = await self.connect()
+        message = await ws.receive(timeout=3)
+        self.assertEqual(message.type, aiohttp.WSMsgType.CLOSE)
+        self.assertEqual(message.data, aiohttp.WSCloseCode.GOING_AWAY)
+        await ws.close()
+
+    async def test_tunnel_limit(self):
+        """测试隧道数达到上限时返回503和Retry-After"""
+        tunnel_manager.max_tunnels = 0
+        response = await self.client.get('/api/tunnel', params={'url': self.base_url + '/events'})
+        self.assertEqual(response.status, 503)
+        self.assertIn('Retry-After', response.headers)
+
+    async def test_event_stream_is_relayed_incrementally(self):
+        """测试SSE事件到达后立即转发，不等待上游结束"""
+        response = await self.client.get('/api/tunnel', params={'url': self.base_url + '/events'})
+        self.assertEqual(response.status, 200)
+        self.assertEqual(response.headers['Content-Type'], 'text/event-stream')
+        started = time.monotonic()
+        first = await response.content.readuntil(b'\n\n')
+        self.assertEqual(first, b'data: 0\n\n')
+        self.assertLess(time.monotonic() - started, 0.2)
+        self.assertEqual(await response.read(), b'data: 1\n\ndata: 2\n\n')
+
+    async def test_slow_client_applies_backpressure(self):
+        """测试客户端不读取时上游写入被阻塞，隧道不缓冲整个响应"""
+        flood_written[0] = 0
+        response = await self.client.get('/api/tunnel', params={'url': self.base_url + '/flood'})
+        await asyncio.sleep(0.5)
+        # 上游共写64MB，阻塞时只有各级套接字和读取缓冲区中的数据
+        self.assertLess(flood_written[0], 16 * 1024 * 1024)
+        body = await response.read()
+        self.assertEqual(len(body), 64 * 1024 * 1024)
+
+if __name__ == '__main__':
+    unittest.main()
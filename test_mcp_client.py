@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+MCP Client 测试文件
+"""
+import asyncio
+import threading
+import time
+import unittest
+
+from werkzeug.serving import make_server
+
+from mcp_client import MCPClient, AsyncMCPClient, RetryPolicy
+from mcp_server import app
+from test_mcp_server import start_stub_upstream
+
+
+class ClientTestBase:
+    """启动本地MCP Server和上游桩服务"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.upstream, cls.base_url = start_stub_upstream()
+        cls.server = make_server('127.0.0.1', 0, app, threaded=True)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.server_url = f'http://127.0.0.1:{cls.server.port}'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.upstream.shutdown()
+        cls.upstream.server_close()
+
+
+class MCPClientTestCase(ClientTestBase, unittest.TestCase):
+    """同步客户端的测试用例"""
+
+    def setUp(self):
+        self.client = MCPClient()
+        self.client.update_config({'server_url': self.server_url})
+
+    def tearDown(self):
+        self.client.close()
+
+    def test_session_reuses_connection(self):
+        """测试多次调用复用同一个连接"""
+        for index in range(3):
+            result = self.client.forward_request(f'{self.base_url}/item/{index}')
+            self.assertEqual(result['path'], f'/item/{index}')
+
+        adapter = self.client.session.get_adapter(self.server_url)
+        pools = [adapter.poolmanager.pools[key] for key in adapter.poolmanager.pools.keys()]
+        self.assertEqual(sum(pool.num_connections for pool in pools), 1)
+
+    def test_client_error_is_not_retried(self):
+        """测试4xx响应不重试"""
+        self.client.update_config({'retry_delay': 10})
+        start = time.monotonic()
+        result = self.client._send_request('/api/forward')
+        self.assertEqual(result['status'], 'error')
+        self.assertLess(time.monotonic() - start, 5)
+
+
+class RetryPolicyTestCase(unittest.TestCase):
+    """重试策略的测试用例"""
+
+    def test_backoff_is_bounded(self):
+        """测试退避时间不超过指数上限和最大等待时间"""
+        policy = RetryPolicy({'retry_delay': 1, 'retry_max_delay': 5})
+        for attempt in range(10):
+            self.assertLessEqual(policy.backoff(attempt), min(5, 2 ** attempt))
+        self.assertEqual(policy.backoff(0, retry_after=3), 3)
+
+    def test_budget_limits_retries(self):
+        """测试重试预算耗尽后不再重试"""
+        policy = RetryPolicy({'retry_budget_max': 2, 'retry_budget_ratio': 0.5})
+        self.assertTrue(policy.allow_retry())
+        self.assertTrue(policy.allow_retry())
+        self.assertFalse(policy.allow_retry())
+        policy.record_request()
+        policy.record_request()
+        self.assertTrue(policy.allow_retry())
+
+
+class AsyncMCPClientTestCase(ClientTestBase, unittest.IsolatedAsyncioTestCase):
+    """异步客户端的测试用例"""
+
+    async def asyncSetUp(self):
+        self.client = AsyncMCPClient()
+        self.client.server_url = self.server_url
+
+    async def asyncTearDown(self):
+        await self.client.close()
+
+    async def test_concurrent_forwards(self):
+        """测试并发转发请求"""
+        results = await asyncio.gather(*[
+            self.client.forward_request(f'{self.base_url}/item/{index}', params={'n': index})
+            for index in range(20)
+        ])
+        self.assertEqual([result['path'] for result in results],
+                         [f'/item/{index}?n={index}' for index in range(20)])
+
+    async def test_server_status(self):
+        """测试获取服务器状态"""
+        status = await self.client.get_server_status()
+        self.assertEqual(status['status'], 'running')
+
+    async def test_forward_batch(self):
+        """测试异步批量转发"""
+        results = await self.client.forward_batch([{'url': self.base_url + '/a'}, {'url': self.base_url + '/b'}])
+        self.assertEqual([result['data']['path'] for result in results], ['/a', '/b'])
+
+    async def test_unreachable_server(self):
+        """测试服务器不可达时返回错误而不抛出异常"""
+        self.client.server_url = 'http://127.0.0.1:1'
+        self.client.config['retry_delay'] = 0
+        result = await self.client.get_server_status()
+        self.assertEqual(result['status'], 'error')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""
+MCP Server 内容编码协商测试文件
+"""
+import gzip
+import unittest
+
+from mcp_compression import accepts, compress, compressible, compressor, negotiate, parse_accept_encoding
+
+
+class CompressionTestCase(unittest.TestCase):
+    """编码协商与压缩的测试用例"""
+
+    def test_parse_accept_encoding(self):
+        """测试解析q值"""
+        self.assertEqual(parse_accept_encoding('gzip;q=0.5, br, identity;q=0'),
+                         {'gzip': 0.5, 'br': 1.0, 'identity': 0.0})
+
+    def test_negotiate(self):
+        """测试只选择客户端接受的可用编码"""
+        self.assertEqual(negotiate('gzip, deflate'), 'gzip')
+        self.assertEqual(negotiate('*'), negotiate('zstd, br, gzip'))
+        self.assertIsNone(negotiate('gzip;q=0'))
+        self.assertIsNone(negotiate(None))
+        self.assertTrue(accepts('GZIP', 'gzip'))
+        self.assertFalse(accepts('br', 'gzip'))
+
+    def test_compressible(self):
+        """测试按内容类型判断是否压缩"""
+        self.assertTrue(compressible('application/json; charset=utf-8'))
+        self.assertTrue(compressible('application/problem+json'))
+        self.assertTrue(compressible('text/html'))
+        self.assertFalse(compressible('text/event-stream'))
+        self.assertFalse(compressible('image/png'))
+
+    def test_streaming_matches_one_shot(self):
+        """测试流式压缩与一次性压缩解压结果一致"""
+        data = b'{"key": "value"}' * 1000
+        stream = compressor('gzip', 6)
+        streamed = b''.join([stream.compress(data[:5000]), stream.compress(data[5000:]), stream.flush()])
+        self.assertEqual(gzip.decompress(streamed), data)
+        self.assertEqual(gzip.decompress(compress(data, 'gzip', 6)), data)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""
+MCP Server 配置热加载测试文件
+"""
+import json
+import os
+import tempfile
+import time
+import unittest
+
+from mcp_config import ConfigStore
+from mcp_client import load_config as load_client_config
+import mcp_client
+
+
+class ConfigStoreTestCase(unittest.TestCase):
+    """配置快照和热加载的测试用例"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'config.json')
+        self.write({'timeout': 30, 'pool_maxsize': 10})
+        self.store = ConfigStore(self.loader, self.path)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, data):
+        with open(self.path, 'w') as f:
+            f.write(data if isinstance(data, str) else json.dumps(data))
+
+    def loader(self, strict=False):
+        config = {'timeout': 30, 'pool_maxsize': 10, 'config_watch_interval': 0.05}
+        try:
+            with open(self.path) as f:
+                config.update(json.load(f))
+        except ValueError:
+            if strict:
+                raise
+        return config
+
+    def test_update_swaps_snapshot(self):
+        """测试修改配置时替换快照，旧快照保持不变"""
+        before = self.store.snapshot()
+        self.store['timeout'] = 5
+        self.assertEqual(self.store['timeout'], 5)
+        self.assertEqual(before['timeout'], 30)
+        self.assertIsNot(self.store.snapshot(), before)
+
+    def test_listener_receives_changed_keys(self):
+        """测试监听函数只收到实际变化的键"""
+        calls = []
+        self.store.add_listener(lambda old, new, changed: calls.append(changed))
+        self.write({'timeout': 30, 'pool_maxsize': 20})
+        self.assertTrue(self.store.reload())
+        self.store.update({'timeout': 30})
+        self.assertEqual(calls, [{'pool_maxsize'}])
+        self.assertEqual(self.store['pool_maxsize'], 20)
+
+    def test_broken_file_keeps_current_config(self):
+        """测试配置文件无法解析时保留当前配置"""
+        self.store['timeout'] = 5
+        self.write('{not json')
+        self.assertFalse(self.store.reload())
+        self.assertEqual(self.store['timeout'], 5)
+        self.assertEqual(self.store.stats()['reload_errors'], 1)
+
+    def test_watcher_reloads_modified_file(self):
+        """测试监视线程在配置文件修改后重新加载"""
+        self.assertTrue(self.store.start_watcher())
+        self.assertFalse(self.store.start_watcher())
+        time.sleep(0.01)
+        self.write({'timeout': 7})
+        deadline = time.monotonic() + 5
+        while self.store['timeout'] != 7 and time.monotonic() < deadline:
+            time.sleep(0.02)
+        self.assertEqual(self.store['timeout'], 7)
+        self.store['config_watch_interval'] = 0
+
+
+class PoolResizeTestCase(unittest.TestCase):
+    """连接池在线调整大小的测试用例"""
+
+    def test_resize_keeps_in_flight_session_until_released(self):
+        """测试调整大小时进行中的会话在归还后才关闭"""
+        from mcp_server import UpstreamSessionPool
+
+        pool = UpstreamSessionPool(pool_maxsize=2)
+        url = 'http://127.0.0.1:1/path'
+        old_session = pool.acquire(url)
+        pool.resize(4)
+        new_session = pool.acquire(url)
+        self.assertIsNot(new_session, old_session)
+        self.assertEqual(len(pool._retired), 1)
+
+        pool.release(url, old_session)
+        pool.release(url, new_session)
+        self.assertEqual(pool._retired, {})
+        self.assertEqual(pool.pool_maxsize, 4)
+
+
+class ClientConfigCacheTestCase(unittest.TestCase):
+    """客户端共享配置解析结果的测试用例"""
+
+    def test_file_is_parsed_once(self):
+        """测试多个客户端实例共享同一份配置文件解析结果"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'client.json')
+            with open(path, 'w') as f:
+                json.dump({'timeout': 12}, f)
+
+            first = load_client_config(path)
+            cached = mcp_client._config_file_cache[os.path.abspath(path)]
+            second = load_client_config(path)
+            self.assertIs(mcp_client._config_file_cache[os.path.abspath(path)], cached)
+            self.assertEqual(first['timeout'], 12)
+            # 返回的配置是独立的副本
+            first['timeout'] = 1
+            self.assertEqual(second['timeout'], 12)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""
+MCP Server 磁盘响应缓存测试文件
+"""
+import multiprocessing
+import os
+import tempfile
+import time
+import unittest
+
+from mcp_disk_cache import DiskCache, available
+
+
+def _write_entries(path, prefix, count):
+    """在子进程中写入缓存记录"""
+    cache = DiskCache(path)
+    for index in range(count):
+        cache.put(f'{prefix}-{index}', {'index': index}, f'{prefix}:{index}'.encode(), time.time() + 60)
+
+
+@unittest.skipUnless(available(), 'requires fcntl')
+class DiskCacheTestCase(unittest.TestCase):
+    """磁盘缓存的测试用例"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'cache', 'responses.seg')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_entries_survive_reopen(self):
+        """测试记录在重新打开后仍可读取，同一键返回最新的记录"""
+        cache = DiskCache(self.path)
+        cache.put('a', {'status_code': 200}, b'first', time.time() + 60)
+        cache.put('a', {'status_code': 200}, b'second', time.time() + 60)
+        cache.put('b', {'status_code': 404}, b'', time.time() + 60)
+
+        reopened = DiskCache(self.path)
+        meta, body, expires = reopened.get('a')
+        self.assertEqual(meta['status_code'], 200)
+        self.assertIsInstance(body, memoryview)
+        self.assertEqual(bytes(body), b'second')
+        self.assertGreater(expires, time.time())
+        self.assertEqual(bytes(reopened.get('b')[1]), b'')
+        self.assertIsNone(reopened.get('missing'))
+
+    def test_sees_writes_from_other_instances(self):
+        """测试读取方能看到其他实例（进程）追加的记录"""
+        reader = DiskCache(self.path)
+        self.assertIsNone(reader.get('late'))
+        DiskCache(self.path).put('late', {}, b'value', time.time() + 60)
+        self.assertEqual(bytes(reader.get('late')[1]), b'value')
+
+    def test_compaction_bounds_segment_size(self):
+        """测试段文件超过上限时压缩，保留最新的记录并丢弃过期记录"""
+        cache = DiskCache(self.path, max_bytes=8192)
+        cache.put('expired', {}, b'x' * 100, time.time() - 1)
+        for index in range(100):
+            cache.put(f'key-{index}', {}, b'v' * 200, time.time() + 60)
+        stats = cache.stats()
+        self.assertGreater(stats['compactions'], 0)
+        self.assertLessEqual(os.path.getsize(self.path), 8192)
+        self.assertEqual(bytes(cache.get('key-99')[1]), b'v' * 200)
+        self.assertIsNone(cache.get('expired'))
+        self.assertIsNone(cache.get('key-0'))
+
+        # 其他实例在压缩后重新映射新文件
+        self.assertEqual(bytes(DiskCache(self.path).get('key-99')[1]), b'v' * 200)
+
+    def test_recovers_from_torn_write(self):
+        """测试写入中途中断留下的不完整记录被截断"""
+        cache = DiskCache(self.path)
+        cache.put('a', {}, b'value', time.time() + 60)
+        with open(self.path, 'ab') as f:
+            f.write(b'MCR1 partial record')
+        cache = DiskCache(self.path)
+        cache.put('b', {}, b'other', time.time() + 60)
+        self.assertEqual(cache.stats()['corrupt_tails'], 1)
+        reopened = DiskCache(self.path)
+        self.assertEqual(bytes(reopened.get('a')[1]), b'value')
+        self.assertEqual(bytes(reopened.get('b')[1]), b'other')
+
+    def test_concurrent_processes(self):
+        """测试多个进程同时追加时记录完整"""
+        context = multiprocessing.get_context('fork')
+        processes = [
+            context.Process(target=_write_entries, args=(self.path, f'p{worker}', 50)) for worker in range(4)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join(30)
+            self.assertEqual(process.exitcode, 0)
+
+        cache = DiskCache(self.path)
+        for worker in range(4):
+            for index in range(50):
+                self.assertEqual(bytes(cache.get(f'p{worker}-{index}')[1]), f'p{worker}:{index}'.encode())
+
+    def test_clear(self):
+        """测试清空后其他实例也看不到旧记录"""
+        other = DiskCache(self.path)
+        other.put('a', {}, b'value', time.time() + 60)
+        DiskCache(self.path).clear()
+        self.assertIsNone(other.get('a'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+MCP Server DNS缓存测试文件
+"""
+import socket
+import time
+import unittest
+
+from mcp_dns import DNSCache
+
+
+class FakeResolver:
+    """记录调用次数的解析器"""
+
+    def __init__(self, records):
+        self.records = records
+        self.calls = 0
+
+    def __call__(self, host, port, family=0, type=0):
+        self.calls += 1
+        if host not in self.records:
+            raise socket.gaierror(socket.EAI_NONAME, 'Name or service not known')
+        return [(family_, socket.SOCK_STREAM, 6, '', (address, 0)) for family_, address in self.records[host]]
+
+
+class DNSCacheTestCase(unittest.TestCase):
+    """DNS缓存的测试用例"""
+
+    def setUp(self):
+        self.resolver = FakeResolver({
+            'dual.example': [
+                (socket.AF_INET6, '2001:db8::1'), (socket.AF_INET6, '2001:db8::2'),
+                (socket.AF_INET, '192.0.2.1'), (socket.AF_INET, '192.0.2.1')
+            ],
+            'one.example': [(socket.AF_INET, '192.0.2.9')]
+        })
+
+    def test_cached_lookups(self):
+        """测试缓存命中时不再调用解析器"""
+        cache = DNSCache(ttl=60, resolver=self.resolver)
+        for _ in range(3):
+            self.assertEqual(cache.resolve('one.example'), ['192.0.2.9'])
+        self.assertEqual(self.resolver.calls, 1)
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (2, 1))
+
+    def test_interleave_and_rotate(self):
+        """测试按地址族交错排列并轮转起始地址"""
+        cache = DNSCache(ttl=60, resolver=self.resolver)
+        self.assertEqual(cache.resolve('dual.example'), ['2001:db8::1', '192.0.2.1', '2001:db8::2'])
+        self.assertEqual(cache.resolve('dual.example'), ['192.0.2.1', '2001:db8::2', '2001:db8::1'])
+
+    def test_negative_caching(self):
+        """测试解析失败的结果在negative_ttl内被缓存"""
+        cache = DNSCache(negative_ttl=60, resolver=self.resolver)
+        for _ in range(2):
+            with self.assertRaises(socket.gaierror):
+                cache.resolve('missing.example')
+        self.assertEqual(self.resolver.calls, 1)
+        self.assertEqual(cache.stats()['negative_hits'], 1)
+
+    def test_expired_entry_is_resolved_again(self):
+        """测试记录过期后重新解析"""
+        cache = DNSCache(ttl=0, negative_ttl=0, resolver=self.resolver)
+        cache.resolve('one.example')
+        cache.resolve('one.example')
+        self.assertEqual(self.resolver.calls, 2)
+
+    def test_prefetch_before_expiry(self):
+        """测试临近过期时在后台刷新且读取方立即得到旧记录"""
+        cache = DNSCache(ttl=60, prefetch_ratio=0, resolver=self.resolver)
+        cache.resolve('one.example')
+        self.assertEqual(cache.resolve('one.example'), ['192.0.2.9'])
+        deadline = time.monotonic() + 2
+        while self.resolver.calls < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self.resolver.calls, 2)
+        self.assertEqual(cache.stats()['prefetches'], 1)
+
+    def test_max_entries(self):
+        """测试超过容量时淘汰最久未使用的记录"""
+        cache = DNSCache(max_entries=1, resolver=self.resolver)
+        cache.resolve('one.example')
+        cache.resolve('dual.example')
+        self.assertEqual(cache.stats()['entries'], 1)
+        cache.resolve('one.example')
+        self.assertEqual(self.resolver.calls, 3)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+"""
+MCP Server HTTP/2传输测试文件
+
+使用hypercorn在本地以TLS启动HTTP/2桩服务，未安装httpx[http2]、hypercorn或cryptography时跳过。
+"""
+import asyncio
+import datetime
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+import mcp_http2
+from mcp_server import UpstreamSessionPool, app, config, upstream_pool
+
+try:
+    import httpx
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.x509.oid import NameOID
+    from hypercorn.asyncio import serve
+    from hypercorn.config import Config as HypercornConfig
+except ImportError:
+    serve = None
+
+requires_http2 = unittest.skipUnless(
+    serve is not None and mcp_http2.available(), 'requires httpx[http2], hypercorn and cryptography'
+)
+
+
+def write_certificate(directory):
+    """生成127.0.0.1的自签名证书，返回(证书路径, 私钥路径)"""
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, 'localhost')])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    certificate = (
+        x509.CertificateBuilder()
+        .subject_name(name).issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(days=1))
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .add_extension(x509.SubjectAlternativeName([x509.DNSName('localhost')]), critical=False)
+        .sign(key, hashes.SHA256())
+    )
+    cert_path = os.path.join(directory, 'cert.pem')
+    key_path = os.path.join(directory, 'key.pem')
+    with open(cert_path, 'wb') as f:
+        f.write(certificate.public_bytes(serialization.Encoding.PEM))
+    with open(key_path, 'wb') as f:
+        f.write(key.private_bytes(
+            serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+        ))
+    return cert_path, key_path
+
+
+def _stub_app(environ, start_response):
+    """返回请求使用的协议版本和收到的请求体字节数，/slow稍作等待以便请求并发"""
+    if environ['PATH_INFO'] == '/slow':
+        time.sleep(0.2)
+    length = len(environ['wsgi.input'].read())
+    body = json.dumps({
+        'protocol': environ['SERVER_PROTOCOL'], 'path': environ['PATH_INFO'], 'length': length
+    }).encode()
+    start_response('200 OK', [('Content-Type', 'application/json'), ('Content-Length', str(len(body)))])
+    return [body]
+
+
+def start_tls_server(application, cert_path, key_path, alpn_protocols):
+    """在后台线程中以TLS启动WSGI应用，返回(停止函数, base_url)"""
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+
+    options = HypercornConfig()
+    options.bind = [f'127.0.0.1:{port}']
+    options.certfile = cert_path
+    options.keyfile = key_path
+    options.alpn_protocols = alpn_protocols
+    options.loglevel = 'WARNING'
+    options.graceful_timeout = 0.1
+
+    loop = asyncio.new_event_loop()
+    stopped = asyncio.Event()
+
+    def run():
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(serve(application, options, shutdown_trigger=stopped.wait, mode='wsgi'))
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            break
+        except OSError:
+            time.sleep(0.05)
+
+    def stop():
+        loop.call_soon_threadsafe(stopped.set)
+        thread.join(10)
+
+    return stop, f'https://127.0.0.1:{port}'
+
+
+@requires_http2
+class HTTP2UpstreamTestCase(unittest.TestCase):
+    """HTTP/2上游传输的测试用例"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.cert_path, cls.key_path = write_certificate(cls.directory.name)
+        cls.stop_h2, cls.h2_url = start_tls_server(_stub_app, cls.cert_path, cls.key_path, ['h2', 'http/1.1'])
+        cls.stop_h1, cls.h1_url = start_tls_server(_stub_app, cls.cert_path, cls.key_path, ['http/1.1'])
+
+    @classmethod
+    def tearDownClass(cls):
+        # 关闭转发时建立的连接，否则服务端要等待连接关闭
+        upstream_pool.close()
+        cls.stop_h2()
+        cls.stop_h1()
+        cls.directory.cleanup()
+
+    def test_concurrent_requests_share_one_connection(self):
+        """测试并发请求在同一个HTTP/2连接上多路复用"""
+        pool = UpstreamSessionPool(pool_maxsize=10, http2_connections=1)
+        url = f'{self.h2_url}/slow'
+        try:
+            with ThreadPoolExecutor(max_workers=10) as executor:
+                responses = list(executor.map(lambda _: pool.request('GET', url, verify=False), range(10)))
+            self.assertTrue(all(response.json()['protocol'] == 'HTTP/2' for response in responses))
+            host = pool.stats()['hosts'][UpstreamSessionPool.host_key(url)]
+            self.assertEqual(host['connections_opened'], 1)
+            self.assertEqual(host['protocols'], {'HTTP/2': 10})
+        finally:
+            pool.close()
+
+    def test_downgrades_to_http11(self):
+        """测试上游不支持HTTP/2时退回HTTP/1.1"""
+        pool = UpstreamSessionPool(http2_connections=2)
+        try:
+            response = pool.request('GET', f'{self.h1_url}/plain', verify=False)
+            self.assertEqual(response.json()['protocol'], 'HTTP/1.1')
+            self.assertEqual(pool.stats()['hosts'][UpstreamSessionPool.host_key(self.h1_url)]['protocols'], {'HTTP/1.1': 1})
+        finally:
+            pool.close()
+
+    def test_http11_upstream_uses_full_pool(self):
+        """测试不支持HTTP/2的上游按pool_maxsize并发，不受HTTP/2连接数限制"""
+        pool = UpstreamSessionPool(pool_maxsize=10, http2_connections=2)
+        url = f'{self.h1_url}/slow'
+        try:
+            with ThreadPoolExecutor(max_workers=10) as executor:
+                responses = list(executor.map(lambda _: pool.request('GET', url, verify=False), range(10)))
+            self.assertTrue(all(response.json()['protocol'] == 'HTTP/1.1' for response in responses))
+            host = pool.stats()['hosts'][UpstreamSessionPool.host_key(url)]
+            self.assertEqual(host['protocols'], {'HTTP/1.1': 10})
+            self.assertEqual(host['requests'], 10)
+            # 并发的慢请求各占一个HTTP/1.1连接，而不是在2个连接上排队
+            self.assertGreater(host['connections_opened'], 2)
+        finally:
+            pool.close()
+
+    def test_per_request_verify(self):
+        """测试请求指定的证书校验方式对HTTP/2连接生效"""
+        pool = UpstreamSessionPool(http2_connections=1)
+        url = self.h2_url.replace('127.0.0.1', 'localhost') + '/verified'
+        try:
+            response = pool.request('GET', url, verify=self.cert_path)
+            self.assertEqual(response.json()['protocol'], 'HTTP/2')
+            with self.assertRaises(requests.ConnectionError):
+                pool.request('GET', url, verify=True)
+        finally:
+            pool.close()
+
+    def test_forward_over_http2(self):
+        """测试转发接口通过HTTP/2访问HTTPS上游"""
+        if not config['upstream_http2']:
+            self.skipTest('upstream_http2 disabled')
+        response = app.test_client().get('/api/forward', query_string={'url': f'{self.h2_url}/forward'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['protocol'], 'HTTP/2')
+
+    def test_large_upload_over_http2(self):
+        """测试超过流式上传阈值的请求体通过HTTP/2转发"""
+        if not config['upstream_http2']:
+            self.skipTest('upstream_http2 disabled')
+        size = config['stream_request_threshold'] + 1
+        response = app.test_client().post('/api/forward', query_string={'url': f'{self.h2_url}/upload'},
+                                          data=b'x' * size, content_type='application/octet-stream')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json(), {'protocol': 'HTTP/2', 'path': '/upload', 'length': size})
+
+
+@requires_http2
+class HTTP2ServerTestCase(unittest.TestCase):
+    """服务端HTTP/2的测试用例"""
+
+    def test_clients_negotiate_http2(self):
+        """测试HTTPS模式下客户端可通过HTTP/2访问，HTTP/1.1客户端仍可访问"""
+        with tempfile.TemporaryDirectory() as directory:
+            cert_path, key_path = write_certificate(directory)
+            stop, base_url = start_tls_server(app, cert_path, key_path, ['h2', 'http/1.1'])
+            try:
+                with httpx.Client(http2=True, verify=False) as client:
+                    response = client.get(f'{base_url}/')
+                    self.assertEqual(response.http_version, 'HTTP/2')
+                    self.assertEqual(response.status_code, 200)
+                with httpx.Client(verify=False) as client:
+                    self.assertEqual(client.get(f'{base_url}/').http_version, 'HTTP/1.1')
+            finally:
+                stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
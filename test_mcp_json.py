@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+MCP Server JSON编解码测试文件
+"""
+import json
+import unittest
+
+import mcp_json
+from benchmark_json_codec import run_codec_benchmark
+from mcp_server import app
+from test_mcp_server import LARGE_BODY, StubUpstreamTestCase
+
+
+class CodecTestCase(unittest.TestCase):
+    """编解码实现的测试用例"""
+
+    def tearDown(self):
+        mcp_json.set_backend('auto')
+
+    def test_backends_agree(self):
+        """测试各实现的解析和序列化结果一致"""
+        value = {'a': [1, 2.5, None, True], 'b': '中文', 'c': {'d': 'e'}}
+        for name in mcp_json.BACKENDS:
+            if name == 'orjson' and mcp_json.orjson is None:
+                continue
+            mcp_json.set_backend(name)
+            self.assertEqual(json.loads(mcp_json.dumps(value)), value)
+            self.assertEqual(mcp_json.loads(json.dumps(value).encode()), value)
+
+    def test_fallback_to_stdlib(self):
+        """测试原生实现不支持的输入回退到标准库"""
+        self.assertEqual(mcp_json.loads('[1e400, 123456789012345678901234567890]')[1],
+                         123456789012345678901234567890)
+        self.assertEqual(json.loads(mcp_json.dumps({'big': 2 ** 70, 1: 'x'})), {'big': 2 ** 70, '1': 'x'})
+        with self.assertRaises(ValueError):
+            mcp_json.loads(b'not json')
+
+    def test_jsonify_sorts_keys(self):
+        """测试jsonify在各实现下都按Flask的sort_keys设置输出"""
+        for name in mcp_json.BACKENDS:
+            if name == 'orjson' and mcp_json.orjson is None:
+                continue
+            mcp_json.set_backend(name)
+            with app.app_context():
+                body = app.json.response({'b': 1, 'a': {'d': 2, 'c': 3}}).get_data(as_text=True)
+            self.assertEqual(body.replace(' ', '').strip(), '{"a":{"c":3,"d":2},"b":1}')
+
+    def test_unknown_backend(self):
+        """测试未知实现名称"""
+        with self.assertRaises(ValueError):
+            mcp_json.set_backend('simplejson')
+
+    def test_is_json(self):
+        """测试JSON内容类型判断"""
+        self.assertTrue(mcp_json.is_json('application/json; charset=utf-8'))
+        self.assertTrue(mcp_json.is_json('application/problem+json'))
+        self.assertFalse(mcp_json.is_json('text/plain'))
+
+    def test_benchmark_runs(self):
+        """测试微基准可以运行"""
+        results = run_codec_benchmark([256], 2)
+        self.assertEqual(set(results[0]['cpu_us_per_request']), {'stdlib', 'codec', 'passthrough'})
+
+
+class PassthroughTestCase(StubUpstreamTestCase):
+    """上游JSON原样透传的测试用例"""
+
+    def test_json_bytes_forwarded_unchanged(self):
+        """测试上游JSON字节不经解析直接返回"""
+        response = self.client.get('/api/forward', query_string={'url': self.base_url + '/large'})
+        self.assertEqual(response.data, LARGE_BODY)
+
+    def test_batch_results_are_parsed(self):
+        """测试批量转发结果仍包含解析后的数据"""
+        response = self.client.post('/api/forward/batch', json=[{'url': self.base_url + '/large'}])
+        self.assertEqual(json.loads(response.data)[0]['data'], json.loads(LARGE_BODY))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+MCP Server 启动器测试文件
+"""
+import multiprocessing
+import os
+import tempfile
+import unittest
+
+from mcp_server import config
+import mcp_launcher
+from mcp_launcher import build_options, http2_enabled
+
+
+class LauncherTestCase(unittest.TestCase):
+    """生产启动器参数生成的测试用例"""
+
+    def setUp(self):
+        self.saved_config = dict(config)
+
+    def tearDown(self):
+        config.replace(self.saved_config)
+
+    def test_workers_default_to_cpu_count(self):
+        """测试workers为0时按CPU核数启动工作进程"""
+        config['workers'] = 0
+        config['threads'] = 8
+        options = build_options()
+        self.assertEqual(options['workers'], multiprocessing.cpu_count())
+        self.assertEqual(options['worker_class'], 'gthread')
+        self.assertEqual(options['threads'], 8)
+        self.assertEqual(options['bind'], f"0.0.0.0:{config['server_port']}")
+
+    def test_ssl_files_enable_https(self):
+        """测试证书和私钥存在时启用HTTPS"""
+        with tempfile.TemporaryDirectory() as directory:
+            config['ssl_cert_path'] = os.path.join(directory, 'cert.pem')
+            config['ssl_key_path'] = os.path.join(directory, 'key.pem')
+            self.assertNotIn('certfile', build_options())
+
+            for path in (config['ssl_cert_path'], config['ssl_key_path']):
+                open(path, 'w').close()
+            options = build_options()
+            self.assertEqual(options['certfile'], config['ssl_cert_path'])
+            self.assertEqual(options['keyfile'], config['ssl_key_path'])
+
+    def test_async_mode_uses_aiohttp_worker(self):
+        """测试异步模式使用aiohttp工作进程"""
+        config['server_mode'] = 'async'
+        self.assertEqual(build_options()['worker_class'], 'aiohttp.GunicornWebWorker')
+    @unittest.skipIf(mcp_launcher.HypercornConfig is None, 'requires hypercorn')
+    def test_https_serves_http2(self):
+        """测试HTTPS同步模式通过hypercorn提供HTTP/2，异步模式仍使用gunicorn"""
+        with tempfile.TemporaryDirectory() as directory:
+            config['ssl_cert_path'] = os.path.join(directory, 'cert.pem')
+            config['ssl_key_path'] = os.path.join(directory, 'key.pem')
+            self.assertFalse(http2_enabled())
+
+            for path in (config['ssl_cert_path'], config['ssl_key_path']):
+                open(path, 'w').close()
+            self.assertTrue(http2_enabled())
+            options = mcp_launcher.build_hypercorn_config()
+            self.assertEqual(options.alpn_protocols, ['h2', 'http/1.1'])
+            self.assertEqual(options.certfile, config['ssl_cert_path'])
+
+            config['server_mode'] = 'async'
+            self.assertFalse(http2_enabled())
+
+if __name__ == '__main__':
+    unittest.main()
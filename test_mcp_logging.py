@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""
+MCP Server 日志管道测试文件
+"""
+import json
+import logging
+import unittest
+
+from mcp_logging import AsyncQueueHandler, JSONFormatter, SamplingFilter, truncated
+
+
+class _ListHandler(logging.Handler):
+    """把格式化后的记录保存到列表"""
+
+    def __init__(self):
+        super().__init__()
+        self.lines = []
+
+    def emit(self, record):
+        self.lines.append(self.format(record))
+
+
+def _record(message, *args, level=logging.INFO, **extra):
+    record = logging.LogRecord('test', level, __file__, 1, message, args, None)
+    record.__dict__.update(extra)
+    return record
+
+
+class LoggingTestCase(unittest.TestCase):
+    """日志管道的测试用例"""
+
+    def test_json_record_contains_extra_fields(self):
+        """测试JSON格式包含extra字段"""
+        entry = json.loads(JSONFormatter().format(_record('转发请求: %s', 'GET', url='http://a', status_code=200)))
+        self.assertEqual(entry['message'], '转发请求: GET')
+        self.assertEqual(entry['url'], 'http://a')
+        self.assertEqual(entry['status_code'], 200)
+        self.assertEqual(entry['level'], 'INFO')
+
+    def test_truncated_body(self):
+        """测试请求体按上限截断"""
+        self.assertEqual(str(truncated(b'x' * 10, 4)), 'xxxx...(10 bytes)')
+        self.assertEqual(str(truncated('short', 10)), 'short')
+
+    def test_sampling_by_route(self):
+        """测试按路由前缀采样，警告总是输出"""
+        sampler = SamplingFilter({'log_sample_rates': {'/api': 1.0, '/api/forward': 0}})
+        self.assertFalse(sampler.filter(_record('x', route='/api/forward/batch')))
+        self.assertTrue(sampler.filter(_record('x', route='/api/stats')))
+        self.assertTrue(sampler.filter(_record('x', level=logging.WARNING, route='/api/forward')))
+        self.assertTrue(sampler.filter(_record('x')))
+
+    def test_async_handler_delivers_records(self):
+        """测试队列处理器在后台线程写出记录，关闭时写完队列中的记录"""
+        target = _ListHandler()
+        handler = AsyncQueueHandler(target)
+        for index in range(100):
+            handler.handle(_record('line %d', index))
+        handler.close()
+        self.assertEqual(target.lines, [f'line {index}' for index in range(100)])
+        self.assertEqual(handler.stats()['dropped'], 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""
+MCP Server 客户端限流测试文件
+"""
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+import unittest
+
+from aiohttp.test_utils import TestClient, TestServer
+
+import mcp_server
+from mcp_async_server import create_app
+from mcp_ratelimit import RateLimiter, available
+from mcp_server import app, config
+
+
+def _consume(path, results):
+    """在子进程中打开同一个状态文件并尽量消耗令牌"""
+    limiter = RateLimiter(path)
+    results.put(sum(limiter.acquire('shared', 0.001, 100)[0] for _ in range(60)))
+
+
+class RateLimiterTestCase(unittest.TestCase):
+    """令牌桶限流器的测试用例"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'state', 'rate_limit.bin')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_burst_then_refill(self):
+        """测试突发额度用完后拒绝，按速率补充后再次放行"""
+        limiter = RateLimiter(self.path)
+        self.assertEqual([limiter.acquire('a', 20, 2)[0] for _ in range(3)], [True, True, False])
+        allowed, retry_after = limiter.acquire('a', 20, 2)
+        self.assertFalse(allowed)
+        self.assertLessEqual(retry_after, 0.05)
+        time.sleep(retry_after + 0.01)
+        self.assertTrue(limiter.acquire('a', 20, 2)[0])
+        # 其他客户端有独立的桶
+        self.assertTrue(limiter.acquire('b', 20, 2)[0])
+        self.assertEqual(limiter.stats()['rejected'], 2)
+
+    def test_state_is_shared_by_instances(self):
+        """测试打开同一文件的限流器共享配额，重新打开后状态仍在"""
+        first = RateLimiter(self.path)
+        second = RateLimiter(self.path)
+        self.assertTrue(first.acquire('a', 0.001, 1)[0])
+        self.assertFalse(second.acquire('a', 0.001, 1)[0])
+        self.assertFalse(RateLimiter(self.path).acquire('a', 0.001, 1)[0])
+        first.clear()
+        self.assertTrue(second.acquire('a', 0.001, 1)[0])
+
+    @unittest.skipUnless(available(), 'requires fcntl')
+    def test_quota_is_enforced_across_processes(self):
+        """测试多个进程同时消耗同一客户端的令牌时总放行数不超过突发额度"""
+        RateLimiter(self.path)
+        context = multiprocessing.get_context('fork')
+        results = context.Queue()
+        processes = [context.Process(target=_consume, args=(self.path, results)) for _ in range(4)]
+        for process in processes:
+            process.start()
+        total = sum(results.get(timeout=30) for _ in processes)
+        for process in processes:
+            process.join(30)
+        self.assertEqual(total, 100)
+
+    def test_full_group_evicts_oldest_bucket(self):
+        """测试组内槽用完时替换最久未更新的客户端"""
+        limiter = RateLimiter(None, slots=8)
+        for index in range(9):
+            limiter.acquire(f'client-{index}', 1, 1)
+        self.assertEqual(limiter.stats()['evictions'], 1)
+        # 被替换的client-0重新获得完整的桶，其余客户端的桶仍为空
+        self.assertTrue(limiter.acquire('client-0', 0.001, 1)[0])
+        self.assertFalse(limiter.acquire('client-8', 0.001, 1)[0])
+
+    def test_check_is_fast(self):
+        """测试单次检查只需微秒级时间"""
+        limiter = RateLimiter(self.path)
+        started = time.perf_counter()
+        for index in range(10000):
+            limiter.acquire(f'client-{index % 100}', 1000, 1000)
+        self.assertLess((time.perf_counter() - started) / 10000, 0.0001)
+
+
+class RateLimitedForwardTestCase(unittest.TestCase):
+    """转发接口限流的测试用例"""
+
+    def setUp(self):
+        self.saved_config = dict(config)
+        self.directory = tempfile.TemporaryDirectory()
+        app.config['TESTING'] = True
+        self.client = app.test_client()
+        mcp_server.rate_limiter = None
+        config.update({
+            'rate_limit_enabled': True,
+            'rate_limit_rate': 0.001,
+            'rate_limit_burst': 2,
+            'rate_limit_path': os.path.join(self.directory.name, 'rate_limit.bin'),
+            'rate_limit_clients': {'vip': {'burst': 5}}
+        })
+
+    def tearDown(self):
+        config.replace(self.saved_config)
+        mcp_server.rate_limiter = None
+        self.directory.cleanup()
+
+    def forward(self, key=None):
+        headers = {'X-API-Key': key} if key else {}
+        return self.client.get('/api/forward', headers=headers)
+
+    def test_client_quota(self):
+        """测试超出配额返回429和Retry-After，配置过的API密钥使用单独的配额"""
+        # 未带目标URL的请求同样消耗配额，不访问上游
+        self.assertEqual([self.forward().status_code for _ in range(3)], [400, 400, 429])
+        response = self.forward()
+        self.assertEqual(json.loads(response.data)['error'], 'Rate limit exceeded')
+        self.assertGreaterEqual(int(response.headers['Retry-After']), 1)
+        self.assertEqual([self.forward('vip').status_code for _ in range(6)].count(429), 1)
+
+        stats = json.loads(self.client.get('/api/stats').data)['rate_limit']
+        self.assertEqual(stats['rejected'], 3)
+        self.assertIn('mcp_rate_limit_total{result="rejected"} 3', self.client.get('/metrics').data.decode())
+
+    def test_unknown_keys_share_the_address_quota(self):
+        """测试未配置的API密钥按来源IP限流，轮换密钥不能绕过配额"""
+        statuses = [self.forward(f'k{index}').status_code for index in range(5)]
+        self.assertEqual(statuses, [400, 400, 429, 429, 429])
+        self.assertEqual(self.forward().status_code, 429)
+
+    def test_batch_costs_one_token_per_item(self):
+        """测试批量请求按请求项数消耗令牌"""
+        response = self.client.post('/api/forward/batch', json=[{}, {}], headers={'X-API-Key': 'batch'})
+        self.assertEqual(response.status_code, 200)
+        response = self.client.post('/api/forward/batch', json=[{}], headers={'X-API-Key': 'batch'})
+        self.assertEqual(response.status_code, 429)
+
+    def test_batch_larger_than_burst_is_rejected(self):
+        """测试请求项数超过桶容量的批量请求返回413且不消耗令牌，而不是给出永远无法满足的Retry-After"""
+        response = self.client.post('/api/forward/batch', json=[{}, {}, {}], headers={'X-API-Key': 'large'})
+        self.assertEqual(response.status_code, 413)
+        self.assertNotIn('Retry-After', response.headers)
+        self.assertIn('burst (2)', json.loads(response.data)['error'])
+        response = self.client.post('/api/forward/batch', json=[{}, {}], headers={'X-API-Key': 'large'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_mcp_batch_costs_one_token_per_request(self):
+        """测试MCP批量消息按其中的请求数消耗令牌，通知不计"""
+        batch = [{'jsonrpc': '2.0', 'id': index, 'method': 'ping'} for index in range(3)]
+        response = self.client.post('/mcp', data=json.dumps(batch), content_type='application/json')
+        self.assertEqual(response.status_code, 413)
+        notification = {'jsonrpc': '2.0', 'method': 'notifications/initialized'}
+        response = self.client.post('/mcp', data=json.dumps([batch[0], notification]), content_type='application/json')
+        self.assertNotEqual(response.status_code, 429)
+        response = self.client.post('/mcp', data=json.dumps(batch[0]), content_type='application/json')
+        self.assertNotEqual(response.status_code, 429)
+        response = self.client.post('/mcp', data=json.dumps(batch[0]), content_type='application/json')
+        self.assertEqual(response.status_code, 429)
+
+    def test_disabled(self):
+        """测试关闭限流后不再检查"""
+        config.update({'rate_limit_enabled': False})
+        self.assertTrue(all(self.forward('k1').status_code == 400 for _ in range(5)))
+
+
+class AsyncRateLimitTestCase(unittest.IsolatedAsyncioTestCase):
+    """异步服务模式限流的测试用例"""
+
+    async def asyncSetUp(self):
+        self.saved_config = dict(config)
+        self.directory = tempfile.TemporaryDirectory()
+        mcp_server.rate_limiter = None
+        config.update({
+            'rate_limit_enabled': True,
+            'rate_limit_rate': 0.001,
+            'rate_limit_burst': 2,
+            'rate_limit_path': os.path.join(self.directory.name, 'rate_limit.bin')
+        })
+        self.client = TestClient(TestServer(create_app()))
+        await self.client.start_server()
+
+    async def asyncTearDown(self):
+        await self.client.close()
+        config.replace(self.saved_config)
+        mcp_server.rate_limiter = None
+        self.directory.cleanup()
+
+    async def test_forward_and_tunnel_share_the_quota(self):
+        """测试异步转发和隧道接口同样限流"""
+        statuses = [(await self.client.get('/api/forward')).status for _ in range(2)]
+        self.assertEqual(statuses, [400, 400])
+        response = await self.client.get('/api/tunnel')
+        self.assertEqual(response.status, 429)
+        self.assertGreaterEqual(int(response.headers['Retry-After']), 1)
+        self.assertEqual((await self.client.get('/api/forward')).status, 429)
+
+
+if __name__ == '__main__':
+    unittest.main()
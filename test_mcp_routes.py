@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""
+MCP Server 转发路由表测试文件
+"""
+import json
+import unittest
+
+from mcp_routes import RoutingTable
+from mcp_server import config, routing_table
+from test_mcp_server import StubUpstreamTestCase, _StubUpstreamHandler
+
+
+class _HeaderEchoHandler(_StubUpstreamHandler):
+    """返回收到的请求头，/cached路径的响应可缓存"""
+
+    def do_GET(self):
+        type(self).requests_seen += 1
+        headers = {key.lower(): value for key, value in self.headers.items()}
+        extra = {'Cache-Control': 'max-age=60'} if self.path.startswith('/cached') else None
+        self._reply(json.dumps({'path': self.path, 'headers': headers}).encode(), headers=extra)
+
+
+class RoutingTableTestCase(unittest.TestCase):
+    """路由前缀树的测试用例"""
+
+    def setUp(self):
+        self.table = RoutingTable(always_deny={'host', 'connection'})
+        self.table.compile({
+            'api': {'upstream': 'http://backend:8080/'},
+            'api/v2': {'upstream': 'http://backend-v2', 'timeout': 5},
+            'https://internal.example.com/': {'verify': '/etc/ca.pem', 'headers_deny': ['Cookie']},
+            'broken': {'timeout': 3},
+            'headers': {'upstream': 'http://h', 'headers_allow': ['Accept', 'Authorization', 'Host']}
+        })
+
+    def test_longest_prefix_match(self):
+        """测试按路径段匹配最长前缀并改写目标"""
+        route, target = self.table.match('api/items?page=1')
+        self.assertEqual(route.name, 'api')
+        self.assertEqual(target, 'http://backend:8080/items?page=1')
+        route, target = self.table.match('api/v2/items')
+        self.assertEqual((route.name, target), ('api/v2', 'http://backend-v2/items'))
+        self.assertEqual(self.table.match('api')[1], 'http://backend:8080')
+        self.assertEqual(self.table.match('api?x=1')[1], 'http://backend:8080?x=1')
+        # 只在路径段边界匹配
+        self.assertIsNone(self.table.match('apix/items')[0])
+        self.assertIsNone(self.table.match('http://other/api')[0])
+
+    def test_url_prefix_policy(self):
+        """测试URL前缀路由不改写目标，只套用策略"""
+        url = 'https://internal.example.com/v1/users'
+        route, target = self.table.match(url)
+        self.assertEqual(target, url)
+        self.assertEqual(route.verify, '/etc/ca.pem')
+        self.assertEqual(route.filter_headers({'Cookie': 'a', 'Connection': 'close', 'Accept': '*/*'}),
+                         {'Accept': '*/*'})
+        self.assertIsNone(self.table.match('https://internal.example.com.evil/v1')[0])
+        self.assertIsNone(self.table.match('https://internal.example.com:8443/v1')[0])
+
+    def test_url_prefix_is_normalised(self):
+        """测试scheme和主机名不区分大小写，默认端口可省略"""
+        for url in ('HTTPS://internal.example.com/a', 'https://Internal.Example.com/a',
+                    'https://internal.example.com:443/a'):
+            route, target = self.table.match(url)
+            self.assertEqual(route.name, 'https://internal.example.com/', url)
+            self.assertEqual(target, url)
+        self.assertIsNone(self.table.match('http://internal.example.com:443/a')[0])
+
+        table = RoutingTable()
+        table.compile({'HTTP://Backend.Example.com:80/api': {'upstream': 'http://new-backend'}})
+        self.assertEqual(table.match('http://backend.example.com/api/items?x=1')[1], 'http://new-backend/items?x=1')
+        # 查询参数中的URL不影响短路由名匹配
+        self.assertEqual(self.table.match('api/items?next=HTTP://X:80/')[1],
+                         'http://backend:8080/items?next=HTTP://X:80/')
+
+    def test_header_allow_list_and_timeout_cap(self):
+        """测试允许列表只保留列出的请求头（始终拒绝的除外），超时取较小值"""
+        route = self.table.match('headers/x')[0]
+        self.assertEqual(route.filter_headers({'accept': 'a', 'Authorization': 'b', 'Host': 'h', 'Cookie': 'c'}),
+                         {'accept': 'a', 'Authorization': 'b'})
+        route = self.table.match('api/v2')[0]
+        self.assertEqual(route.cap_timeout(None), 5)
+        self.assertEqual(route.cap_timeout(2), 2)
+        self.assertEqual(route.cap_timeout(30), 5)
+
+    def test_invalid_routes_are_skipped(self):
+        """测试缺少upstream的短路由名被跳过，统计记录命中次数"""
+        self.assertIsNone(self.table.match('broken/x')[0])
+        self.table.match('api/a')
+        self.assertNotIn('broken', self.table.stats())
+        self.assertEqual(self.table.stats()['api']['hits'], 1)
+        self.assertIn('mcp_route_requests_total{route="api"} 1', self.table.prometheus())
+
+
+class RoutedForwardTestCase(StubUpstreamTestCase):
+    """按路由转发的测试用例"""
+
+    handler = _HeaderEchoHandler
+
+    def setUp(self):
+        super().setUp()
+        config.update({'routes': {
+            'stub': {'upstream': self.base_url, 'headers_deny': ['Authorization'], 'cache': False},
+            'stub/cached': {'upstream': self.base_url + '/cached'}
+        }})
+
+    def test_forward_by_route_name(self):
+        """测试按路由名转发并过滤请求头，配置重载后路由表随之更新"""
+        response = self.client.get('/api/forward', query_string={'url': 'stub/items', 'page': '2'},
+                                   headers={'Authorization': 'secret', 'Accept': 'application/json'})
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        self.assertEqual(data['path'], '/items?page=2')
+        self.assertNotIn('authorization', data['headers'])
+        self.assertEqual(data['headers']['accept'], 'application/json')
+
+        config.update({'routes': {}})
+        self.assertIsNone(routing_table.match('stub/items')[0])
+
+    def test_route_cache_policy(self):
+        """测试关闭缓存的路由不使用响应缓存"""
+        before = _HeaderEchoHandler.requests_seen
+        for _ in range(2):
+            self.client.get('/api/forward', query_string={'url': 'stub/cached/nocache'},
+                            headers={'X-MCP-No-Coalesce': '1'})
+        self.assertEqual(_HeaderEchoHandler.requests_seen - before, 1)
+
+        config.update({'routes': {'stub': {'upstream': self.base_url, 'cache': False}}})
+        before = _HeaderEchoHandler.requests_seen
+        for _ in range(2):
+            self.client.get('/api/forward', query_string={'url': 'stub/cached/route'},
+                            headers={'X-MCP-No-Coalesce': '1'})
+        self.assertEqual(_HeaderEchoHandler.requests_seen - before, 2)
+
+    def test_stream_and_batch_use_routes(self):
+        """测试流式转发和批量转发同样按路由改写目标"""
+        response = self.client.get('/api/forward', query_string={'url': 'stub/streamed'},
+                                   headers={'X-MCP-Stream': '1'})
+        self.assertEqual(json.loads(response.data)['path'], '/streamed')
+        response = self.client.post('/api/forward/batch', json=[{'url': 'stub/batched'}])
+        self.assertEqual(json.loads(response.data)[0]['data']['path'], '/batched')
+
+
+if __name__ == '__main__':
+    unittest.main()
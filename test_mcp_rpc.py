@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""
+MCP Server JSON-RPC传输测试文件
+"""
+import io
+import json
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from mcp_rpc import RPCServer, Tool, run_stdio, text_result, METHOD_NOT_FOUND, INVALID_PARAMS
+from mcp_server import app, rpc_server
+from test_mcp_server import start_stub_upstream
+
+
+def _sleep_tool(arguments):
+    time.sleep(arguments.get('seconds', 0))
+    return text_result({'slept': arguments.get('seconds', 0)})
+
+
+def _make_server(max_workers=4):
+    return RPCServer([Tool('sleep', 'Sleep', {'type': 'object'}, _sleep_tool)],
+                     ThreadPoolExecutor(max_workers=max_workers), {'name': 'test', 'version': '0'})
+
+
+def _call(request_id, seconds):
+    return {'jsonrpc': '2.0', 'id': request_id, 'method': 'tools/call',
+            'params': {'name': 'sleep', 'arguments': {'seconds': seconds}}}
+
+
+class RPCSessionTestCase(unittest.TestCase):
+    """会话消息处理的测试用例"""
+
+    def setUp(self):
+        self.server = _make_server()
+        self.responses = []
+        self.done = threading.Event()
+
+    def tearDown(self):
+        self.server.executor.shutdown(wait=True)
+
+    def send(self, message):
+        self.responses.append(message)
+
+    def test_pipelined_calls_complete_out_of_order(self):
+        """测试同一会话中的多个调用同时执行，先完成的先响应"""
+        session = self.server.session()
+        started = time.monotonic()
+        session.receive(_call(1, 0.5), self.send)
+        session.receive(_call(2, 0), self.send)
+        session.receive({'jsonrpc': '2.0', 'id': 3, 'method': 'ping'}, self.send)
+        deadline = time.monotonic() + 3
+        while len(self.responses) < 3 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual([message['id'] for message in self.responses], [3, 2, 1])
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(json.loads(self.responses[2]['result']['content'][0]['text']), {'slept': 0.5})
+        self.assertEqual(self.server.stats()['calls'], 2)
+
+    def test_initialize_and_list_tools(self):
+        """测试initialize协商协议版本，tools/list返回工具描述"""
+        session = self.server.session()
+        session.receive([
+            {'jsonrpc': '2.0', 'id': 'a', 'method': 'initialize', 'params': {'protocolVersion': '2024-11-05'}},
+            {'jsonrpc': '2.0', 'method': 'notifications/initialized'},
+            {'jsonrpc': '2.0', 'id': 'b', 'method': 'tools/list'}
+        ], self.send)
+        self.assertEqual(self.responses[0]['result']['protocolVersion'], '2024-11-05')
+        self.assertEqual([tool['name'] for tool in self.responses[1]['result']['tools']], ['sleep'])
+
+    def test_errors(self):
+        """测试未知方法、未知工具和无效消息返回JSON-RPC错误"""
+        session = self.server.session()
+        session.receive({'jsonrpc': '2.0', 'id': 1, 'method': 'nope'}, self.send)
+        session.receive({'jsonrpc': '2.0', 'id': 2, 'method': 'tools/call', 'params': {'name': 'nope'}}, self.send)
+        session.receive({'id': 3}, self.send)
+        self.assertEqual(self.responses[0]['error']['code'], METHOD_NOT_FOUND)
+        self.assertEqual(self.responses[1]['error']['code'], INVALID_PARAMS)
+        self.assertEqual(self.responses[2]['id'], 3)
+        self.assertIn('error', self.responses[2])
+
+    def test_cancel_queued_call(self):
+        """测试取消尚未开始执行的调用后不再发送响应"""
+        server = _make_server(max_workers=1)
+        session = server.session()
+        session.receive(_call(1, 0.3), self.send)
+        session.receive(_call(2, 0), self.send)
+        session.receive({'jsonrpc': '2.0', 'method': 'notifications/cancelled', 'params': {'requestId': 2}}, self.send)
+        server.executor.shutdown(wait=True)
+        self.assertEqual(self.responses, [None, self.responses[1]])
+        self.assertEqual(self.responses[1]['id'], 1)
+        self.assertEqual(server.stats()['cancelled'], 1)
+
+
+class StdioTransportTestCase(unittest.TestCase):
+    """stdio传输的测试用例"""
+
+    def test_responses_written_as_they_complete(self):
+        """测试逐行读取请求，响应按完成顺序逐行写出"""
+        lines = [json.dumps(_call(1, 0.3)), json.dumps(_call(2, 0)), 'not json']
+        stdin = io.BytesIO(('\n'.join(lines) + '\n').encode())
+        stdout = io.BytesIO()
+        run_stdio(_make_server(), stdin, stdout)
+        responses = [json.loads(line) for line in stdout.getvalue().splitlines()]
+        self.assertEqual(responses[0]['error']['code'], -32700)
+        self.assertEqual([message['id'] for message in responses[1:]], [2, 1])
+
+
+class HTTPTransportTestCase(unittest.TestCase):
+    """Streamable HTTP传输的测试用例"""
+
+    def setUp(self):
+        app.config['TESTING'] = True
+        self.client = app.test_client()
+
+    def post(self, payload, session_id=None, accept='application/json, text/event-stream'):
+        headers = {'Accept': accept}
+        if session_id:
+            headers['Mcp-Session-Id'] = session_id
+        return self.client.post('/mcp', data=json.dumps(payload), content_type='application/json', headers=headers)
+
+    def test_session_and_tools(self):
+        """测试initialize分配会话，批量调用以SSE返回，DELETE结束会话"""
+        response = self.post({'jsonrpc': '2.0', 'id': 0, 'method': 'initialize', 'params': {}},
+                             accept='application/json')
+        self.assertEqual(response.status_code, 200)
+        session_id = response.headers['Mcp-Session-Id']
+        self.assertEqual(json.loads(response.data)['result']['serverInfo']['name'], 'MCP Server')
+
+        response = self.post({'jsonrpc': '2.0', 'method': 'notifications/initialized'}, session_id)
+        self.assertEqual(response.status_code, 202)
+
+        server, url = start_stub_upstream()
+        try:
+            response = self.post([
+                {'jsonrpc': '2.0', 'id': 1, 'method': 'tools/list'},
+                {'jsonrpc': '2.0', 'id': 2, 'method': 'tools/call',
+                 'params': {'name': 'forward', 'arguments': {'url': url + '/data'}}}
+            ], session_id)
+            self.assertEqual(response.mimetype, 'text/event-stream')
+            events = [json.loads(block.split(b'data: ', 1)[1]) for block in response.data.split(b'\n\n') if block]
+        finally:
+            server.shutdown()
+            server.server_close()
+        by_id = {message['id']: message for message in events}
+        self.assertEqual({tool['name'] for tool in by_id[1]['result']['tools']}, {'ip-info', 'forward'})
+        result = by_id[2]['result']
+        self.assertFalse(result['isError'])
+        self.assertEqual(json.loads(result['content'][0]['text'])['status_code'], 200)
+
+        self.assertEqual(self.client.delete('/mcp', headers={'Mcp-Session-Id': session_id}).status_code, 204)
+        self.assertEqual(self.client.delete('/mcp', headers={'Mcp-Session-Id': session_id}).status_code, 404)
+
+    def test_parse_error(self):
+        """测试无法解析的请求体返回400和JSON-RPC解析错误"""
+        response = self.client.post('/mcp', data=b'{', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(json.loads(response.data)['error']['code'], -32700)
+
+    def test_forward_tool_error(self):
+        """测试forward工具缺少URL时返回isError结果"""
+        response = self.post({'jsonrpc': '2.0', 'id': 1, 'method': 'tools/call',
+                              'params': {'name': 'forward', 'arguments': {}}}, accept='application/json')
+        self.assertTrue(json.loads(response.data)['result']['isError'])
+        self.assertGreater(rpc_server.stats()['calls'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
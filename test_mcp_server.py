@@ -3,8 +3,110 @@
 MCP Server 测试文件
 """
 import unittest
+import gzip
 import json
-from mcp_server import app
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import mcp_json
+from mcp_server import (app, config, upstream_pool, response_cache, admission, IPInfoCache,
+                        CircuitBreaker, CircuitOpen, MCPForwardResource, upstream_timeout)
+from mcp_disk_cache import DiskCache, available as disk_cache_available
+
+
+# 超过压缩阈值的JSON响应体
+LARGE_BODY = json.dumps({'items': [{'id': index, 'name': f'item-{index}'} for index in range(200)]}).encode()
+
+
+class _StubUpstreamHandler(BaseHTTPRequestHandler):
+    """本地上游桩服务，返回请求路径和查询参数"""
+    protocol_version = 'HTTP/1.1'
+
+    requests_seen = 0
+
+    def do_GET(self):
+        type(self).requests_seen += 1
+        if self.path.startswith('/text'):
+            self._reply(b'plain text body', 'text/plain')
+        elif self.path.startswith('/sleep'):
+            time.sleep(1)
+            self._reply(json.dumps({'path': self.path}).encode())
+        elif self.path.startswith('/cached-text'):
+            self._reply(b'plain text body', 'text/plain', headers={'Cache-Control': 'max-age=60'})
+        elif self.path.startswith('/cached'):
+            self._reply(json.dumps({'path': self.path}).encode(), headers={'Cache-Control': 'max-age=60'})
+        elif self.path.startswith('/whoami'):
+            if 'slow' in self.path:
+                time.sleep(0.2)
+            cache_control = 'public, max-age=60' if 'public' in self.path else 'max-age=60'
+            self._reply(json.dumps({'user': self.headers.get('Authorization')}).encode(),
+                        headers={'Cache-Control': cache_control})
+        elif self.path.startswith('/etag'):
+            if self.headers.get('If-None-Match') == '"v1"':
+                self.send_response(304)
+                self.send_header('ETag', '"v1"')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            self._reply(json.dumps({'version': 1}).encode(), headers={'ETag': '"v1"', 'Cache-Control': 'no-cache'})
+        elif self.path.startswith('/large'):
+            self._reply(LARGE_BODY)
+        elif self.path.startswith('/gzip'):
+            if 'gzip' in self.headers.get('Accept-Encoding', ''):
+                self._reply(gzip.compress(LARGE_BODY), headers={'Content-Encoding': 'gzip'})
+            else:
+                self._reply(LARGE_BODY)
+        else:
+            self._reply(json.dumps({'path': self.path}).encode())
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length)
+        self._reply(json.dumps({'path': self.path, 'length': len(body)}).encode())
+
+    def _reply(self, body, content_type='application/json', headers=None):
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_upstream(handler=_StubUpstreamHandler):
+    """在后台线程中启动本地上游桩服务，返回(server, base_url)"""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_address[1]}'
+
+
+class StubUpstreamTestCase(unittest.TestCase):
+    """使用本地上游桩服务的测试基类：每个测试类启动一个桩服务，每个测试结束后恢复配置"""
+
+    handler = _StubUpstreamHandler
+
+    @classmethod
+    def setUpClass(cls):
+        cls.upstream, cls.base_url = start_stub_upstream(cls.handler)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.upstream.shutdown()
+        cls.upstream.server_close()
+
+    def setUp(self):
+        self.saved_config = dict(config)
+        app.config['TESTING'] = True
+        self.client = app.test_client()
+
+    def tearDown(self):
+        config.replace(self.saved_config)
 
 class MCP_SERVERTestCase(unittest.TestCase):
     """MCP Server的测试用例"""
@@ -48,5 +150,462 @@ class MCP_SERVERTestCase(unittest.TestCase):
             self.assertEqual(data['status_code'], 200)
             self.assertIn('data', data)
 
+
+class UpstreamPoolTestCase(StubUpstreamTestCase):
+    """上游连接池的测试用例"""
+
+    def setUp(self):
+        super().setUp()
+        upstream_pool.close()
+
+    def test_forward_reuses_connection(self):
+        """测试重复转发到同一上游时复用连接"""
+        hits_before = upstream_pool.hits
+        for _ in range(3):
+            response = self.client.get('/api/forward', query_string={'url': self.base_url + '/ping'})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(json.loads(response.data)['path'], '/ping')
+
+        stats = upstream_pool.stats()
+        host = stats['hosts'][upstream_pool.host_key(self.base_url)]
+        self.assertEqual(upstream_pool.hits - hits_before, 2)
+        self.assertEqual(host['connections_opened'], 1)
+        self.assertEqual(host['requests'], 3)
+
+    def test_stats_endpoint(self):
+        """测试统计接口返回连接池信息"""
+        response = self.client.get('/api/stats')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('upstream_pool', json.loads(response.data))
+
+class StreamForwardTestCase(StubUpstreamTestCase):
+    """流式透传模式的测试用例"""
+
+    def test_stream_passes_body_through(self):
+        """测试流式模式原样透传非JSON响应体"""
+        response = self.client.get(
+            '/api/forward',
+            query_string={'url': self.base_url + '/text'},
+            headers={'X-MCP-Stream': '1'}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, b'plain text body')
+        self.assertTrue(response.content_type.startswith('text/plain'))
+
+    def test_large_request_body_is_streamed(self):
+        """测试超过阈值的请求体以流方式上传"""
+        config['stream_request_threshold'] = 1024
+        payload = b'x' * 10000
+        response = self.client.post(
+            '/api/forward',
+            query_string={'url': self.base_url + '/upload'},
+            data=payload,
+            headers={'X-MCP-Stream': '1', 'Content-Type': 'application/octet-stream'}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.data)['length'], len(payload))
+
+class CompressionTestCase(StubUpstreamTestCase):
+    """压缩协商和压缩透传的测试用例"""
+
+    def stream(self, path, headers=None):
+        return self.client.get('/api/forward', query_string={'url': self.base_url + path},
+                               headers={'X-MCP-Stream': '1', **(headers or {})})
+
+    def test_compressed_upstream_passes_through(self):
+        """测试客户端接受上游编码时原样透传压缩字节"""
+        response = self.stream('/gzip', {'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(int(response.headers['Content-Length']), len(response.data))
+        self.assertEqual(gzip.decompress(response.data), LARGE_BODY)
+
+    def test_compressed_upstream_is_decoded_for_identity_client(self):
+        """测试客户端不接受压缩时返回解压后的响应体"""
+        response = self.stream('/gzip')
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertEqual(response.data, LARGE_BODY)
+
+    def test_stream_is_compressed_on_the_way_out(self):
+        """测试流式模式下未压缩的上游响应按客户端编码压缩"""
+        response = self.stream('/large', {'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.data), LARGE_BODY)
+
+    def test_buffered_response_compression(self):
+        """测试超过阈值的响应被压缩，小响应保持原样"""
+        response = self.client.get('/api/forward', query_string={'url': self.base_url + '/gzip'},
+                                   headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response.headers['Vary'])
+        self.assertEqual(json.loads(gzip.decompress(response.data)), json.loads(LARGE_BODY))
+
+        response = self.client.get('/api/forward', query_string={'url': self.base_url + '/small'},
+                                   headers={'Accept-Encoding': 'gzip'})
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertEqual(json.loads(response.data)['path'], '/small')
+
+class CoalesceTestCase(StubUpstreamTestCase):
+    """非缓存转发请求合并的测试用例"""
+
+    def setUp(self):
+        super().setUp()
+        response_cache.enabled = False
+
+    def tearDown(self):
+        super().tearDown()
+        response_cache.enabled = config['response_cache_enabled']
+
+    def concurrent_forwards(self, path, count=3, headers=None):
+        """并发发送相同的转发请求，返回上游实际收到的请求数和响应体"""
+        before = _StubUpstreamHandler.requests_seen
+        results = []
+
+        def forward():
+            response = app.test_client().get('/api/forward', query_string={'url': self.base_url + path},
+                                              headers=headers or {})
+            results.append(json.loads(response.data))
+
+        threads = [threading.Thread(target=forward) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return _StubUpstreamHandler.requests_seen - before, results
+
+    def test_identical_requests_share_one_upstream_call(self):
+        """测试相同的并发请求只向上游发送一次"""
+        seen, results = self.concurrent_forwards('/sleep?coalesce=1')
+        self.assertEqual(seen, 1)
+        self.assertEqual(results, [{'path': '/sleep?coalesce=1'}] * 3)
+
+    def test_opt_out(self):
+        """测试按请求头和URL前缀关闭合并"""
+        seen, _ = self.concurrent_forwards('/sleep?coalesce=2', headers={'X-MCP-No-Coalesce': '1'})
+        self.assertEqual(seen, 3)
+
+        config['coalesce_exclude_prefixes'] = [self.base_url + '/sleep']
+        seen, _ = self.concurrent_forwards('/sleep?coalesce=3')
+        self.assertEqual(seen, 3)
+
+    def test_repeated_query_parameter(self):
+        """测试列表形式的查询参数（同名参数重复）可以合并"""
+        batch = [{'url': self.base_url + '/coalesce', 'params': {'a': ['1', '2']}}] * 2
+        results = json.loads(self.client.post('/api/forward/batch', json=batch).data)
+        self.assertEqual([result['data']['path'] for result in results], ['/coalesce?a=1&a=2'] * 2)
+
+    def test_opt_out_applies_to_cached_forwards(self):
+        """测试排除前缀同样作用于经过响应缓存的请求"""
+        response_cache.enabled = True
+        response_cache.clear()
+        config['coalesce_exclude_prefixes'] = [self.base_url + '/sleep']
+        seen, _ = self.concurrent_forwards('/sleep?coalesce=4')
+        self.assertEqual(seen, 3)
+
+class IPInfoCacheTestCase(unittest.TestCase):
+    """出口IP信息缓存的测试用例"""
+
+    def setUp(self):
+        self.calls = 0
+        self.fail = False
+
+    def fetch(self):
+        self.calls += 1
+        if self.fail:
+            raise RuntimeError('lookup failed')
+        return {'local_ip': '10.0.0.1', 'public_ip': '1.2.3.4', 'location': '', 'isp': ''}
+
+    def test_cached_value_is_reused(self):
+        """测试有效期内不重复查询"""
+        cache = IPInfoCache(self.fetch, ttl=300)
+        self.assertEqual(cache.get()['public_ip'], '1.2.3.4')
+        self.assertEqual(cache.get()['public_ip'], '1.2.3.4')
+        self.assertEqual(self.calls, 1)
+        self.assertNotIn('stale', cache.get())
+
+    def test_failed_refresh_returns_stale_value(self):
+        """测试刷新失败时返回带stale标记的旧值"""
+        cache = IPInfoCache(self.fetch, ttl=300)
+        cache.get()
+        self.fail = True
+        self.assertFalse(cache.refresh())
+        result = cache.get()
+        self.assertEqual(result['public_ip'], '1.2.3.4')
+        self.assertTrue(result['stale'])
+        self.assertEqual(result['error'], 'lookup failed')
+
+    def test_first_lookup_failure(self):
+        """测试首次查询失败时返回错误信息"""
+        self.fail = True
+        cache = IPInfoCache(self.fetch, ttl=300)
+        result = cache.get()
+        self.assertEqual(result['public_ip'], '无法获取')
+        self.assertEqual(result['error'], 'lookup failed')
+        # 后续读取不再同步重试
+        cache.get()
+        self.assertEqual(self.calls, 1)
+
+class ResponseCacheTestCase(StubUpstreamTestCase):
+    """转发响应缓存的测试用例"""
+
+    def setUp(self):
+        super().setUp()
+        response_cache.clear()
+
+    def forward(self, path):
+        return self.client.get('/api/forward', query_string={'url': self.base_url + path, 'q': '1'})
+
+    def test_fresh_response_is_served_from_cache(self):
+        """测试max-age有效期内的响应直接从缓存返回"""
+        before = _StubUpstreamHandler.requests_seen
+        first = self.forward('/cached')
+        second = self.forward('/cached')
+        self.assertEqual(first.headers['X-MCP-Cache'], 'MISS')
+        self.assertEqual(second.headers['X-MCP-Cache'], 'HIT')
+        self.assertEqual(json.loads(second.data), json.loads(first.data))
+        self.assertEqual(_StubUpstreamHandler.requests_seen - before, 1)
+
+    def test_etag_revalidation(self):
+        """测试no-cache响应携带ETag重新验证"""
+        self.forward('/etag')
+        second = self.forward('/etag')
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.headers['X-MCP-Cache'], 'REVALIDATED')
+        self.assertEqual(json.loads(second.data), {'version': 1})
+        self.assertEqual(response_cache.stats()['revalidations'], 1)
+
+    def test_uncacheable_response_is_not_stored(self):
+        """测试没有缓存信息的响应不会被缓存"""
+        self.forward('/plain')
+        self.assertEqual(self.forward('/plain').headers['X-MCP-Cache'], 'MISS')
+        self.assertEqual(response_cache.stats()['entries'], 0)
+
+    def test_credentialed_responses_are_not_shared(self):
+        """测试携带凭据的请求不共享缓存和未命中合并，除非响应声明public"""
+        def forward_as(user, path):
+            response = app.test_client().get('/api/forward', query_string={'url': self.base_url + path},
+                                             headers={'Authorization': user})
+            return response.headers['X-MCP-Cache'], json.loads(response.data)['user']
+
+        self.assertEqual(forward_as('alice', '/whoami'), ('MISS', 'alice'))
+        self.assertEqual(forward_as('bob', '/whoami'), ('MISS', 'bob'))
+        self.assertEqual(response_cache.stats()['entries'], 0)
+
+        results = {}
+        threads = [
+            threading.Thread(target=lambda user=user: results.__setitem__(user, forward_as(user, '/whoami/slow')))
+            for user in ('alice', 'bob')
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, {'alice': ('MISS', 'alice'), 'bob': ('MISS', 'bob')})
+
+        # 明确声明public的响应可以共享
+        self.assertEqual(forward_as('alice', '/whoami/public'), ('MISS', 'alice'))
+        self.assertEqual(forward_as('bob', '/whoami/public'), ('HIT', 'alice'))
+
+    @unittest.skipUnless(disk_cache_available(), 'requires fcntl')
+    def test_disk_tier_survives_restart(self):
+        """测试内存缓存丢失后从磁盘缓存命中，JSON和纯文本响应在各编解码实现下都能还原"""
+        backends = [name for name in mcp_json.BACKENDS if name != 'orjson' or mcp_json.orjson is not None]
+        for backend, path in [(backend, path) for backend in backends for path in ('/cached', '/cached-text')]:
+            with self.subTest(backend=backend, path=path), tempfile.TemporaryDirectory() as directory:
+                mcp_json.set_backend(backend)
+                response_cache.clear()
+                cache_path = os.path.join(directory, 'cache.seg')
+                response_cache.disk = DiskCache(cache_path)
+                try:
+                    first = self.forward(path)
+                    # 模拟重启：清空内存缓存并重新打开段文件
+                    with response_cache._lock:
+                        response_cache._entries.clear()
+                        response_cache._vary.clear()
+                        response_cache.bytes = 0
+                    response_cache.disk = DiskCache(cache_path)
+                    disk_hits = response_cache.stats()['disk_hits']
+                    before = _StubUpstreamHandler.requests_seen
+                    second = self.forward(path)
+                    self.assertEqual(second.status_code, 200)
+                    self.assertEqual(second.headers['X-MCP-Cache'], 'HIT')
+                    self.assertEqual(second.data, first.data)
+                    self.assertEqual(_StubUpstreamHandler.requests_seen, before)
+                    self.assertEqual(response_cache.stats()['disk_hits'], disk_hits + 1)
+                finally:
+                    response_cache.disk = None
+                    mcp_json.set_backend('auto')
+
+class BatchForwardTestCase(StubUpstreamTestCase):
+    """批量转发接口的测试用例"""
+
+    def test_results_in_order(self):
+        """测试结果按请求顺序返回"""
+        batch = [{'url': f'{self.base_url}/item/{index}'} for index in range(5)]
+        batch.append({'url': self.base_url + '/upload', 'method': 'POST', 'data': {'a': 1}})
+        batch.append({'method': 'GET'})
+        response = self.client.post('/api/forward/batch', json=batch)
+        self.assertEqual(response.status_code, 200)
+        results = json.loads(response.data)
+        self.assertEqual([result['data']['path'] for result in results[:5]],
+                         [f'/item/{index}' for index in range(5)])
+        self.assertEqual(results[5]['data']['length'], len(json.dumps({'a': 1})))
+        self.assertEqual(results[6]['status_code'], 400)
+
+    def test_item_timeout(self):
+        """测试单项超时不影响其他请求"""
+        batch = [{'url': self.base_url + '/sleep', 'timeout': 0.2}, {'url': self.base_url + '/fast'}]
+        results = json.loads(self.client.post('/api/forward/batch', json=batch).data)
+        self.assertEqual(results[0]['status_code'], 504)
+        self.assertEqual(results[1]['status_code'], 200)
+        # 上游读取超时先于单项截止时间触发时同样返回504
+        result = MCPForwardResource.forward_request(self.base_url + '/sleep?direct', 'GET', timeout=0.2, coalesce=False)
+        self.assertEqual(result['status_code'], 504)
+
+    def test_ndjson_stream(self):
+        """测试NDJSON方式按完成顺序返回"""
+        batch = [{'url': self.base_url + '/sleep'}, {'url': self.base_url + '/fast'}]
+        response = self.client.post('/api/forward/batch', json=batch, headers={'Accept': 'application/x-ndjson'})
+        lines = [json.loads(line) for line in response.data.decode().splitlines()]
+        self.assertEqual([line['index'] for line in lines], [1, 0])
+
+    def test_repeated_query_parameter(self):
+        """测试列表形式的查询参数（同名参数重复）可以缓存"""
+        batch = [{'url': self.base_url + '/cached/repeated', 'params': {'a': ['1', '2']}}]
+        results = json.loads(self.client.post('/api/forward/batch', json=batch).data)
+        self.assertEqual(results[0]['status_code'], 200)
+        self.assertEqual(results[0]['data']['path'], '/cached/repeated?a=1&a=2')
+
+    def test_rejects_non_array(self):
+        """测试请求体不是数组时返回400"""
+        self.assertEqual(self.client.post('/api/forward/batch', json={'url': 'x'}).status_code, 400)
+
+class MetricsTestCase(StubUpstreamTestCase):
+    """转发指标的测试用例"""
+
+    def test_stats_record_upstream_timings(self):
+        """测试统计接口记录上游耗时和字节数"""
+        key = upstream_pool.host_key(self.base_url)
+
+        def host_stats():
+            stats = json.loads(self.client.get('/api/stats').data)['upstream_metrics']
+            return stats.get(key, {'status_codes': {}, 'response_bytes': 0,
+                                   'timings': {phase: {'count': 0} for phase in ('dns', 'connect', 'ttfb', 'total')}})
+
+        upstream_pool.close()
+        before = host_stats()
+        for _ in range(2):
+            self.client.get('/api/forward', query_string={'url': self.base_url + '/metrics-test'})
+        after = host_stats()
+
+        def delta(phase):
+            return after['timings'][phase]['count'] - before['timings'][phase]['count']
+
+        self.assertEqual(after['status_codes']['200'] - before['status_codes'].get('200', 0), 2)
+        self.assertEqual(after['in_flight'], 0)
+        self.assertGreater(after['response_bytes'], before['response_bytes'])
+        self.assertEqual(delta('total'), 2)
+        self.assertEqual(delta('ttfb'), 2)
+        self.assertEqual(delta('connect'), 1)
+        self.assertEqual(delta('dns'), 1)
+
+    def test_prometheus_endpoint(self):
+        """测试Prometheus格式指标"""
+        self.client.get('/api/forward', query_string={'url': self.base_url + '/metrics-test'})
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        body = response.data.decode()
+        host = upstream_pool.host_key(self.base_url)
+        self.assertIn(f'mcp_upstream_requests_total{{host="{host}",status="200"}}', body)
+        self.assertIn(f'mcp_upstream_duration_seconds_bucket{{host="{host}",phase="total",le="+Inf"}}', body)
+        self.assertIn('mcp_response_cache_total', body)
+
+class AdmissionTestCase(StubUpstreamTestCase):
+    """准入控制的测试用例"""
+
+    def test_global_limit_sheds_load(self):
+        """测试超过全局上限时立即返回503和Retry-After"""
+        config['max_inflight'] = 1
+        admission.in_flight += 1
+        try:
+            response = self.client.get('/api/forward', query_string={'url': self.base_url + '/shed'})
+        finally:
+            admission.in_flight -= 1
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers['Retry-After'], str(config['shed_retry_after']))
+
+    def test_host_bulkhead_queue_timeout(self):
+        """测试单个上游主机并发已满时排队超时返回503"""
+        config['host_max_concurrency'] = 1
+        config['admission_queue_timeout'] = 0.2
+        statuses = []
+
+        def forward(index):
+            client = app.test_client()
+            response = client.get('/api/forward', query_string={'url': f'{self.base_url}/sleep?n={index}'})
+            statuses.append(response.status_code)
+
+        threads = [threading.Thread(target=forward, args=(index,)) for index in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sorted(statuses), [200, 503])
+
+        stats = json.loads(self.client.get('/api/stats').data)['admission']
+        host = stats['hosts'][upstream_pool.host_key(self.base_url)]
+        self.assertGreaterEqual(host['queue_timeouts'], 1)
+        self.assertEqual(host['active'], 0)
+        self.assertIn('mcp_admission_queue_seconds_count', self.client.get('/metrics').data.decode())
+
+class CircuitBreakerTestCase(StubUpstreamTestCase):
+    """熔断器和自适应超时的测试用例"""
+
+    def setUp(self):
+        super().setUp()
+        config['breaker_min_requests'] = 4
+
+    def test_state_transitions(self):
+        """测试关闭、打开、半开之间的状态转换"""
+        breaker = CircuitBreaker()
+        for _ in range(4):
+            breaker.allow('http://host')
+            breaker.record('http://host', False)
+        self.assertEqual(breaker.stats()['http://host']['state'], 'open')
+        with self.assertRaises(CircuitOpen):
+            breaker.allow('http://host')
+
+        # 打开时间结束后只放行一个探测请求
+        config['breaker_open_seconds'] = 0
+        breaker.allow('http://host')
+        with self.assertRaises(CircuitOpen):
+            breaker.allow('http://host')
+        breaker.record('http://host', True)
+        self.assertEqual(breaker.stats()['http://host']['state'], 'closed')
+        breaker.allow('http://host')
+
+    def test_dead_upstream_is_rejected_fast(self):
+        """测试上游不可达时熔断器打开，后续请求立即返回503"""
+        for index in range(4):
+            response = self.client.get('/api/forward', query_string={'url': f'http://127.0.0.1:1/dead/{index}'})
+            self.assertEqual(response.status_code, 500)
+
+        start = time.monotonic()
+        response = self.client.get('/api/forward', query_string={'url': 'http://127.0.0.1:1/dead'})
+        self.assertLess(time.monotonic() - start, 0.1)
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('Retry-After', response.headers)
+
+        stats = json.loads(self.client.get('/api/stats').data)['circuit_breaker']
+        self.assertEqual(stats['http://127.0.0.1:1']['state'], 'open')
+
+    def test_adaptive_timeout(self):
+        """测试超时时间按上游观测耗时收紧"""
+        host = upstream_pool.host_key(self.base_url)
+        config['adaptive_timeout_min_samples'] = 1
+        config['adaptive_timeout_min'] = 2
+        self.client.get('/api/forward', query_string={'url': self.base_url + '/adaptive'})
+        self.assertEqual(upstream_timeout(host), 2)
+        self.assertEqual(upstream_timeout('http://unseen.example'), config['timeout'])
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""
+MCP Server 上游副本组测试文件
+"""
+import json
+import time
+import unittest
+
+from mcp_server import UpstreamSessionPool, config, hedge_slots, upstream_groups, upstream_metrics
+from mcp_upstream import UpstreamGroup, UpstreamGroups, UnknownUpstreamGroup
+from test_mcp_server import StubUpstreamTestCase, _StubUpstreamHandler, start_stub_upstream
+
+
+class _NamedHandler(_StubUpstreamHandler):
+    """返回副本名称的桩服务，/hedge路径按delay延迟响应"""
+
+    name = ''
+    delay = 0
+
+    def do_GET(self):
+        if self.path.startswith('/hedge'):
+            time.sleep(self.delay)
+        self._reply(json.dumps({'replica': self.name, 'path': self.path}).encode(), 'application/json')
+
+
+class _SlowHandler(_NamedHandler):
+    name = 'slow'
+    delay = 1
+
+
+class _FastHandler(_NamedHandler):
+    name = 'fast'
+
+
+class UpstreamGroupTestCase(unittest.TestCase):
+    """副本选择和健康状态的测试用例"""
+
+    def test_least_loaded_replica_is_picked(self):
+        """测试优先选择进行中请求少、响应快的副本"""
+        group = UpstreamGroup('g', ['http://a', 'http://b'])
+        a, b = group.replicas
+        group.begin(a)
+        self.assertIs(group.pick(), b)
+        group.end(a, 0.5, True)
+        group.begin(b)
+        group.end(b, 0.01, True)
+        self.assertIs(group.pick(), b)
+        self.assertIs(group.pick(exclude=(b,)), a)
+
+    def test_failures_mark_replica_unhealthy(self):
+        """测试连续失败后不再选择该副本，成功后恢复"""
+        group = UpstreamGroup('g', ['http://a', 'http://b'], unhealthy_threshold=2)
+        a, b = group.replicas
+        for _ in range(2):
+            group.begin(a)
+            group.end(a, 0.1, False)
+        self.assertFalse(a.healthy)
+        self.assertTrue(all(group.pick() is b for _ in range(5)))
+        group.set_health(a, True)
+        self.assertTrue(a.healthy)
+
+    def test_health_check_and_resolve(self):
+        """测试主动健康检查和目标URL解析"""
+        groups = UpstreamGroups(lambda url: 'down' not in url, interval=0, unhealthy_threshold=1)
+        groups.configure({'api': {'replicas': ['http://up', 'http://down/'], 'health_path': '/health'}})
+        group, target = groups.resolve('upstream://api/v1/items?page=2')
+        self.assertEqual(target, '/v1/items?page=2')
+        groups.check()
+        self.assertEqual([replica.healthy for replica in group.replicas], [True, False])
+        self.assertIsNone(groups.resolve('http://example.com/'))
+        with self.assertRaises(UnknownUpstreamGroup):
+            groups.resolve('upstream://missing/')
+
+        # 重新配置时保留未变化副本的状态
+        groups.configure({'api': {'replicas': ['http://down', 'http://other']}})
+        self.assertFalse(groups.get('api').replicas[0].healthy)
+
+
+class HedgedForwardTestCase(StubUpstreamTestCase):
+    """通过上游组转发和对冲请求的测试用例，基类启动的桩服务为慢副本"""
+
+    handler = _SlowHandler
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.slow_url = cls.base_url
+        cls.fast, cls.fast_url = start_stub_upstream(_FastHandler)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.fast.shutdown()
+        cls.fast.server_close()
+        super().tearDownClass()
+
+    def configure(self, hedge):
+        config.update({
+            'upstream_groups': {'pair': {'replicas': [self.slow_url, self.fast_url], 'hedge': hedge}},
+            'upstream_health_interval': 0,
+            'hedge_min_samples': 1
+        })
+        return upstream_groups.get('pair')
+
+    def forward(self, path):
+        return self.client.get('/api/forward', query_string={'url': 'upstream://pair' + path},
+                               headers={'X-MCP-No-Coalesce': '1'})
+
+    def test_forward_through_group(self):
+        """测试upstream://目标由组内副本处理，未知组返回400"""
+        self.configure(hedge=False)
+        response = self.forward('/warm?x=1')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.data)['path'], '/warm?x=1')
+        self.assertEqual(self.client.get('/api/forward', query_string={'url': 'upstream://nope/'}).status_code, 400)
+
+    def test_stream_through_group_is_accounted(self):
+        """测试流式转发upstream://目标时计入副本的请求数，响应体读完后进行中请求数归零"""
+        group = self.configure(hedge=False)
+        response = self.client.get('/api/forward', query_string={'url': 'upstream://pair/stream'},
+                                   headers={'X-MCP-Stream': '1'})
+        self.assertEqual(json.loads(response.data)['path'], '/stream')
+        response.close()
+        self.assertEqual(sum(replica.requests for replica in group.replicas), 1)
+        self.assertEqual(sum(replica.outstanding for replica in group.replicas), 0)
+        self.assertTrue(any(replica.ewma is not None for replica in group.replicas))
+
+    def warm_slow_replica(self):
+        """配置对冲组，并让慢副本积累一个快速样本，使下一个请求先发往慢副本"""
+        group = self.configure(hedge=True)
+        slow, fast = group.replicas
+        # 清空慢副本此前测试留下的耗时样本，避免其抬高p95对冲延迟
+        upstream_metrics._hosts.pop(UpstreamSessionPool.host_key(slow.url), None)
+        # 快副本暂时标记为不健康，使请求先发往慢副本（预热时不对冲）
+        for _ in range(config['upstream_unhealthy_threshold']):
+            group.set_health(fast, False)
+        group.hedge = False
+        self.assertEqual(json.loads(self.forward('/warm').data)['replica'], 'slow')
+        group.hedge = True
+        return group, slow
+
+    def test_slow_replica_is_hedged(self):
+        """测试副本超过p95未响应时向另一个副本发送对冲请求并采用先返回的结果"""
+        group, slow = self.warm_slow_replica()
+
+        started = time.monotonic()
+        response = self.forward('/hedge')
+        self.assertLess(time.monotonic() - started, 0.8)
+        self.assertEqual(json.loads(response.data)['replica'], 'fast')
+        self.assertEqual(group.stats()['hedge_wins'], 1)
+
+        # 等待被放弃的慢请求完成
+        deadline = time.monotonic() + 3
+        while slow.outstanding and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(slow.outstanding, 0)
+
+    def test_no_hedge_when_pool_is_saturated(self):
+        """测试对冲线程池没有空闲线程时不对冲，原请求在当前线程发送"""
+        group, slow = self.warm_slow_replica()
+        held = 0
+        while hedge_slots.acquire(blocking=False):
+            held += 1
+        try:
+            response = self.forward('/hedge')
+        finally:
+            for _ in range(held):
+                hedge_slots.release()
+        self.assertEqual(json.loads(response.data)['replica'], 'slow')
+        self.assertEqual(group.stats()['hedges'], 0)
+        self.assertEqual(slow.outstanding, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()